@@ -0,0 +1,194 @@
+"""
+Archive of raw responses, and replay of archived responses without network access.
+
+Responses are written to append-only segment files (segment-00000.bin, ...)
+as zlib-compressed records: a JSON header line with the URL, status and
+headers, followed by the body. index.tsv maps each request fingerprint to
+its record: `fingerprint  segment  offset  length`.
+
+With RESPONSE_ARCHIVE_REPLAY the archived responses are served for every
+request instead of downloading them, so spider callbacks can be run again
+at parse speed after a selector fix:
+
+    scrapy crawl publications -s RESPONSE_ARCHIVE_REPLAY=True
+"""
+
+import json
+import logging
+import os
+import zlib
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+
+class ResponseArchive:
+    """
+    Append-only store of compressed responses, addressed by request fingerprint.
+    """
+
+    def __init__(self, directory, segment_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.index = {}
+        self.segment = None
+        self.segment_number = 0
+        self.index_file = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.tsv')
+
+    def segment_path(self, number):
+        return os.path.join(self.directory, f'segment-{number:05d}.bin')
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='ascii') as file:
+            for line in file:
+                fingerprint, segment, offset, length = line.split('\t')
+                self.index[fingerprint] = (int(segment), int(offset), int(length))
+                self.segment_number = max(self.segment_number, int(segment))
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, fingerprint, url, status, headers, body):
+        """
+        Appends a response to the current segment and records it in the index.
+
+        Returns:
+            int: Compressed size of the record.
+        """
+        header = json.dumps({
+            'url': url,
+            'status': status,
+            'headers': [[key.decode('latin-1'), [value.decode('latin-1') for value in values]]
+                        for key, values in headers.items()],
+        }).encode('utf-8')
+        record = zlib.compress(header + b'\n' + body)
+
+        if self.segment is None or self.segment.tell() + len(record) > self.segment_size:
+            self.open_segment()
+
+        offset = self.segment.tell()
+        self.segment.write(record)
+        self.segment.flush()
+
+        self.index[fingerprint] = (self.segment_number, offset, len(record))
+        self.index_file.write(f'{fingerprint}\t{self.segment_number}\t{offset}\t{len(record)}\n')
+        self.index_file.flush()
+        return len(record)
+
+    def open_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment_number += 1
+        # Never write into a segment left over from an earlier run
+        while os.path.exists(self.segment_path(self.segment_number)) and \
+                os.path.getsize(self.segment_path(self.segment_number)) >= self.segment_size:
+            self.segment_number += 1
+
+        self.segment = open(self.segment_path(self.segment_number), 'ab')
+        if self.index_file is None:
+            self.index_file = open(self.index_path, 'a', encoding='ascii')
+
+    def get(self, fingerprint):
+        """
+        Reads an archived response.
+
+        Returns:
+            tuple: (url, status, headers, body), or None if the fingerprint is not archived.
+        """
+        location = self.index.get(fingerprint)
+        if location is None:
+            return None
+
+        segment, offset, length = location
+        with open(self.segment_path(segment), 'rb') as file:
+            file.seek(offset)
+            record = zlib.decompress(file.read(length))
+
+        header, body = record.split(b'\n', 1)
+        header = json.loads(header)
+        headers = Headers({key: values for key, values in header['headers']})
+        return header['url'], header['status'], headers, body
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+        if self.index_file is not None:
+            self.index_file.close()
+
+
+class ResponseArchiveMiddleware:
+    """
+    Downloader middleware that archives responses (RESPONSE_ARCHIVE_ENABLED)
+    or serves them from the archive instead of the network (RESPONSE_ARCHIVE_REPLAY).
+
+    In replay mode, requests missing from the archive are dropped. Responses
+    served from the HTTP cache (the 'cached' flag) were archived when they
+    were downloaded, so they are not archived again.
+    """
+
+    def __init__(self, archive, fingerprinter, stats, replay=False):
+        self.archive = archive
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+        self.replay = replay
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        replay = settings.getbool('RESPONSE_ARCHIVE_REPLAY')
+        if not (replay or settings.getbool('RESPONSE_ARCHIVE_ENABLED')):
+            raise NotConfigured
+
+        archive = ResponseArchive(settings.get('RESPONSE_ARCHIVE_DIR', 'archive'),
+                                  settings.getint('RESPONSE_ARCHIVE_SEGMENT_SIZE', 256 * 1024 * 1024))
+        middleware = cls(archive, crawler.request_fingerprinter, crawler.stats, replay)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+
+        logging.info(f"Response archive {archive.directory}: {len(archive)} responses"
+                     f"{', replaying' if replay else ''}")
+        return middleware
+
+    def process_request(self, request, spider):
+        if not self.replay:
+            return None
+
+        archived = self.archive.get(self.fingerprinter.fingerprint(request).hex())
+        if archived is None:
+            self.stats.inc_value('archive/replay/missing')
+            raise IgnoreRequest(f"Response not archived: {request.url}")
+
+        url, status, headers, body = archived
+        response_class = responsetypes.from_args(headers=headers, url=url, body=body)
+        self.stats.inc_value('archive/replay/responses')
+        return response_class(url=url, status=status, headers=headers, body=body,
+                              request=request, flags=['archived'])
+
+    def process_response(self, request, response, spider):
+        if self.replay or 'archived' in response.flags:
+            return response
+        if 'cached' in response.flags:
+            self.stats.inc_value('archive/skipped_cached')
+            return response
+
+        size = self.archive.append(self.fingerprinter.fingerprint(request).hex(),
+                                   response.url, response.status, response.headers, response.body)
+        self.stats.inc_value('archive/responses')
+        self.stats.inc_value('archive/bytes', size)
+        return response
+
+    def spider_closed(self, spider):
+        self.archive.close()
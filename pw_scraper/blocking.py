@@ -0,0 +1,151 @@
+"""
+Resource blocking of Playwright pages, with a policy per crawl stage.
+
+Most pages are only read from their server-rendered DOM, so the browser
+does not need to load their images, stylesheets or third-party scripts.
+RESOURCE_BLOCKING_PROFILES holds a profile for each stage:
+
+- 'listing': result listings (/globalResultList.seam). The rows are loaded
+  by the PrimeFaces data list, so jQuery, the PrimeFaces core and
+  components, jsf.js and the AJAX postbacks to the listing are allowed.
+- 'tree': the people listing with its affiliation tree filter: the
+  listing's scripts plus the tree widget and the jQuery plugins it uses.
+- 'detail': profile and publication pages (/info/...), read from the
+  server-rendered DOM; only JSF resources of the site are allowed.
+
+The stage of a page is the `blocking_stage` meta key of the request that
+opened it, or else is derived from its URL. A profile has two keys:
+
+- block: resource types that are always aborted.
+- allow: URL regexes. Scripts, XHR/fetch requests and every request to
+  another host are aborted unless they match one of them.
+
+RESOURCE_BLOCKING_PROFILES overrides the profiles of DEFAULT_PROFILES by
+stage. The document of a page is always loaded. Every request is counted
+in the blocking/<stage>/{allowed,blocked}/<resource type> stats, and the
+bytes of the loaded ones (headers and body as transferred) in
+blocking/<stage>/allowed_bytes. With RESOURCE_BLOCKING_ENABLED = False
+nothing is aborted: the blocked counts are then what the profiles would
+block, and the bytes of those requests are counted in
+blocking/<stage>/blocked_bytes, which is what the profiles save.
+"""
+
+import logging
+import re
+from urllib.parse import urlparse
+
+
+BLOCKED_TYPES = ['image', 'stylesheet', 'font', 'media', 'manifest', 'texttrack']
+
+# PrimeFaces and JSF scripts, served as /javax.faces.resource/<name>.js.xhtml?ln=<library>
+PRIMEFACES_SCRIPTS = r'^https://repo\.pw\.edu\.pl/javax\.faces\.resource/(jquery/jquery|core|components)\.js\.xhtml\?(.*&)?ln=primefaces\b'
+JSF_SCRIPT = r'^https://repo\.pw\.edu\.pl/javax\.faces\.resource/jsf\.js\.xhtml\?(.*&)?ln=javax\.faces\b'
+TREE_SCRIPTS = r'^https://repo\.pw\.edu\.pl/javax\.faces\.resource/(jquery/jquery-plugins|tree/tree)\.js\.xhtml\?(.*&)?ln=primefaces\b'
+LISTING_POSTBACK = r'^https://repo\.pw\.edu\.pl/globalResultList\.seam'
+
+DEFAULT_PROFILES = {
+    'listing': {
+        'block': BLOCKED_TYPES,
+        'allow': [PRIMEFACES_SCRIPTS, JSF_SCRIPT, LISTING_POSTBACK],
+    },
+    'tree': {
+        'block': BLOCKED_TYPES,
+        'allow': [PRIMEFACES_SCRIPTS, JSF_SCRIPT, TREE_SCRIPTS, LISTING_POSTBACK],
+    },
+    'detail': {
+        'block': BLOCKED_TYPES,
+        'allow': [r'^https://repo\.pw\.edu\.pl/javax\.faces\.resource/'],
+    },
+}
+
+SCRIPT_RESOURCE_TYPES = {'script', 'xhr', 'fetch', 'eventsource', 'websocket'}
+
+
+def page_stage(request):
+    """
+    The blocking stage of a Scrapy request: its `blocking_stage` meta key or the one of its URL.
+
+    Returns:
+        str: 'listing', 'tree' or 'detail'.
+    """
+    if request.meta.get('blocking_stage'):
+        return request.meta['blocking_stage']
+    if urlparse(request.url).path.startswith('/info/'):
+        return 'detail'
+    return 'listing'
+
+
+class ResourceBlocker:
+    """
+    PLAYWRIGHT_ABORT_REQUEST callable applying the profile of each page's stage.
+    """
+
+    def __init__(self, profiles=None, host='repo.pw.edu.pl', enabled=True, stats=None):
+        self.profiles = {}
+        for stage, profile in dict(DEFAULT_PROFILES, **(profiles or {})).items():
+            self.profiles[stage] = (set(profile.get('block', [])),
+                                    [re.compile(pattern) for pattern in profile.get('allow', [])])
+        self.host = host
+        self.enabled = enabled
+        self.stats = stats
+        # Stage of each open page
+        self.stages = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(settings.getdict('RESOURCE_BLOCKING_PROFILES'),
+                   enabled=settings.getbool('RESOURCE_BLOCKING_ENABLED', True),
+                   stats=crawler.stats)
+
+    def watch(self, page, request):
+        """
+        Applies the stage of the Scrapy `request` to the Playwright `page` opened for it.
+        """
+        stage = page_stage(request)
+        if stage not in self.profiles:
+            logging.warning(f"No resource blocking profile for stage {stage}, using listing")
+            stage = 'listing'
+        self.stages[page] = stage
+        page.on('requestfinished', self.request_finished)
+        page.on('close', lambda closed: self.stages.pop(closed, None))
+
+    def stage_of(self, playwright_request):
+        try:
+            return self.stages.get(playwright_request.frame.page, 'listing')
+        except Exception:
+            # Requests of service workers have no frame
+            return 'listing'
+
+    def should_abort(self, playwright_request, stage):
+        if playwright_request.is_navigation_request() and playwright_request.frame.parent_frame is None:
+            return False
+
+        blocked_types, allowed = self.profiles[stage]
+        resource_type = playwright_request.resource_type
+        if resource_type in blocked_types:
+            return True
+        if resource_type in SCRIPT_RESOURCE_TYPES or urlparse(playwright_request.url).hostname != self.host:
+            return not any(pattern.search(playwright_request.url) for pattern in allowed)
+        return False
+
+    def __call__(self, playwright_request):
+        stage = self.stage_of(playwright_request)
+        abort = self.should_abort(playwright_request, stage)
+        if self.stats:
+            self.stats.inc_value(f"blocking/{stage}/{'blocked' if abort else 'allowed'}/"
+                                 f"{playwright_request.resource_type}")
+        return abort and self.enabled
+
+    async def request_finished(self, playwright_request):
+        if not self.stats:
+            return
+        try:
+            sizes = await playwright_request.sizes()
+        except Exception:
+            # The page was closed before the sizes were read
+            return
+        stage = self.stage_of(playwright_request)
+        # Only requests the profile would block finish when blocking is disabled
+        loaded = 'blocked' if self.should_abort(playwright_request, stage) else 'allowed'
+        self.stats.inc_value(f'blocking/{stage}/{loaded}_bytes', sizes['responseHeadersSize'] + sizes['responseBodySize'])
@@ -0,0 +1,151 @@
+"""
+Change feed of the rows DatabasePipeline inserts, updates and deletes.
+
+With CHANGE_FEED set, every change the pipeline makes is recorded as an
+event with:
+
+- crawl_id: the crawl that made the change (<spider>-<UTC start time>-<random>)
+- entity: 'scientist', 'bibliometrics', 'publication', 'organization' or a
+  relation table ('scientist_organization', 'scientists_research_areas',
+  'scientists_publications', 'organizations_relationships')
+- entity_key: the database id of the row; for bibliometrics the scientist
+  id, for relations '<owner id>:<target id>'
+- change: 'insert', 'update' or 'delete'
+- fields: the inserted or changed fields with their new values
+
+CHANGE_FEED = "table" appends the events to the change_events table
+(created by `scrapy migrate`), in the transaction of the item that made
+them, so a rolled back item leaves no events. CHANGE_FEED = "jsonl"
+appends them to the CHANGE_FEED_PATH file, one JSON object per line, after
+the item is committed.
+
+Consumers of the table must not read the events with an id above the last
+one they processed: ids are taken when the events are inserted, not when
+they are committed, so a slow transaction can commit events below an id a
+consumer already moved past, and they would never be read. Every event
+carries the id of its transaction (txid) instead, and read_events() only
+returns the events of transactions below the xmin of the current snapshot,
+pg_snapshot_xmin(pg_current_snapshot()). Every transaction below it has
+committed or rolled back, so nothing can appear below that watermark any
+more. The consumer stores the watermark read_events() returns and passes
+it to the next call, which reads the events from it up to the new one:
+each committed event is returned exactly once, and events of transactions
+still in flight wait for the next call.
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+
+
+def relation_key(owner_id, target_id):
+    """The entity key of a relation row, '<owner id>:<target id>' (empty for NULL)."""
+    return f"{'' if owner_id is None else owner_id}:{'' if target_id is None else target_id}"
+
+
+def read_events(cursor, watermark=None):
+    """
+    Reads the change_events rows committed since the previous call of a consumer.
+
+    Args:
+        cursor (psycopg.Cursor): A cursor on the scraper database.
+        watermark (int): The watermark returned by the previous call, None to read from the start.
+
+    Returns:
+        tuple: The (id, crawl_id, entity, entity_key, change, fields, created_at)
+        rows in commit-safe order, and the watermark to pass to the next call.
+    """
+    cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot());")
+    upto = int(cursor.fetchone()[0])
+    cursor.execute("SELECT id, crawl_id, entity, entity_key, change, fields, created_at FROM change_events "
+                   "WHERE (%(after)s::text IS NULL OR txid >= %(after)s::text::xid8) AND txid < %(upto)s::text::xid8 "
+                   "ORDER BY txid, id;",
+                   {'after': None if watermark is None else str(watermark), 'upto': str(upto)})
+    return cursor.fetchall(), upto
+
+
+class ChangeFeed:
+    """
+    Collects the change events of an item and writes them when it is committed.
+    """
+
+    def __init__(self, sink=None, path='change_events.jsonl'):
+        if sink not in (None, 'table', 'jsonl'):
+            raise ValueError(f"Unknown CHANGE_FEED {sink!r}, use 'table' or 'jsonl'")
+        self.sink = sink
+        self.path = path
+        self.crawl_id = None
+        self.pending = []
+        self.file = None
+        self.events = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('CHANGE_FEED') or None, settings.get('CHANGE_FEED_PATH', 'change_events.jsonl'))
+
+    @property
+    def enabled(self):
+        return self.sink is not None
+
+    def open(self, spider_name):
+        """
+        Starts the feed of a crawl; the change_events table is created by `scrapy migrate`.
+        """
+        self.crawl_id = f"{spider_name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+        self.events = 0
+        if self.sink == 'jsonl':
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, entity, key, change, fields=None):
+        """
+        Records a change of the current item.
+
+        Args:
+            entity (str): The kind of row, e.g. 'scientist'.
+            key: The key of the row, see the module docstring.
+            change (str): 'insert', 'update' or 'delete'.
+            fields (dict): The inserted or changed fields and their new values.
+        """
+        if self.sink is not None:
+            self.pending.append((entity, str(key), change, fields or {}))
+
+    def changed_fields(self, names, old, new):
+        """
+        Returns:
+            dict: The fields of `names` whose value in the `new` row differs from the `old` one.
+        """
+        return {name: value for name, before, value in zip(names, old, new) if before != value}
+
+    def write(self, cursor):
+        """
+        Inserts the pending events into change_events; called before the item is committed.
+        """
+        if self.sink == 'table' and self.pending:
+            cursor.executemany(
+                "INSERT INTO change_events (crawl_id, entity, entity_key, change, fields) "
+                "VALUES (%s, %s, %s, %s, %s);",
+                [(self.crawl_id, entity, key, change, json.dumps(fields, default=str))
+                 for entity, key, change, fields in self.pending])
+
+    def commit(self):
+        """Called after the item is committed: the pending events are final."""
+        if self.sink == 'jsonl' and self.pending:
+            for entity, key, change, fields in self.pending:
+                self.file.write(json.dumps({'crawl_id': self.crawl_id, 'entity': entity, 'entity_key': key,
+                                            'change': change, 'fields': fields,
+                                            'time': datetime.now(timezone.utc).isoformat()},
+                                           default=str, ensure_ascii=False) + '\n')
+            self.file.flush()
+        self.events += len(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.sink is not None:
+            logging.info(f"Change feed: {self.events} events of crawl {self.crawl_id}")
@@ -0,0 +1 @@
+# Project commands, available through the scrapy CLI (see COMMANDS_MODULE)
@@ -0,0 +1,249 @@
+"""
+Throughput benchmark of DatabasePipeline.
+
+Generates synthetic organization, scientist and publication items shaped
+like the scraped ones (see personalData.json and pub.json) and runs them
+through CleanItemsPipeline and DatabasePipeline against the database of the
+.env file (or SqlitePipeline against SQLITE_PATH, with
+STORAGE_BACKEND=sqlite). The same items are processed twice: the cold run inserts them,
+the warm run finds every row already in place.
+
+    scrapy bench_db --scientists 2000 --publications 10000 --authors 4
+    scrapy bench_db -s DATABASE_PIPELINE_MODE=False
+    scrapy bench_db -s STORAGE_BACKEND=sqlite -s SQLITE_PATH=bench.sqlite3
+
+Every run uses fresh names, emails and titles, so it never touches rows of
+a real crawl, but the rows it adds are left in the database: run it against
+a local database only, migrated with `scrapy migrate`.
+"""
+
+import logging
+import random
+import string
+import time
+import uuid
+from collections import defaultdict
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pw_scraper.hotlog import HotLog, log_level
+from pw_scraper.items import OrganizationItem, PublicationItem, ScientistItem
+from pw_scraper.migrations import MigrationError
+from pw_scraper.pipelines import CleanItemsPipeline, DatabasePipeline, SqlitePipeline
+
+
+PROFILE_URL = ('https://repo.pw.edu.pl/info/author/{key}?r={tab}&tab=&title=Person%2Bprofile%2B%25E2%2580%2593'
+               '%2B{first}%2B{last}%2B%25E2%2580%2593%2BWarsaw%2BUniversity%2Bof%2BTechnology&lang=en')
+
+ACADEMIC_TITLES = ['PhD', 'DSc', 'Prof.', 'MSc', 'BSc']
+POSITIONS = ['assistant professor', 'professor', 'research assistant', '']
+
+
+class CountingCursor:
+    """
+    Cursor proxy that counts the statements executed through it in `counter`.
+    """
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def execute(self, *args, **kwargs):
+        self.counter['statements'] += 1
+        return self.cursor.execute(*args, **kwargs)
+
+    def executemany(self, query, params_seq, *args, **kwargs):
+        params_seq = list(params_seq)
+        self.counter['statements'] += len(params_seq)
+        return self.cursor.executemany(query, params_seq, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class CountingConnection:
+    """
+    Connection proxy whose cursors count their statements in `counter`.
+    """
+
+    def __init__(self, connection, counter):
+        self.connection = connection
+        self.counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self.connection.cursor(*args, **kwargs), self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class ItemGenerator:
+    """
+    Streams of raw items, with the field formats the spiders produce.
+    """
+
+    def __init__(self, scientists, publications, authors, institutes, seed=None):
+        self.random = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.scientist_count = scientists
+        self.publication_count = publications
+        self.authors = authors
+        self.institute_count = institutes
+        self.research_areas = [self.words(2).title() for _ in range(60)]
+
+    def words(self, count):
+        return ' '.join(''.join(self.random.choices(string.ascii_lowercase, k=self.random.randint(3, 10)))
+                        for _ in range(count))
+
+    def organizations(self):
+        items = []
+        for institute in range(self.institute_count):
+            name = f'Faculty {self.run_id} {institute}'
+            cathedras = [f'{name} Division {cathedra}' for cathedra in range(self.random.randint(0, 6))]
+            items.append(OrganizationItem(university='Warsaw University of Technology',
+                                          institute=name, cathedras=cathedras))
+        return items
+
+    def scientists(self, organizations):
+        units = [unit for item in organizations for unit in [item.institute] + item.cathedras]
+        items = []
+        for number in range(self.scientist_count):
+            first, last = self.words(1).title(), self.words(1).title()
+            key = f'WUT{self.run_id}{number:024x}'
+            items.append(ScientistItem(
+                first_name=first,
+                last_name=last,
+                academic_title=self.random.choice(ACADEMIC_TITLES),
+                email=f'{first}.{last}.{self.run_id}{number}@pw.edu.pl'.lower(),
+                profile_url=PROFILE_URL.format(key=key, tab='author', first=first, last=last),
+                position=self.random.choice(POSITIONS),
+                h_index_scopus=str(self.random.randint(0, 40)),
+                h_index_wos=str(self.random.randint(0, 40)),
+                publication_count=f'{self.random.randint(0, 1500):,}',
+                ministerial_score=f'{self.random.uniform(0, 3000):.2f}'.replace('.', ',') + '\xa0',
+                organization=['Warsaw University of Technology'] + self.random.sample(units, min(2, len(units))),
+                research_area=self.random.sample(self.research_areas, self.random.randint(1, 4)),
+            ))
+        return items
+
+    def publications(self, scientists):
+        items = []
+        for number in range(self.publication_count):
+            # Authors of a publication are partly scientists of the crawl, partly external
+            authors = []
+            for _ in range(max(1, int(self.random.expovariate(1 / self.authors)))):
+                if scientists and self.random.random() < 0.7:
+                    author = self.random.choice(scientists).profile_url.replace('r=author', 'r=publication')
+                else:
+                    author = PROFILE_URL.format(key=f'EXT{uuid.uuid4().hex}', tab='publication',
+                                                first='External', last='Author')
+                authors.append(author + '&pn=1')
+
+            items.append(PublicationItem(
+                title=f'{self.words(self.random.randint(3, 12)).capitalize()} {self.run_id}-{number}',
+                journal=self.words(3).title() if self.random.random() < 0.6 else None,
+                publisher=f'{self.words(1).title()}\n\t  ',
+                publication_date=f'{self.random.randint(1950, 2025)}\n\t  ',
+                ministerial_score=f'{self.random.choice([0, 20, 40, 70, 100, 140, 200])}\n\n ',
+                authors=authors,
+                vol=str(self.random.randint(1, 99)) if self.random.random() < 0.5 else None,
+                publication_key=f'WUT{self.run_id}{number:024x}',
+            ))
+        return items
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Benchmark DatabasePipeline with synthetic items"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--scientists", type=int, default=1000,
+                            help="number of scientists (default: 1000)")
+        parser.add_argument("--publications", type=int, default=5000,
+                            help="number of publications (default: 5000)")
+        parser.add_argument("--authors", type=float, default=3,
+                            help="mean number of authors per publication (default: 3)")
+        parser.add_argument("--institutes", type=int, default=20,
+                            help="number of institutes of the organization tree (default: 20)")
+        parser.add_argument("--seed", type=int, default=None,
+                            help="random seed of the generated field values")
+
+    def run(self, args, opts):
+        if opts.scientists < 0 or opts.publications < 0 or opts.authors <= 0:
+            raise UsageError("Item counts must not be negative and --authors must be positive")
+
+        generator = ItemGenerator(opts.scientists, opts.publications, opts.authors, opts.institutes, opts.seed)
+        organizations = generator.organizations()
+        scientists = generator.scientists(organizations)
+        publications = generator.publications(scientists)
+        print(f"Generated {len(organizations)} organizations, {len(scientists)} scientists and "
+              f"{len(publications)} publications (run {generator.run_id})")
+
+        for phase in ('cold', 'warm'):
+            self.run_phase(phase, organizations + scientists + publications, opts.loglevel or 'WARNING')
+
+    def run_phase(self, phase, items, loglevel):
+        # Per-item messages are logged as in a crawl, but only from WARNING up by default
+        level = log_level(loglevel)
+        cleaner = CleanItemsPipeline(log=HotLog(logging.getLogger('pw_scraper.pipelines'), level=level))
+        log = HotLog(logging.getLogger('pw_scraper.pipelines'), level=level)
+        if self.settings.get('STORAGE_BACKEND') == 'sqlite':
+            pipeline = SqlitePipeline(self.settings.get('SQLITE_PATH'), self.settings.getint('SQLITE_BATCH_SIZE'),
+                                      resolve_authors_on_close=False, log=log)
+            pipeline.connect()
+            pipeline.create_tables()
+        else:
+            pipeline = DatabasePipeline(resolve_authors_on_close=False, log=log,
+                                        pipeline_mode=self.settings.getbool('DATABASE_PIPELINE_MODE'))
+            pipeline.connect()
+            try:
+                pipeline.check_schema()
+            except MigrationError as e:
+                raise UsageError(str(e), print_help=False)
+        counter = {'statements': 0}
+        pipeline.connection = CountingConnection(pipeline.connection, counter)
+        pipeline.cur = CountingCursor(pipeline.cur, counter)
+
+        latencies = defaultdict(list)
+        statements = defaultdict(int)
+        started = time.perf_counter()
+        try:
+            for item in items:
+                # Items are cleaned like in a crawl, but only the database pipeline is timed
+                item = cleaner.process_item(type(item)(**{field: getattr(item, field) for field in item.__slots__}), None)
+                before = counter['statements']
+                item_started = time.perf_counter()
+                pipeline.process_item(item, None)
+                latencies[type(item).__name__].append(time.perf_counter() - item_started)
+                statements[type(item).__name__] += counter['statements'] - before
+
+            resolve_started = time.perf_counter()
+            linked = pipeline.resolve_author_links()
+            resolve_time = time.perf_counter() - resolve_started
+        finally:
+            pipeline.cur.close()
+            pipeline.connection.close()
+        elapsed = time.perf_counter() - started
+
+        print(f"\n{phase}: {len(items)} items in {elapsed:.2f}s ({len(items) / elapsed:.1f} items/s), "
+              f"{counter['statements'] / max(len(items), 1):.1f} statements/item")
+        print(f"  {'item':<18}{'count':>8}{'items/s':>10}{'stmts/item':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, values in latencies.items():
+            print(f"  {name:<18}{len(values):>8}{len(values) / sum(values):>10.1f}"
+                  f"{statements[name] / len(values):>12.1f}"
+                  f"{percentile(values, 0.5) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}")
+        print(f"  resolve_author_links: {linked} links in {resolve_time * 1000:.1f} ms")
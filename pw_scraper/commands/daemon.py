@@ -0,0 +1,124 @@
+"""
+Long-running crawl daemon.
+
+    scrapy daemon pw_spider publications --interval 86400
+    scrapy daemon publications --trigger-file run.trigger -a last_years=1
+
+Runs the given spiders one after the other, then waits for the next run:
+--interval seconds after the previous run started, or as soon as the
+--trigger-file exists (it is removed when the run starts). The process
+stays alive between runs, so Playwright, the browser, the database
+connection and the lookup caches of DatabasePipeline stay warm (see
+pw_scraper/warm.py). The lookup caches are dropped after a crawl that did
+not finish cleanly. After every crawl the time the warm resources saved is
+logged.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
+from twisted.internet.defer import Deferred
+
+from pw_scraper.warm import warm
+
+
+class Command(BaseRunSpiderCommand):
+    requires_project = True
+    default_settings = {
+        "PLAYWRIGHT_BROWSER_PROVIDER": "pw_scraper.warm.WarmBrowserProvider",
+    }
+
+    def syntax(self):
+        return "[options] <spider> [<spider> ...]"
+
+    def short_desc(self):
+        return "Run spiders on an interval or trigger in one long-running process"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--interval", type=float, default=0,
+                            help="seconds from the start of a run to the start of the next one")
+        parser.add_argument("--trigger-file", default=None,
+                            help="start a run as soon as this file exists (the file is removed)")
+        parser.add_argument("--runs", type=int, default=0,
+                            help="exit after this many runs (default: run until stopped)")
+        parser.add_argument("--poll", type=float, default=5,
+                            help="seconds between two checks of the trigger file (default: 5)")
+
+    def run(self, args, opts):
+        if not args:
+            raise UsageError("Give at least one spider to run")
+        if opts.interval <= 0 and not opts.trigger_file:
+            raise UsageError("Give --interval, --trigger-file or both")
+        for name in args:
+            try:
+                self.crawler_process.spider_loader.load(name)
+            except KeyError:
+                raise UsageError(f"Spider not found: {name}")
+
+        from twisted.internet import reactor
+
+        warm.active = True
+        reactor.callWhenRunning(lambda: deferred_from_coro(self.serve(args, opts)).addBoth(self.stopped, reactor))
+        self.crawler_process.start(stop_after_crawl=False)
+
+    async def serve(self, spiders, opts):
+        runs = 0
+        next_run = time.time()
+        try:
+            while not opts.runs or runs < opts.runs:
+                await self.wait_for_run(next_run if opts.interval > 0 else None, opts.trigger_file, opts.poll)
+                runs += 1
+                next_run = time.time() + opts.interval
+                for name in spiders:
+                    await self.crawl(name, runs, opts.spargs)
+        finally:
+            await warm.close()
+
+    async def wait_for_run(self, due, trigger_file, poll):
+        """
+        Waits until `due` (a timestamp, None for no schedule) or until `trigger_file` exists.
+        """
+        while True:
+            if trigger_file and os.path.exists(trigger_file):
+                os.remove(trigger_file)
+                logging.info(f"Run triggered by {trigger_file}")
+                return
+            if due is not None and time.time() >= due:
+                return
+            await asyncio.sleep(poll if due is None else max(0.0, min(poll, due - time.time())))
+
+    async def crawl(self, name, run, spargs):
+        """
+        Runs one crawl of the spider `name` and logs what the warm resources saved.
+        """
+        started = time.perf_counter()
+        crawler = self.crawler_process.create_crawler(name)
+        failed = False
+        try:
+            result = self.crawler_process.crawl(crawler, **spargs)
+            await (maybe_deferred_to_future(result) if isinstance(result, Deferred) else result)
+        except Exception as e:
+            logging.error(f"Run {run} of {name} failed: {e}")
+            failed = True
+        elapsed = time.perf_counter() - started
+
+        saved, reused, hits = warm.run_report()
+        reason = crawler.stats.get_value('finish_reason') if crawler.stats else None
+        if failed or reason != 'finished':
+            # The crawl may have stopped in the middle of rolled back writes
+            warm.invalidate(f"run {run} of {name} did not finish ({reason})")
+        logging.info(f"Run {run} of {name} finished in {elapsed:.1f}s ({reason}); "
+                     f"warm resources saved {saved:.2f}s ({reused or 'none reused'}), "
+                     f"{hits} lookups answered from the cache")
+
+    def stopped(self, result, reactor):
+        if hasattr(result, 'getTraceback'):
+            logging.error(f"Crawl daemon stopped: {result.getTraceback()}")
+        if reactor.running:
+            reactor.stop()
@@ -0,0 +1,47 @@
+"""
+Applies the pending schema changes to the scraper database.
+
+    scrapy migrate
+    scrapy migrate --list
+
+Run it once after installing or updating the scraper, before the first
+crawl; see pw_scraper/migrations.py for what each migration changes.
+"""
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pw_scraper.migrations import MigrationError, migrate, pending
+from pw_scraper.pipelines import DatabasePipeline
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": True}
+
+    def short_desc(self):
+        return "Apply the pending schema migrations to the database"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("--list", action="store_true",
+                            help="only list the pending migrations")
+
+    def run(self, args, opts):
+        pipeline = DatabasePipeline()
+        pipeline.connect()
+        if not hasattr(pipeline, 'connection'):
+            raise UsageError("Could not connect to the database", print_help=False)
+        try:
+            if opts.list:
+                names = pending(pipeline.cur)
+                print('\n'.join(names) if names else "No pending migrations")
+                return
+            try:
+                applied = migrate(pipeline.connection)
+            except MigrationError as e:
+                raise UsageError(str(e), print_help=False)
+        finally:
+            pipeline.cur.close()
+            pipeline.connection.close()
+        print('\n'.join(f"Applied {name}" for name in applied) if applied else "No pending migrations")
@@ -0,0 +1,31 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pw_scraper.changefeed import ChangeFeed
+from pw_scraper.migrations import MigrationError
+from pw_scraper.pipelines import DatabasePipeline
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": True}
+
+    def short_desc(self):
+        return "Link staged publication author keys to scientists in the database"
+
+    def run(self, args, opts):
+        # The links are recorded in the change feed under the crawl id resolve_authors-<time>-<random>
+        pipeline = DatabasePipeline(change_feed=ChangeFeed.from_settings(self.settings))
+        pipeline.connect()
+        try:
+            pipeline.check_schema()
+        except MigrationError as e:
+            raise UsageError(str(e), print_help=False)
+        pipeline.changes.open('resolve_authors')
+        try:
+            linked = pipeline.resolve_author_links()
+        finally:
+            pipeline.changes.close()
+            pipeline.cur.close()
+            pipeline.connection.close()
+        print(f"{linked} scientist-publication relations added")
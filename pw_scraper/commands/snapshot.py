@@ -0,0 +1,282 @@
+"""
+Columnar snapshot export of the scraped tables.
+
+    scrapy snapshot -o snapshots/2026-10
+    scrapy snapshot --tables publications scientists_publications --batch-size 20000
+    scrapy snapshot -s STORAGE_BACKEND=sqlite
+
+Writes every table of DatabasePipeline as compressed Parquet files, read
+from the database of STORAGE_BACKEND in one consistent read-only
+transaction. Needs pyarrow, which the crawler does not: install it with
+`pip install -r requirements-snapshot.txt`. Rows are streamed from a
+server-side cursor in batches of --batch-size rows, each written as a row
+group, so the export never holds more than one batch in memory.
+
+Large tables are partitioned in hive style (<table>/<column>=<value>/):
+
+- publications and scientists_publications by publication year
+- scientists and bibliometrics by the institute of the scientist (the
+  lowest id of the institutes they are affiliated with)
+- scientist_organization by organization
+
+Rows without a partition value go to the __HIVE_DEFAULT_PARTITION__
+directory. The other tables are written as a single file.
+"""
+
+import datetime
+import logging
+import os
+import sqlite3
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pw_scraper.pipelines import DatabasePipeline
+
+
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+SCIENTIST_INSTITUTE = ("(SELECT min(so.organization_id) FROM scientist_organization so "
+                       "JOIN organizations o ON o.id = so.organization_id "
+                       "WHERE so.scientist_id = {scientist_id} AND o.type = 'institute')")
+
+# Table: (partition column or None, query, columns). The partition value is the first
+# selected column; the rows are ordered by it, so each partition is written in one go.
+SNAPSHOT_TABLES = {
+    'scientists': ('institute_id', f"""
+        SELECT {SCIENTIST_INSTITUTE.format(scientist_id='s.id')} AS institute_id,
+               s.id, s.first_name, s.last_name, s.academic_title, s.email, s.profile_url, s.position,
+               s.created_at, s.updated_at
+        FROM scientists s ORDER BY 1, s.id""",
+        [('id', 'int64'), ('first_name', 'string'), ('last_name', 'string'), ('academic_title', 'string'),
+         ('email', 'string'), ('profile_url', 'string'), ('position', 'string'),
+         ('created_at', 'timestamp'), ('updated_at', 'timestamp')]),
+    'bibliometrics': ('institute_id', f"""
+        SELECT {SCIENTIST_INSTITUTE.format(scientist_id='b.scientist_id')} AS institute_id,
+               b.id, b.scientist_id, b.h_index_wos, b.h_index_scopus, b.publication_count,
+               b.ministerial_score, b.updated_at
+        FROM bibliometrics b ORDER BY 1, b.id""",
+        [('id', 'int64'), ('scientist_id', 'int64'), ('h_index_wos', 'int64'), ('h_index_scopus', 'int64'),
+         ('publication_count', 'int64'), ('ministerial_score', 'int64'), ('updated_at', 'timestamp')]),
+    'publications': ('year', """
+        SELECT p.publication_date AS year,
+               p.id, p.publication_key, p.title, p.publisher, p.publication_date, p.journal,
+               p.journal_impact_factor, p.ministerial_score, p.updated_at
+        FROM publications p ORDER BY 1, p.id""",
+        [('id', 'int64'), ('publication_key', 'string'), ('title', 'string'), ('publisher', 'string'),
+         ('publication_date', 'date'), ('journal', 'string'), ('journal_impact_factor', 'float64'),
+         ('ministerial_score', 'float64'), ('updated_at', 'timestamp')]),
+    'scientists_publications': ('year', """
+        SELECT p.publication_date AS year, sp.id, sp.scientist_id, sp.publication_id
+        FROM scientists_publications sp JOIN publications p ON p.id = sp.publication_id
+        ORDER BY 1, sp.id""",
+        [('id', 'int64'), ('scientist_id', 'int64'), ('publication_id', 'int64')]),
+    'scientist_organization': ('organization_id', """
+        SELECT organization_id, id, scientist_id, updated_at
+        FROM scientist_organization ORDER BY 1, id""",
+        [('id', 'int64'), ('scientist_id', 'int64'), ('updated_at', 'timestamp')]),
+    'scientists_research_areas': (None, """
+        SELECT scientist_id, research_area_id FROM scientists_research_areas
+        ORDER BY scientist_id, research_area_id""",
+        [('scientist_id', 'int64'), ('research_area_id', 'int64')]),
+    'publication_author_keys': (None, """
+        SELECT publication_id, author_key FROM publication_author_keys ORDER BY publication_id, author_key""",
+        [('publication_id', 'int64'), ('author_key', 'string')]),
+    'organizations': (None, "SELECT id, name, type FROM organizations ORDER BY id",
+                      [('id', 'int64'), ('name', 'string'), ('type', 'string')]),
+    'organizations_relationships': (None, "SELECT id, parent_id, child_id FROM organizations_relationships ORDER BY id",
+                                    [('id', 'int64'), ('parent_id', 'int64'), ('child_id', 'int64')]),
+    'research_areas': (None, "SELECT id, name FROM research_areas ORDER BY id",
+                       [('id', 'int64'), ('name', 'string')]),
+}
+
+
+def to_date(value):
+    # SQLite returns dates and timestamps as ISO strings
+    return datetime.date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def to_timestamp(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def to_float(value):
+    return float(value) if isinstance(value, (Decimal, str)) else value
+
+
+def to_int(value):
+    return round(value) if isinstance(value, (Decimal, float)) else value
+
+
+CONVERTERS = {'date': to_date, 'timestamp': to_timestamp, 'float64': to_float, 'int64': to_int}
+
+
+def partition_value(column, value):
+    """
+    The directory value of a partition: the year of a date, or the id of an organization.
+    """
+    if value is None:
+        return NULL_PARTITION
+    if column == 'year':
+        return str(to_date(value).year)
+    return str(value)
+
+
+class SnapshotWriter:
+    """
+    Writes the rows of one table as Parquet files, one file per partition.
+    """
+
+    def __init__(self, pa, pq, directory, partition_column, columns, compression):
+        self.pa = pa
+        self.pq = pq
+        self.directory = directory
+        self.partition_column = partition_column
+        self.converters = [CONVERTERS.get(kind) for _, kind in columns]
+        types = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string(),
+                 'date': pa.date32(), 'timestamp': pa.timestamp('us')}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.compression = compression
+        self.writer = None
+        self.partition = None
+        self.files = 0
+        self.rows = 0
+
+    def write(self, rows):
+        """
+        Writes a batch of rows, each with its partition value first if the table is partitioned.
+        """
+        if self.partition_column is None:
+            self.write_batch(None, rows)
+            return
+        start = 0
+        current = partition_value(self.partition_column, rows[0][0])
+        for index, row in enumerate(rows):
+            value = partition_value(self.partition_column, row[0])
+            if value != current:
+                self.write_batch(current, [partitioned[1:] for partitioned in rows[start:index]])
+                start, current = index, value
+        self.write_batch(current, [partitioned[1:] for partitioned in rows[start:]])
+
+    def write_batch(self, partition, rows):
+        if self.writer is None or partition != self.partition:
+            self.close()
+            directory = self.directory
+            if partition is not None:
+                directory = os.path.join(directory, f'{self.partition_column}={partition}')
+            os.makedirs(directory, exist_ok=True)
+            self.writer = self.pq.ParquetWriter(os.path.join(directory, 'part-0.parquet'), self.schema,
+                                                compression=self.compression)
+            self.partition = partition
+            self.files += 1
+
+        columns = [[convert(value) for value in column] if convert else list(column)
+                   for convert, column in zip(self.converters, zip(*rows))]
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": True}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Export the scraped tables as partitioned Parquet files"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument("-o", "--output", default=None,
+                            help="directory of the snapshot (default: snapshots/<date and time>)")
+        parser.add_argument("--tables", nargs="+", default=list(SNAPSHOT_TABLES), choices=list(SNAPSHOT_TABLES),
+                            help="tables to export (default: all)")
+        parser.add_argument("--batch-size", type=int, default=50000,
+                            help="rows fetched and written at a time (default: 50000)")
+        parser.add_argument("--compression", default="zstd",
+                            help="Parquet compression codec (default: zstd)")
+
+    def run(self, args, opts):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise UsageError("The snapshot export needs pyarrow: pip install -r requirements-snapshot.txt",
+                             print_help=False)
+        if opts.batch_size <= 0:
+            raise UsageError("--batch-size must be positive")
+
+        output = opts.output or os.path.join('snapshots', time.strftime('%Y%m%d-%H%M%S'))
+        if os.path.isdir(output) and os.listdir(output):
+            raise UsageError(f"{output} is not empty")
+
+        backend = self.settings.get('STORAGE_BACKEND', 'postgres')
+        connection = self.connect(backend)
+        try:
+            for table in opts.tables:
+                partition_column, query, columns = SNAPSHOT_TABLES[table]
+                started = time.perf_counter()
+                writer = SnapshotWriter(pa, pq, os.path.join(output, table), partition_column, columns,
+                                        opts.compression)
+                try:
+                    self.export(connection, backend, table, query, writer, opts.batch_size)
+                finally:
+                    writer.close()
+                print(f"{table}: {writer.rows} rows in {writer.files} files "
+                      f"({time.perf_counter() - started:.1f}s)")
+        finally:
+            connection.close()
+        print(f"Snapshot written to {output}")
+
+    def connect(self, backend):
+        """
+        Opens a connection to the database of the storage backend, in a read-only snapshot transaction.
+        """
+        if backend == 'sqlite':
+            path = self.settings.get('SQLITE_PATH')
+            if not os.path.isfile(path):
+                raise UsageError(f"No SQLite database at SQLITE_PATH {path}", print_help=False)
+            # Read-only, so a wrong path or a snapshot never changes the file
+            connection = sqlite3.connect(f'{Path(path).resolve().as_uri()}?mode=ro', uri=True,
+                                         isolation_level=None)
+            # In WAL mode every read of the transaction sees the database as of its first read
+            connection.execute("BEGIN;")
+            return connection
+
+        import psycopg
+
+        pipeline = DatabasePipeline()
+        pipeline.connect()
+        if not hasattr(pipeline, 'connection'):
+            raise UsageError("Could not connect to the database")
+        pipeline.cur.close()
+        pipeline.connection.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        pipeline.connection.read_only = True
+        return pipeline.connection
+
+    def export(self, connection, backend, table, query, writer, batch_size):
+        if backend == 'sqlite':
+            cursor = connection.cursor()
+        else:
+            # Named cursor: the rows stay on the server until they are fetched
+            cursor = connection.cursor(name=f'snapshot_{table}')
+            cursor.itersize = batch_size
+        try:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write(rows)
+                logging.debug(f"{table}: {writer.rows} rows written")
+        finally:
+            cursor.close()
@@ -0,0 +1,110 @@
+"""
+Deduplication of scraped items within a crawl, before the item pipelines.
+
+A scientist can be reached from several listing pages, a publication from
+every one of its authors, and the organization tree is yielded again by
+every crawl of the people listing. ItemDedupeMiddleware keys each item by
+its natural identity and keeps a 64-bit digest of every key it has let
+through:
+
+- ScientistItem: the author key of its profile URL (else its email)
+- PublicationItem: its publication key (else its title and year)
+- OrganizationItem: the path university / institute / cathedra of each of
+  its cathedras (or of the institute alone)
+
+A scientist or publication whose key was seen is dropped. An organization
+item is merged: it is passed on with only the cathedras not seen yet, and
+dropped when none are left. Items without any key are always passed on.
+
+Counts are kept in the dedupe/<item>/{passed,dropped,merged} stats.
+"""
+
+import hashlib
+
+from scrapy.spidermiddlewares.base import BaseSpiderMiddleware
+
+from pw_scraper.items import OrganizationItem, PublicationItem, ScientistItem
+from pw_scraper.keys import author_key
+
+
+def digest(*parts):
+    """64-bit digest of a key made of `parts`."""
+    key = '\x1f'.join('' if part is None else str(part).strip().lower() for part in parts)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def scientist_key(item):
+    key = author_key(item.profile_url)
+    if key:
+        return digest('author', key)
+    if item.email:
+        return digest('email', item.email)
+    return None
+
+
+def publication_key(item):
+    if item.publication_key:
+        return digest('publication', item.publication_key)
+    if item.title:
+        return digest('title', item.title, item.publication_date)
+    return None
+
+
+class ItemDedupeMiddleware(BaseSpiderMiddleware):
+    """
+    Spider middleware dropping the items already scraped in this crawl.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.seen = set()
+
+    def get_processed_item(self, item, response):
+        if isinstance(item, OrganizationItem):
+            return self.merge_organization(item)
+
+        if isinstance(item, ScientistItem):
+            key = scientist_key(item)
+        elif isinstance(item, PublicationItem):
+            key = publication_key(item)
+        else:
+            return item
+
+        name = type(item).__name__
+        if key is None:
+            self.crawler.stats.inc_value(f'dedupe/{name}/passed')
+            return item
+        if key in self.seen:
+            self.crawler.stats.inc_value(f'dedupe/{name}/dropped')
+            return None
+        self.seen.add(key)
+        self.crawler.stats.inc_value(f'dedupe/{name}/passed')
+        return item
+
+    def merge_organization(self, item):
+        name = type(item).__name__
+        cathedras = item.cathedras or []
+        if not cathedras:
+            key = digest('organization', item.university, item.institute)
+            if key in self.seen:
+                self.crawler.stats.inc_value(f'dedupe/{name}/dropped')
+                return None
+            self.seen.add(key)
+            self.crawler.stats.inc_value(f'dedupe/{name}/passed')
+            return item
+
+        new = []
+        for cathedra in cathedras:
+            key = digest('organization', item.university, item.institute, cathedra)
+            if key not in self.seen:
+                self.seen.add(key)
+                new.append(cathedra)
+
+        if not new:
+            self.crawler.stats.inc_value(f'dedupe/{name}/dropped')
+            return None
+        if len(new) < len(cathedras):
+            self.crawler.stats.inc_value(f'dedupe/{name}/merged')
+            return OrganizationItem(university=item.university, institute=item.institute, cathedras=new)
+        self.crawler.stats.inc_value(f'dedupe/{name}/passed')
+        return item
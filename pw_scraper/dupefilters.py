@@ -0,0 +1,158 @@
+import logging
+import math
+import os
+import pickle
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter stored in a single bytearray.
+
+    Bit positions are derived from the request fingerprint itself (which is
+    already a SHA1 digest) with double hashing, so no extra hashing is done.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint):
+        h1 = int.from_bytes(fingerprint[:8], 'big')
+        h2 = int.from_bytes(fingerprint[8:16], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, fingerprint):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint))
+
+    def add(self, fingerprint):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding slices as it fills up.
+
+    Every new slice has `growth` times the capacity of the previous one and a
+    tighter error rate (multiplied by `tightening`), so the compound false
+    positive rate stays below the configured `error_rate` no matter how many
+    fingerprints are added.
+    """
+
+    def __init__(self, initial_capacity=1_000_000, error_rate=1e-6, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+
+    def __contains__(self, fingerprint):
+        return any(fingerprint in f for f in reversed(self.filters))
+
+    def add(self, fingerprint):
+        """
+        Adds the fingerprint to the filter.
+
+        Returns:
+            bool: True if the fingerprint was (probably) already present.
+        """
+        if fingerprint in self:
+            return True
+
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            capacity = self.initial_capacity * self.growth ** len(self.filters)
+            error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** len(self.filters)
+            self.filters.append(BloomFilter(capacity, error_rate))
+
+        self.filters[-1].add(fingerprint)
+        return False
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    @property
+    def memory_bytes(self):
+        return sum(f.memory_bytes for f in self.filters)
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """
+    Request dupefilter backed by a scalable Bloom filter instead of a set of fingerprints.
+
+    Memory grows by about 4 bytes per request at the default error rate,
+    instead of ~100 bytes per fingerprint for the default set. A false positive
+    makes Scrapy drop a request that was never seen, so keep
+    BLOOM_DUPEFILTER_ERROR_RATE small. With JOBDIR the filter is saved to
+    `requests.bloom` on close and loaded back on resume.
+    """
+
+    def __init__(self, path=None, debug=False, *, fingerprinter=None, stats=None,
+                 initial_capacity=1_000_000, error_rate=1e-6):
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.stats = stats
+        self.path = os.path.join(path, 'requests.bloom') if path else None
+        self.seen = None
+
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                self.seen = pickle.load(file)
+            logging.info(f"Loaded {len(self.seen)} request fingerprints from {self.path}")
+
+        if self.seen is None:
+            self.seen = ScalableBloomFilter(initial_capacity, error_rate)
+
+        self._slices = len(self.seen.filters)
+        self.update_stats()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            job_dir(settings),
+            settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            stats=crawler.stats,
+            initial_capacity=settings.getint('BLOOM_DUPEFILTER_INITIAL_CAPACITY', 1_000_000),
+            error_rate=settings.getfloat('BLOOM_DUPEFILTER_ERROR_RATE', 1e-6),
+        )
+
+    def request_seen(self, request):
+        seen = self.seen.add(self._fingerprint(request))
+
+        if len(self.seen.filters) != self._slices:
+            self._slices = len(self.seen.filters)
+            self.update_stats()
+        elif not seen and self.stats is not None:
+            # Kept current between slices, the memory and slice stats only change with a new slice
+            self.stats.inc_value('dupefilter/bloom/fingerprints')
+
+        return seen
+
+    def update_stats(self):
+        """Reports the size of the filter in the crawl stats."""
+        if self.stats is None:
+            return
+        self.stats.set_value('dupefilter/bloom/memory_bytes', self.seen.memory_bytes)
+        self.stats.set_value('dupefilter/bloom/slices', len(self.seen.filters))
+        self.stats.set_value('dupefilter/bloom/fingerprints', len(self.seen))
+
+    def close(self, reason):
+        self.update_stats()
+        if self.path:
+            with open(self.path, 'wb') as file:
+                pickle.dump(self.seen, file, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,194 @@
+"""
+Per-stage timeouts and hedged requests for the Playwright download handler.
+
+A few pathological profile and publication pages take minutes to render
+and hold a page slot all that time. HedgingDownloadHandler tracks the
+download latency of each stage (the page type of pw_scraper.httpcache,
+e.g. 'listing' or 'profile') over its last HEDGING_WINDOW responses. When
+a Playwright request is still running after the stage's HEDGING_PERCENTILE
+latency, a duplicate of it is sent on a new page: the first response wins,
+the other attempt is cancelled and its page closed. At most
+HEDGING_MAX_IN_FLIGHT duplicates run at a time, so a server that is slow
+for every page does not get twice the load. Hedging is off by default
+(HEDGING_ENABLED), as each duplicate is an extra page and request.
+
+Every Playwright download is also bounded by the hard timeout of its stage
+(PLAYWRIGHT_STAGE_TIMEOUTS, seconds), which is the navigation timeout of
+its page as well. It fails with a Playwright TimeoutError, like a
+navigation that timed out.
+
+Counts and latencies are kept in the hedging/<stage>/* stats.
+
+Unless PLAYWRIGHT_ABORT_REQUEST is set, the resources of each page are
+blocked by the ResourceBlocker of pw_scraper.blocking.
+"""
+
+import asyncio
+import copy
+import logging
+from collections import deque
+from time import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from scrapy_playwright.handler import ScrapyPlaywrightDownloadHandler
+
+from pw_scraper.blocking import ResourceBlocker
+from pw_scraper.httpcache import page_type
+
+
+DEFAULT_STAGE_TIMEOUTS = {
+    'listing': 180,
+    'profile': 180,
+    'bibliometrics': 180,
+    'publication': 180,
+    'default': 180,
+}
+
+
+class StageLatencies:
+    """
+    Download latencies of the last `window` responses of each stage.
+    """
+
+    def __init__(self, window=500, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = {}
+
+    def add(self, stage, latency):
+        self.samples.setdefault(stage, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, stage, fraction):
+        """
+        Returns:
+            float: The `fraction` percentile of the stage's latencies, or None
+                   while it has fewer than `min_samples` of them.
+        """
+        samples = self.samples.get(stage)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class HedgingDownloadHandler(ScrapyPlaywrightDownloadHandler):
+    """
+    Playwright download handler with per-stage hard timeouts and hedged requests.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        settings = crawler.settings
+        self.timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **settings.getdict('PLAYWRIGHT_STAGE_TIMEOUTS'))
+        self.hedging = settings.getbool('HEDGING_ENABLED')
+        self.percentile = settings.getfloat('HEDGING_PERCENTILE', 0.95)
+        self.max_hedges = settings.getint('HEDGING_MAX_IN_FLIGHT', 4)
+        self.latencies = StageLatencies(settings.getint('HEDGING_WINDOW', 500),
+                                        settings.getint('HEDGING_MIN_SAMPLES', 20))
+        self.hedges_in_flight = 0
+        # Page opened for each attempt, so a cancelled attempt's page can be closed
+        self.pages = {}
+        self.blocker = None
+        if not self.abort_request:
+            self.blocker = self.abort_request = ResourceBlocker.from_crawler(crawler)
+
+    def stage_timeout(self, stage):
+        return float(self.timeouts.get(stage, self.timeouts['default']))
+
+    async def _create_page(self, request, spider):
+        page = await super()._create_page(request, spider)
+        page.set_default_navigation_timeout(self.stage_timeout(page_type(request)) * 1000)
+        if self.blocker:
+            self.blocker.watch(page, request)
+        self.pages[request] = page
+        return page
+
+    async def _download_request(self, request, spider=None):
+        stage = page_type(request)
+        timeout = self.stage_timeout(stage)
+        started = time()
+        try:
+            response = await asyncio.wait_for(self.race(request, spider, stage), timeout)
+        except asyncio.TimeoutError:
+            self.stats.inc_value(f'hedging/{stage}/timed_out')
+            raise PlaywrightTimeoutError(f"{stage} page {request.url} took longer than {timeout:.0f}s")
+
+        latency = time() - started
+        self.latencies.add(stage, latency)
+        self.stats.max_value(f'hedging/{stage}/max_latency', round(latency, 1))
+        return response
+
+    def hedge_delay(self, stage, request):
+        """
+        Returns:
+            float: Seconds after which a duplicate of `request` is sent, or None if it is not hedged.
+        """
+        # A request that reuses an open page is part of a page session and is never duplicated
+        if not self.hedging or request.meta.get('dont_hedge') or request.meta.get('playwright_page'):
+            return None
+        delay = self.latencies.percentile(stage, self.percentile)
+        if delay is not None:
+            self.stats.set_value(f'hedging/{stage}/hedge_after', round(delay, 1))
+        return delay
+
+    def hedge_request(self, request):
+        meta = dict(request.meta)
+        meta.pop('playwright_page', None)
+        # Page methods keep their results, each attempt needs its own
+        if meta.get('playwright_page_methods'):
+            meta['playwright_page_methods'] = [copy.copy(method) for method in meta['playwright_page_methods']]
+        return request.replace(meta=meta)
+
+    async def race(self, request, spider, stage):
+        """
+        Downloads `request`, hedged with a duplicate once it is slower than the stage's percentile.
+        """
+        attempts = {asyncio.ensure_future(super()._download_request(request, spider)): request}
+        hedge = None
+        winner = None
+        try:
+            delay = self.hedge_delay(stage, request)
+            if delay is not None:
+                await asyncio.wait(list(attempts), timeout=delay)
+                if not any(task.done() for task in attempts) and self.hedges_in_flight < self.max_hedges:
+                    hedge = self.hedge_request(request)
+                    attempts[asyncio.ensure_future(super()._download_request(hedge, spider))] = hedge
+                    self.hedges_in_flight += 1
+                    self.stats.inc_value(f'hedging/{stage}/sent')
+                    logging.debug(f"Hedging {request.url} after {delay:.1f}s")
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = attempts[task]
+                        break
+                if winner is not None:
+                    break
+
+            if winner is None:
+                # Every attempt failed: report the failure of the original request
+                return next(iter(attempts)).result()
+            if winner is hedge:
+                # The callback gets the hedge's page, latency, ...
+                request.meta.update(hedge.meta)
+                self.stats.inc_value(f'hedging/{stage}/won')
+            return next(task for task, attempt in attempts.items() if attempt is winner).result()
+        finally:
+            if hedge is not None:
+                self.hedges_in_flight -= 1
+            for task, attempt in attempts.items():
+                if attempt is winner:
+                    self.pages.pop(attempt, None)
+                    continue
+                if not task.done():
+                    task.cancel()
+                    try:
+                        await task
+                    except (asyncio.CancelledError, Exception):
+                        pass
+                page = self.pages.pop(attempt, None)
+                if page is not None and not page.is_closed():
+                    await page.close()
+                    self.stats.inc_value(f'hedging/{stage}/pages_closed')
@@ -0,0 +1,127 @@
+"""
+Rate-limited, sampled logging for messages written once per item or response.
+
+At 100k+ items a log line per item costs noticeable CPU and disk. HotLog
+groups messages by a key (e.g. 'db.publication_added'): each key writes at
+most HOTLOG_MAX_PER_INTERVAL messages per HOTLOG_INTERVAL seconds, then only
+one in HOTLOG_SAMPLE_EVERY. Every message is counted, and the counts are
+logged every HOTLOG_REPORT_INTERVAL seconds and when the spider closes.
+
+Messages use logging's lazy %-formatting, so suppressed messages are never
+formatted. Full details (item reprs, SQL text) are only passed to the logger
+when LOG_LEVEL is DEBUG, and then nothing is rate limited. (Scrapy filters
+by LOG_LEVEL in its log handler, not on the loggers, so the level is taken
+from the settings.)
+"""
+
+import logging
+from time import monotonic
+
+from scrapy import signals
+
+
+def log_level(value):
+    """
+    Converts a LOG_LEVEL setting, a level number or a name such as 'info', to a level number.
+    """
+    if isinstance(value, int):
+        return value
+    if str(value).strip().isdigit():
+        return int(value)
+    level = logging.getLevelName(str(value).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {value!r}")
+    return level
+
+
+class HotLog:
+    """
+    Per-key rate limiting and sampling in front of a logger.
+    """
+
+    def __init__(self, logger, level=None, max_per_interval=5, interval=60, sample_every=1000, report_interval=60):
+        self.logger = logger
+        self.level = logger.getEffectiveLevel() if level is None else level
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.sample_every = sample_every
+        self.report_interval = report_interval
+
+        # key -> [messages in the current window, start of the window, total messages]
+        self.windows = {}
+        # key -> [messages, suppressed] since the last report
+        self.counts = {}
+        self.next_report = monotonic() + report_interval
+
+    @classmethod
+    def from_crawler(cls, crawler, logger):
+        settings = crawler.settings
+        log = cls(logger,
+                  level=log_level(settings.get('LOG_LEVEL', 'DEBUG')),
+                  max_per_interval=settings.getint('HOTLOG_MAX_PER_INTERVAL', 5),
+                  interval=settings.getfloat('HOTLOG_INTERVAL', 60),
+                  sample_every=settings.getint('HOTLOG_SAMPLE_EVERY', 1000),
+                  report_interval=settings.getfloat('HOTLOG_REPORT_INTERVAL', 60))
+        crawler.signals.connect(log.spider_closed, signal=signals.spider_closed)
+        return log
+
+    def log(self, key, level, msg, *args, details=None):
+        """
+        Logs `msg % args` under `key`, unless the key is over its rate.
+
+        Args:
+            key (str): The message key the rate applies to.
+            level (int): The logging level.
+            msg (str): The message, with %-style placeholders for `args`.
+            details: Logged after the message when DEBUG is enabled. A callable is called first.
+        """
+        now = monotonic()
+        counts = self.counts.setdefault(key, [0, 0])
+        counts[0] += 1
+
+        if self.level <= logging.DEBUG:
+            self.logger.log(level, msg, *args)
+            if details is not None:
+                self.logger.debug('%s: %s', key, details() if callable(details) else details)
+        elif level >= self.level:
+            window = self.windows.get(key)
+            if window is None or now - window[1] >= self.interval:
+                window = self.windows[key] = [0, now, window[2] if window else 0]
+            window[0] += 1
+            window[2] += 1
+
+            if window[0] <= self.max_per_interval:
+                self.logger.log(level, msg, *args)
+            elif self.sample_every and window[2] % self.sample_every == 0:
+                self.logger.log(level, msg + ' (sampled 1/%d)', *args, self.sample_every)
+            else:
+                counts[1] += 1
+
+        if now >= self.next_report:
+            self.report()
+
+    def debug(self, key, msg, *args, **kwargs):
+        self.log(key, logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, key, msg, *args, **kwargs):
+        self.log(key, logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, key, msg, *args, **kwargs):
+        self.log(key, logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, key, msg, *args, **kwargs):
+        self.log(key, logging.ERROR, msg, *args, **kwargs)
+
+    def report(self):
+        """Logs the message counts per key since the last report."""
+        self.next_report = monotonic() + self.report_interval
+        if not self.counts:
+            return
+
+        summary = ', '.join(f'{key}={total}' + (f' ({suppressed} suppressed)' if suppressed else '')
+                            for key, (total, suppressed) in sorted(self.counts.items()))
+        self.logger.info('Message counts: %s', summary)
+        self.counts = {}
+
+    def spider_closed(self, spider):
+        self.report()
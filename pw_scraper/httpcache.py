@@ -0,0 +1,196 @@
+"""
+HTTP cache policy and storage for repo.pw.edu.pl.
+
+The repository sends few caching headers, so RepoCachePolicy keeps using
+the server's own freshness information (max-age, Expires) and validators
+(ETag, Last-Modified) where they are present, and otherwise falls back to a
+freshness TTL per page type. Stale entries are revalidated with conditional
+requests when the cached response has validators.
+
+SqliteCacheStorage keeps the whole cache in a single SQLite file with
+compressed bodies and evicts the least recently used entries once it grows
+past HTTPCACHE_MAX_BYTES.
+
+Both apply to Playwright requests too: HttpCacheMiddleware answers a fresh
+request before it reaches the download handler, so no page is opened.
+
+The cache is off by default (HTTPCACHE_ENABLED). Profile pages and their
+bibliometrics POSTs are cached independently, so a crawl served partly
+from the cache can post to a JSF view the server never rendered for it.
+"""
+
+import logging
+import os
+import sqlite3
+import zlib
+from email.utils import formatdate
+from time import time
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+
+
+DEFAULT_TTLS = {
+    'listing': 6 * 3600,
+    'profile': 7 * 24 * 3600,
+    'bibliometrics': 7 * 24 * 3600,
+    'publication': 30 * 24 * 3600,
+    'default': 24 * 3600,
+}
+
+
+def page_type(request):
+    """
+    Classifies a request to repo.pw.edu.pl by the kind of page it fetches.
+
+    Returns:
+        str: 'listing', 'profile', 'bibliometrics', 'publication' or 'default'.
+    """
+    path = urlparse_cached(request).path
+    if path.startswith('/globalResultList'):
+        return 'listing'
+    if path.startswith('/info/author/'):
+        if request.method != 'POST':
+            return 'profile'
+        # Panels of the profile are loaded with POSTs to its URL: the publication tab is a
+        # result listing, anything else the bibliometrics panel
+        return 'listing' if b'resultTabsOutputPanel_load' in request.body else 'bibliometrics'
+    if path.startswith('/info/'):
+        return 'publication'
+    return 'default'
+
+
+class RepoCachePolicy(RFC2616Policy):
+    """
+    RFC2616 policy with per-page-type freshness TTLs (HTTPCACHE_REPO_TTLS, in seconds).
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(settings.getdict('HTTPCACHE_REPO_TTLS'))
+
+    def should_cache_response(self, response, request):
+        if super().should_cache_response(response, request):
+            return True
+        # Without validators or expiration headers the TTL of the page type applies; no-store
+        # responses are never cached
+        return response.status == 200 and b'no-store' not in self._parse_cachecontrol(response)
+
+    def _compute_freshness_lifetime(self, response, request, now):
+        cc = self._parse_cachecontrol(response)
+        if b'max-age' in cc or b'Expires' in response.headers:
+            return super()._compute_freshness_lifetime(response, request, now)
+        return self.ttls.get(page_type(request), self.ttls['default'])
+
+
+class SqliteCacheStorage:
+    """
+    HTTP cache storage in a single SQLite database per spider, with size-based LRU eviction.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES')
+        self.db = None
+        self.size = 0
+
+    def open_spider(self, spider):
+        dbpath = os.path.join(self.cachedir, f'{spider.name}.sqlite')
+        self.db = sqlite3.connect(dbpath, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint BLOB PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers BLOB NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        logging.debug(f"Using SQLite cache storage in {dbpath} ({self.size} bytes)")
+
+    def close_spider(self, spider):
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self.db.execute(
+            'SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?',
+            (fingerprint,)).fetchone()
+        if row is None:
+            return None  # not cached
+
+        url, status, headers, body, stored_at = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None  # expired
+
+        self.db.execute('UPDATE responses SET accessed_at = ? WHERE fingerprint = ?', (time(), fingerprint))
+
+        request.meta['cache_timestamp'] = stored_at
+        headers = Headers(self._decode_headers(headers))
+        body = zlib.decompress(body)
+        response_class = responsetypes.from_args(headers=headers, url=url, body=body)
+        return response_class(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        fingerprint = self._fingerprinter.fingerprint(request)
+        headers = Headers(response.headers)
+        # The age of an entry is computed from its Date header
+        if b'Date' not in headers:
+            headers[b'Date'] = formatdate(usegmt=True)
+
+        headers = self._encode_headers(headers)
+        body = zlib.compress(response.body)
+        size = len(body) + len(headers)
+        now = time()
+
+        previous = self.db.execute('SELECT size FROM responses WHERE fingerprint = ?', (fingerprint,)).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, response.url, response.status, headers, body, size, now, now))
+        self.size += size - (previous[0] if previous else 0)
+
+        if self.max_bytes and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used responses until the cache is below 90% of HTTPCACHE_MAX_BYTES."""
+        target = self.max_bytes * 0.9
+        freed = 0
+        evicted = []
+        for fingerprint, size in self.db.execute('SELECT fingerprint, size FROM responses ORDER BY accessed_at'):
+            if self.size - freed <= target:
+                break
+            evicted.append((fingerprint,))
+            freed += size
+
+        self.db.executemany('DELETE FROM responses WHERE fingerprint = ?', evicted)
+        self.size -= freed
+        logging.debug(f"Evicted {len(evicted)} responses ({freed} bytes) from the HTTP cache")
+
+    @staticmethod
+    def _encode_headers(headers):
+        return b'\r\n'.join(key + b': ' + value for key, values in headers.items() for value in values)
+
+    @staticmethod
+    def _decode_headers(data):
+        headers = {}
+        for line in data.split(b'\r\n'):
+            if line:
+                key, value = line.split(b': ', 1)
+                headers.setdefault(key, []).append(value)
+        return headers
@@ -2,34 +2,48 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+#
+# Items are slotted dataclasses: fields have a fixed order and type, and
+# instances carry no per-item dict. Access them by name, through ItemAdapter
+# or as attributes.
+#
+# Spiders fill the fields with raw scraped strings; CleanItemsPipeline
+# converts them to the annotated types. The `normalize` metadata picks a
+# more specific conversion than the type alone (e.g. a year out of a date).
 
-import scrapy
+from dataclasses import dataclass, field
+from typing import Optional
 
 
-class ScientistItem(scrapy.Item):
-    first_name = scrapy.Field()
-    last_name = scrapy.Field()
-    academic_title = scrapy.Field()
-    email = scrapy.Field()
-    profile_url = scrapy.Field()
-    position=scrapy.Field()
-    h_index_scopus = scrapy.Field()
-    h_index_wos = scrapy.Field()
-    publication_count = scrapy.Field()
-    ministerial_score = scrapy.Field()
-    organization= scrapy.Field()
-    research_area = scrapy.Field()
+@dataclass(slots=True)
+class ScientistItem:
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    academic_title: Optional[str] = None
+    email: Optional[str] = None
+    profile_url: Optional[str] = field(default=None, metadata={'normalize': 'url'})
+    position: Optional[str] = None
+    h_index_scopus: Optional[int] = None
+    h_index_wos: Optional[int] = None
+    publication_count: Optional[int] = None
+    ministerial_score: Optional[float] = None
+    organization: Optional[list[str]] = None
+    research_area: Optional[list[str]] = None
 
-class PublicationItem(scrapy.Item):
-    title = scrapy.Field()
-    journal = scrapy.Field()
-    publisher = scrapy.Field()
-    publication_date = scrapy.Field()
-    ministerial_score = scrapy.Field()
-    authors = scrapy.Field()
-    vol= scrapy.Field()
+@dataclass(slots=True)
+class PublicationItem:
+    title: Optional[str] = None
+    journal: Optional[str] = None
+    publisher: Optional[str] = None
+    publication_date: Optional[int] = field(default=None, metadata={'normalize': 'year'})
+    ministerial_score: Optional[float] = None
+    authors: Optional[list[str]] = field(default=None, metadata={'normalize': 'url'})
+    vol: Optional[str] = None
+    # Identifier of the publication in the repository, from its URL
+    publication_key: Optional[str] = None
 
-class OrganizationItem(scrapy.Item):
-    university = scrapy.Field()
-    institute= scrapy.Field()
-    cathedras = scrapy.Field() #list of cathedras
\ No newline at end of file
+@dataclass(slots=True)
+class OrganizationItem:
+    university: Optional[str] = None
+    institute: Optional[str] = None
+    cathedras: Optional[list[str]] = None #list of cathedras
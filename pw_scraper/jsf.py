@@ -0,0 +1,70 @@
+"""
+Helpers for the JSF/PrimeFaces partial (AJAX) requests used by repo.pw.edu.pl.
+"""
+
+import scrapy
+from lxml import etree
+
+
+def partial_update(response_body, update_id=None):
+    """
+    Returns the CDATA content of an <update> element of a JSF partial response.
+
+    Args:
+        response_body (bytes): Body of the partial response.
+        update_id (str): Id of the updated component. If None, the first update is returned.
+
+    Returns:
+        str: The markup sent for the component, or None if the response has no such update.
+    """
+    root = etree.fromstring(response_body)
+    if update_id is None:
+        updates = root.xpath('//update/text()')
+    else:
+        updates = root.xpath('//update[@id=$id]/text()', id=update_id)
+    return updates[0] if updates else None
+
+
+def ajax_formdata(source, **params):
+    """
+    Builds the form fields of a PrimeFaces AJAX request that processes and re-renders `source`.
+    """
+    formdata = {
+        "javax.faces.partial.ajax": "true",
+        "javax.faces.source": source,
+        "primefaces.ignoreautoupdate": "true",
+        "javax.faces.partial.execute": source,
+        "javax.faces.partial.render": source,
+        source: source,
+    }
+    formdata.update(params)
+    return formdata
+
+
+def tree_expand_request(form_response, tree_id, row_key, headers=None, **kwargs):
+    """
+    Creates the request PrimeFaces sends when a node of a dynamic tree is expanded.
+
+    The request is a postback of the form containing the tree, so it carries
+    the ViewState of `form_response` and must be sent in the same session.
+    The partial response contains the <li> elements of the node's children.
+
+    Args:
+        form_response (scrapy.http.HtmlResponse): The page with the tree.
+        tree_id (str): Client id of the tree component.
+        row_key (str): data-rowkey of the node to expand.
+        headers (dict): AJAX request headers.
+        **kwargs: Passed to scrapy.FormRequest (callback, cb_kwargs, meta, ...).
+    """
+    form = form_response.xpath(f'//*[@id="{tree_id}"]/ancestor::form[1]')
+    formdata = {field.attrib['name']: field.attrib.get('value', '')
+                for field in form.xpath('.//input[@type="hidden"][@name]')}
+    formdata.update(ajax_formdata(tree_id, **{f'{tree_id}_expandNode': row_key}))
+
+    return scrapy.FormRequest(
+        url=form_response.urljoin(form.attrib.get('action', form_response.url)),
+        formdata=formdata,
+        headers=headers,
+        dont_filter=True,
+        **kwargs,
+    )
@@ -0,0 +1,46 @@
+"""
+Natural keys of the entities of repo.pw.edu.pl, taken from their URLs.
+
+Profile and publication URLs carry a stable identifier in their path, e.g.
+https://repo.pw.edu.pl/info/author/WUT380d40e7f4a5405f977b188023ffd002?r=publication&ps=20
+The query string differs between the places a URL is linked from, the
+identifier does not.
+"""
+
+from urllib.parse import urlsplit
+
+
+def path_key(url, prefix):
+    """
+    Returns the path segment that follows `prefix` in the URL, or None.
+    """
+    if not url:
+        return None
+    path = urlsplit(url.strip()).path
+    _, found, rest = path.partition(prefix)
+    if not found:
+        return None
+    return rest.split('/', 1)[0] or None
+
+
+def author_key(url):
+    """The identifier of an author profile URL (e.g. 'WUT380d40e7...')."""
+    return path_key(url, '/info/author/')
+
+
+def publication_key(url):
+    """
+    The identifier of a publication URL (/info/<type>/<KEY>, e.g. /info/article/WUT3f6d...),
+    or None for author profiles and other pages.
+    """
+    if not url:
+        return None
+    parts = urlsplit(url.strip()).path.strip('/').split('/')
+    if len(parts) < 3 or parts[0] != 'info' or parts[1] == 'author':
+        return None
+    return parts[2] or None
+
+
+def author_key_sql(column):
+    """SQL expression that extracts the author key from a profile URL column, like author_key()."""
+    return f"split_part(split_part(split_part({column}, '/info/author/', 2), '?', 1), '/', 1)"
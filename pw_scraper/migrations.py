@@ -0,0 +1,136 @@
+"""
+Schema changes of the scraper database, applied with `scrapy migrate`.
+
+The pipeline adds its own tables and columns to the database schema:
+
+- publication_author_keys, the author profile keys of every publication,
+  whether the author is already in the scientists table or not, with an
+  expression index that joins them with scientists.profile_url
+- publications.publication_key, the identifier of the publication in the
+  repository (NULL for rows saved before it was added), and its unique index
+- change_events, the change feed (see pw_scraper/changefeed.py), and its
+  txid column, the transaction of each event, which consumers read it by
+
+Each migration runs once, in its own transaction, and is recorded in the
+schema_migrations table. The spiders and commands never change the schema
+themselves: DatabasePipeline checks at open that no migration is pending.
+"""
+
+from pw_scraper.keys import author_key_sql
+
+
+class MigrationError(Exception):
+    """A migration can not be applied to the data in the database."""
+
+
+def publication_author_keys(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS publication_author_keys (
+            publication_id INTEGER NOT NULL REFERENCES publications(id) ON DELETE CASCADE,
+            author_key TEXT NOT NULL,
+            PRIMARY KEY (publication_id, author_key)
+        );""")
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS scientists_author_key_idx
+        ON scientists (({author_key_sql('profile_url')}));""")
+
+
+def publication_key(cursor):
+    cursor.execute("ALTER TABLE publications ADD COLUMN IF NOT EXISTS publication_key TEXT;")
+    cursor.execute("""
+        SELECT publication_key, count(*) FROM publications
+        WHERE publication_key IS NOT NULL
+        GROUP BY publication_key HAVING count(*) > 1
+        ORDER BY count(*) DESC LIMIT 5;""")
+    duplicates = cursor.fetchall()
+    if duplicates:
+        raise MigrationError("Duplicate publication keys, merge or clear these rows first: "
+                             + ', '.join(f'{key} ({count} rows)' for key, count in duplicates))
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS publications_publication_key_idx
+        ON publications (publication_key);""")
+
+
+def change_events(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_events (
+            id BIGSERIAL PRIMARY KEY,
+            crawl_id TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_key TEXT NOT NULL,
+            change TEXT NOT NULL,
+            fields JSONB,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS change_events_crawl_id_idx ON change_events (crawl_id);")
+
+
+def change_events_txid(cursor):
+    # Events already in the table get the id of this transaction
+    cursor.execute("ALTER TABLE change_events ADD COLUMN IF NOT EXISTS txid xid8 NOT NULL "
+                   "DEFAULT pg_current_xact_id();")
+    cursor.execute("CREATE INDEX IF NOT EXISTS change_events_txid_idx ON change_events (txid, id);")
+
+
+# In the order they are applied; the names are recorded, so they never change
+MIGRATIONS = [
+    ('0001_publication_author_keys', publication_author_keys),
+    ('0002_publication_key', publication_key),
+    ('0003_change_events', change_events),
+    ('0004_change_events_txid', change_events_txid),
+]
+
+
+def applied(cursor):
+    """
+    Returns:
+        set: The names of the migrations applied to the database.
+    """
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return set()
+    cursor.execute("SELECT name FROM schema_migrations;")
+    return {name for name, in cursor.fetchall()}
+
+
+def pending(cursor):
+    """
+    Returns:
+        list: The names of the migrations not applied to the database yet.
+    """
+    names = applied(cursor)
+    return [name for name, _ in MIGRATIONS if name not in names]
+
+
+def migrate(connection):
+    """
+    Applies the pending migrations, each in its own transaction.
+
+    Args:
+        connection (psycopg.Connection): Connection to the scraper database.
+
+    Returns:
+        list: The names of the migrations applied.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );""")
+        connection.commit()
+
+        applied = []
+        names = pending(cursor)
+        for name, migration in MIGRATIONS:
+            if name not in names:
+                continue
+            try:
+                migration(cursor)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s);", (name,))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            applied.append(name)
+        return applied
@@ -0,0 +1,87 @@
+"""
+Choice of the page size (`ps` parameter) of the result listings.
+
+The listings show a few rows per page by default, so a full crawl sends
+thousands of listing requests. PageSizeProbe tries the LISTING_PAGE_SIZES
+candidates from the largest down: the first page of a listing is requested
+with a candidate, and the candidate is kept if that page came back within
+LISTING_PAGE_SIZE_LATENCY_BUDGET seconds. The server may serve fewer rows
+than asked for; the page count shown on the probed page is always computed
+for the rows actually served, so it is the one to use.
+"""
+
+import logging
+
+from scrapy import signals
+
+
+class PageSizeProbe:
+    """
+    Probes and remembers the page size of each listing ('people', 'publication', ...).
+    """
+
+    def __init__(self, candidates, latency_budget, stats=None):
+        self.candidates = sorted(set(candidates), reverse=True)
+        self.latency_budget = latency_budget
+        self.stats = stats
+        self.chosen = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # From the command line (-s LISTING_PAGE_SIZES=100,50,20) the sizes are strings
+        probe = cls([int(size) for size in crawler.settings.getlist('LISTING_PAGE_SIZES')],
+                    crawler.settings.getfloat('LISTING_PAGE_SIZE_LATENCY_BUDGET'))
+        # The probe is created with the spider, before the crawler has its stats collector
+        crawler.signals.connect(probe.spider_opened, signal=signals.spider_opened)
+        return probe
+
+    def spider_opened(self, spider):
+        self.stats = spider.crawler.stats
+
+    def first(self, listing):
+        """
+        Returns:
+            int: The page size to request the first page of `listing` with,
+                 or None for the server's default.
+        """
+        if listing in self.chosen:
+            return self.chosen[listing]
+        return self.candidates[0] if self.candidates else None
+
+    def probed(self, listing):
+        """
+        Returns:
+            bool: Whether a page size of `listing` has been accepted.
+        """
+        return listing in self.chosen
+
+    def accept(self, listing, page_size, response, rows):
+        """
+        Decides whether `page_size` is served within the latency budget.
+
+        Args:
+            listing (str): Name of the listing.
+            page_size (int): The page size the response was requested with (None for the default).
+            response (scrapy.http.Response): The probed first page.
+            rows (int): Number of result rows on the page.
+
+        Returns:
+            int|bool: True if the page size is kept, otherwise the next page size to try
+                      (None for the server's default).
+        """
+        latency = response.meta.get('download_latency', 0)
+        if self.stats:
+            self.stats.inc_value(f'listing/{listing}/page_size_probes')
+
+        if page_size is None or latency <= self.latency_budget or rows == 0:
+            self.chosen[listing] = page_size
+            if self.stats:
+                self.stats.set_value(f'listing/{listing}/page_size', page_size or rows)
+            logging.info(f"Listing {listing}: page size {page_size or 'default'} "
+                         f"({rows} rows in {latency:.1f}s)")
+            return True
+
+        smaller = [size for size in self.candidates if size < page_size]
+        logging.info(f"Listing {listing}: page size {page_size} took {latency:.1f}s, "
+                     f"over the {self.latency_budget}s budget")
+        return smaller[0] if smaller else None
@@ -0,0 +1,229 @@
+"""
+HTML extraction for the scientist, bibliometrics and publication pages.
+
+The functions here take plain response bodies and return plain dicts, so
+they can run in a worker process (see ParsePool) as well as in the crawler
+process itself. Items are built from the dicts by the spiders.
+"""
+
+import ast
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup as bs
+from scrapy import signals
+from scrapy.selector import Selector
+
+from pw_scraper.jsf import partial_update
+from pw_scraper.keys import publication_key
+
+
+# Map of raw input to valid enum values
+ACADEMIC_TITLE_MAP = {
+    'Doctor': 'DSc',
+    'Ph.D.': 'PhD',
+    'Professor': 'Prof.',
+    'Master Of Science': 'MSc',
+    'Bachelor Of Science': 'BSc',
+    'Professor Assistant' : 'BSc'
+}
+
+VALID_ACADEMIC_TITLES = {'PhD', 'DSc', 'Prof.', 'DVM', 'MSc', 'BSc'}
+
+EMAIL_DATA_RE = re.compile(r"datax=(.*?\]\])")
+
+
+def email_creator(datax):
+    first=datax[0]
+    second=datax[1]
+    res=[None for i in range(0, len(second))]
+
+    for i in range(0, len(second)):
+        let=first[i]
+        if let=='#':
+            let='@'
+        res[second[i]]=let
+
+    return ''.join(res)
+
+
+def extract_scientist(text, url):
+    """
+    Scrapes scientist profile page.
+
+    Args:
+        text (str): The HTML of the profile page.
+        url (str): The URL of the profile page.
+
+    Returns:
+        dict: Personal data of the scientist, without the bibliometrics.
+    """
+    response = Selector(text=text)
+
+    match = EMAIL_DATA_RE.search(text)
+    email=None
+    if match:
+        datax = ast.literal_eval(match.group(1))
+        email=email_creator(datax)
+
+    personal_data=response.css('div.authorProfileBasicInfoPanel')
+
+    names=personal_data.css('p.author-profile__name-panel::text').get().strip()
+    first_name=None
+    last_name=None
+    if names:
+        # Split by comma to separate name from the academic title
+        names = names.split(',')
+        name_part = names[0].strip()  # The part before the comma (the actual name)
+
+        name_parts = name_part.split()  # Split the name by spaces
+        first_name = name_parts[0]  # First name is the first part
+        last_name = name_parts[-1]  # Last name is the last part (even if there's a middle name)
+
+    academic_title=response.css('div.careerAchievementListPanel ul.careerAchievementList li span.achievementName span::text').getall() or None
+
+    if academic_title:
+        # Normalize academic title
+        academic_title = ACADEMIC_TITLE_MAP.get(academic_title[0], academic_title[0])
+
+    position=personal_data.css('p.possitionInfo span::text').get() or ''
+
+    organization_scientist=personal_data.css('ul.authorAffilList li span a>span::text').getall()
+    organization=organization_scientist if organization_scientist else ''
+
+    research_area=response.css('div.researchFieldsPanel ul.ul-element-wcag li span::text').getall()
+    research_area=research_area if research_area else ''
+
+    return dict(first_name=first_name,
+                last_name=last_name,
+                email=email,
+                academic_title=academic_title,
+                position=position,
+                organization=organization,
+                research_area=research_area,
+                profile_url=url)
+
+
+def extract_bibliometrics(body):
+    """
+    Scrapes the lazily loaded bibliometrics panel of a scientist profile.
+
+    Args:
+        body (bytes): The JSF partial response with the panel.
+
+    Returns:
+        dict: h-indexes, publication count and (if shown) ministerial score.
+    """
+    soup = bs(partial_update(body), 'html.parser')
+    bibliometrics = {}
+
+    h_index_scopus = soup.find(id="j_id_22_1_1_8_7_3_5b_2_1:1:j_id_22_1_1_8_7_3_5b_2_6")
+    bibliometrics['h_index_scopus']= h_index_scopus.find_all(string=True, recursive=False)[0].strip() if h_index_scopus else 0
+
+    h_index_wos = soup.find(id="j_id_22_1_1_8_7_3_5b_2_1:2:j_id_22_1_1_8_7_3_5b_2_6")
+    bibliometrics['h_index_wos']= h_index_wos.find_all(string=True, recursive=False)[0].strip() if h_index_wos else 0
+
+    publication_count = soup.find(id="j_id_22_1_1_8_7_3_56_9:0:j_id_22_1_1_8_7_3_56_o_1")
+    bibliometrics['publication_count']= publication_count.find_all(string=True, recursive=False)[0].strip() if publication_count else 0
+
+    ministerial_score = soup.find(id="j_id_22_1_1_8_7_3_5b_a_2")
+    if ministerial_score:
+        bibliometrics['ministerial_score']= ministerial_score.text.replace('\xa0','').strip() if ministerial_score and ('—' not in ministerial_score) else 0
+
+    return bibliometrics
+
+
+def _details_field(response, label, path='/text()'):
+    return response.xpath(f'//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "{label}")]]/following-sibling::dd[1]{path}').get()
+
+
+def extract_publication(text, url, pw_url='https://repo.pw.edu.pl'):
+    """
+    Scrapes publication page.
+
+    Args:
+        text (str): The HTML of the publication page.
+        url (str): The URL of the publication page.
+        pw_url (str): Base URL the relative author links are resolved against.
+
+    Returns:
+        dict: The fields of a PublicationItem.
+    """
+    response = Selector(text=text)
+
+    authors_selector = response.css('div.authorListElement>a::attr(href)').getall() or None
+    if authors_selector:
+        authors_selector=[pw_url+link for link in authors_selector]
+
+    publication = {}
+
+    publication['title']=response.css('div.publicationShortInfo>h2::text').get() or None
+
+    journal=_details_field(response, 'Journal series', '//a/text()')
+    publication['journal']=journal or None
+
+    publishers=[_details_field(response, 'Publisher', '//a/span/span/text()'),
+                _details_field(response, 'Publisher', '//div/text()'),
+                _details_field(response, 'Publisher')]
+    publishers=[j for j in publishers if j and j.strip()!='']
+    publication['publisher']=publishers[0] if publishers else None
+
+    pub_dates=[_details_field(response, 'Year of creation'),
+               _details_field(response, 'Issue year'),
+               _details_field(response, 'Year of creation', '/div/text()'),
+               _details_field(response, 'Issue year', '/div/text()')]
+    pub_dates=[date for date in pub_dates if date and date.strip()!='0' and date.strip()!='']
+    publication['publication_date'] = pub_dates[0] if pub_dates else None
+
+    publication['authors']=authors_selector
+
+    parts=[_details_field(response, 'Vol'), _details_field(response, 'Vol', '/div/text()')]
+    parts=[p for p in parts if p and p.strip()!='']
+    publication['vol']= parts[0] if parts else None
+
+    m_scores=[_details_field(response, 'Score (nominal)'), _details_field(response, 'Score (nominal)', '/div/text()')]
+    m_scores=[s for s in m_scores if s and s.strip()!='']
+    publication['ministerial_score']=m_scores[0] if m_scores else None
+
+    publication['publication_key']=publication_key(url)
+
+    return publication
+
+
+class ParsePool:
+    """
+    Runs the extraction functions in a pool of worker processes.
+
+    Enabled with PARSE_PROCESS_POOL_ENABLED. Only the response bodies go to
+    the workers and only plain dicts come back, so the reactor thread is left
+    with the network and item handling. When disabled, the functions are
+    called inline.
+    """
+
+    def __init__(self, workers=0):
+        self.executor = None
+        if workers:
+            self.executor = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        workers = 0
+        if crawler.settings.getbool('PARSE_PROCESS_POOL_ENABLED'):
+            workers = crawler.settings.getint('PARSE_PROCESS_POOL_WORKERS') or os.cpu_count()
+
+        pool = cls(workers)
+        crawler.signals.connect(pool.close, signal=signals.spider_closed)
+        return pool
+
+    async def run(self, func, *args):
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.wrap_future(self.executor.submit(func, *args))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,150 @@
+"""
+Partitioning of the publication listing by publication year.
+
+Each partition is the listing filtered to a single year. Partitions are
+crawled independently and their progress is checkpointed to a JSON file,
+so an interrupted crawl resumes without refetching finished listing pages.
+A listing page only counts as finished once every publication linked from
+it has been scraped (or failed for good), so publications that were queued
+or in flight when a crawl stopped are requested again on resume.
+"""
+
+import json
+import logging
+import os
+from datetime import date
+
+
+def year_partitions(years=None, last_years=None):
+    """
+    Parses the partition spider arguments into a list of years.
+
+    Args:
+        years (str): Years as '2015-2024', '2019,2021' or a mix of both.
+        last_years (str|int): Only the last K years, including the current one.
+
+    Returns:
+        list: The years to crawl, newest first, or an empty list if not partitioned.
+    """
+    selected = set()
+
+    if last_years:
+        current_year = date.today().year
+        selected.update(range(current_year - int(last_years) + 1, current_year + 1))
+
+    for part in str(years or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        selected.update(range(int(start), int(end or start) + 1))
+
+    return sorted(selected, reverse=True)
+
+
+def filter_ignored(total_pages, rows, listing_pages, listing_rows):
+    """
+    Tells whether a partition is as large as the whole listing, i.e. the server ignored its filter.
+
+    The page sizes may differ, so the partition's largest possible row count
+    is compared with the smallest possible row count of the listing.
+
+    Args:
+        total_pages (int): The page count of the partition.
+        rows (int): The rows per page of the partition.
+        listing_pages (int): The page count of the unfiltered listing.
+        listing_rows (int): The rows per page of the unfiltered listing.
+    """
+    if listing_pages <= 1:
+        # Too small a listing to tell
+        return False
+    return total_pages * rows >= (listing_pages - 1) * listing_rows + 1
+
+
+class PartitionCheckpoint:
+    """
+    Progress of every partition: its page count and the listing pages already crawled.
+
+    The file looks like {"2021": {"total_pages": 40, "page_size": 100, "done": [1, 2, 5]}}.
+    """
+
+    def __init__(self, path, save_every=20):
+        self.path = path
+        self.save_every = save_every
+        self.state = {}
+        self.unsaved = 0
+        # Detail pages still to finish, per (partition, listing page)
+        self.in_flight = {}
+
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.state = json.load(file)
+            logging.info(f"Loaded checkpoint of {len(self.state)} partitions from {path}")
+
+    def _partition(self, partition):
+        return self.state.setdefault(str(partition), {'total_pages': None, 'page_size': None, 'done': []})
+
+    def set_total_pages(self, partition, total_pages, page_size=None):
+        state = self._partition(partition)
+        state['total_pages'] = total_pages
+        state['page_size'] = page_size
+        self.save()
+
+    def page_size(self, partition):
+        return self._partition(partition).get('page_size')
+
+    def total_pages(self, partition):
+        return self._partition(partition)['total_pages']
+
+    def pending_pages(self, partition):
+        """Listing pages of the partition that haven't been crawled yet."""
+        state = self._partition(partition)
+        done = set(state['done'])
+        return [page for page in range(1, (state['total_pages'] or 0) + 1) if page not in done]
+
+    def is_complete(self, partition):
+        return self.total_pages(partition) is not None and not self.pending_pages(partition)
+
+    def page_done(self, partition, page_number):
+        state = self._partition(partition)
+        if page_number not in state['done']:
+            state['done'].append(page_number)
+
+        self.unsaved += 1
+        if self.unsaved >= self.save_every or self.is_complete(partition):
+            self.save()
+
+    def page_scheduled(self, partition, page_number, details):
+        """
+        Registers the detail pages requested from a listing page. The page is done
+        once detail_done() was called for each of them.
+        """
+        if details:
+            self.in_flight[(str(partition), page_number)] = details
+        else:
+            self.page_done(partition, page_number)
+
+    def detail_done(self, partition, page_number):
+        """Records that one detail page of a listing page finished."""
+        key = (str(partition), page_number)
+        remaining = self.in_flight.get(key)
+        if remaining is None:
+            return
+        if remaining > 1:
+            self.in_flight[key] = remaining - 1
+            return
+        del self.in_flight[key]
+        self.page_done(partition, page_number)
+
+    def reset(self, partition):
+        """Forgets the progress of a partition, so it is crawled again from the start."""
+        self.state.pop(str(partition), None)
+
+    def save(self):
+        self.unsaved = 0
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file)
+        os.replace(tmp_path, self.path)
@@ -1,25 +1,154 @@
 import json
 import logging
+from contextlib import nullcontext
+from dataclasses import fields
+from datetime import date
+from typing import Union, get_args, get_origin, get_type_hints
+from urllib.parse import urljoin
 from itemadapter import ItemAdapter
 import psycopg
+from psycopg import sql
 from dotenv import load_dotenv
 import os
+from pw_scraper.changefeed import ChangeFeed, relation_key
+from pw_scraper.hotlog import HotLog
 from pw_scraper.items import ScientistItem, PublicationItem, OrganizationItem
+from pw_scraper.keys import author_key, author_key_sql
+from pw_scraper.migrations import MIGRATIONS, MigrationError, applied
+from pw_scraper.warm import LookupCache, warm
 import re
-from scrapy.exceptions import DropItem
+import sqlite3
+from time import perf_counter
+from scrapy.exceptions import DropItem, NotConfigured
+
+
+# Item fields in the column order of the scientists and bibliometrics tables
+SCIENTIST_FIELDS = ('first_name', 'last_name', 'academic_title', 'email', 'profile_url', 'position')
+BIBLIOMETRICS_FIELDS = ('h_index_wos', 'h_index_scopus', 'publication_count', 'ministerial_score')
+
+
+WHITESPACE_RE = re.compile(r'\s+')
+NUMBER_RE = re.compile(r'-?\d+(?:[.,]\d+)?')
+YEAR_RE = re.compile(r'(?<!\d)(\d{4})(?!\d)')
+
+PW_URL = 'https://repo.pw.edu.pl'
+
+
+def normalize_text(value):
+    """Strips the value and replaces runs of whitespace with a single space."""
+    if not isinstance(value, str):
+        return value
+    return WHITESPACE_RE.sub(' ', value).strip()
+
+
+def normalize_float(value):
+    """Parses a number such as '140,5', '20\\n\\n ' or '1 234' into a float, or None."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = NUMBER_RE.search(WHITESPACE_RE.sub('', value))
+    return float(match.group().replace(',', '.')) if match else None
+
+
+def normalize_int(value):
+    """Parses a number into an int (rounding decimals), or None."""
+    number = normalize_float(value)
+    return round(number) if number is not None else None
+
+
+def normalize_year(value):
+    """Parses a year out of values such as '1918\\n\\t  ' or '2020-05-01', or None."""
+    if value is None or isinstance(value, int):
+        return value
+    match = YEAR_RE.search(value)
+    return int(match.group(1)) if match else None
+
+
+def normalize_url(value):
+    """Strips the URL and resolves it against the repository if it is relative."""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    return urljoin(PW_URL, value) if value else None
+
+
+NORMALIZERS = {
+    str: normalize_text,
+    int: normalize_int,
+    float: normalize_float,
+    'year': normalize_year,
+    'url': normalize_url,
+}
+
+
+def normalize_list(normalizer):
+    def normalize(values):
+        if not values:
+            return values
+        return [normalizer(value) for value in values]
+    return normalize
+
+
+def compile_normalization_plan(item_class):
+    """
+    Builds the list of (field name, normalizer) pairs for an item class.
+
+    The normalizer of a field is picked from its `normalize` metadata, or else
+    from its annotated type (Optional[int], list[str], ...).
+    """
+    hints = get_type_hints(item_class)
+    plan = []
+
+    for item_field in fields(item_class):
+        field_type = hints[item_field.name]
+        # Optional[X] -> X
+        args = [arg for arg in get_args(field_type) if arg is not type(None)]
+        if get_origin(field_type) is Union and len(args) == 1:
+            field_type = args[0]
+
+        is_list = get_origin(field_type) is list
+        if is_list:
+            field_type = get_args(field_type)[0]
+
+        normalizer = NORMALIZERS.get(item_field.metadata.get('normalize', field_type))
+        if normalizer is None:
+            continue
+
+        plan.append((item_field.name, normalize_list(normalizer) if is_list else normalizer))
+
+    return tuple(plan)
+
+
+def item_label(item):
+    """Short name of an item for log messages: title, scientist name or institute."""
+    adapter = ItemAdapter(item)
+    item_name = adapter.get('title')
+    if not item_name:
+        item_name = f"{adapter.get('last_name')} {adapter.get('first_name')}" if adapter.get('first_name') else None
+    if not item_name:
+        item_name = adapter.get('institute')
+    return item_name
 
 
 class CleanItemsPipeline:
     # Clean items before saving to the database
+
+    def __init__(self, log=None):
+        # Normalization plans, compiled once per item class
+        self.plans = {}
+        self.log = log or HotLog(logging.getLogger(__name__))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(log=HotLog.from_crawler(crawler, logging.getLogger(__name__)))
+
     def process_item(self, item, spider):
         """
-        Processes and cleans the fields of the given item before saving it.
+        Processes and normalizes the fields of the given item before saving it.
 
-        This method uses the ItemAdapter to standardize access to item fields
-        and applies specific cleaning routines based on the type of item being processed.
-        For ScientistItem and PublicationItem, it cleans the fields by removing
-        unwanted whitespace and normalizing spaces. OrganizationItem is currently
-        processed without any additional cleaning.
+        Every item class gets a normalization plan, compiled once from its field
+        types: strings are stripped with whitespace runs collapsed, numbers,
+        years and URLs are converted from the raw scraped text. Later stages get
+        typed values and do not re-parse them.
 
         Args:
             item: The item to process, which can be an instance of ScientistItem,
@@ -30,57 +159,40 @@ class CleanItemsPipeline:
             The processed item after cleaning operations.
         """
 
-        adapter = ItemAdapter(item)
-
         if isinstance(item, ScientistItem):
-            if not adapter.get('academic_title'):
+            if not item.academic_title:
                 missing_field = 'academic title'
-                logging.warning(f"Item missing required field: {missing_field}")
+                self.log.warning('clean.missing_field', "Item missing required field: %s", missing_field)
                 raise DropItem('')
-                return None
-                
-            self.clean_fields(adapter)
-
-        elif isinstance(item, PublicationItem):
-            self.clean_fields(adapter)
-
-        elif isinstance(item, OrganizationItem):
-            # Seemingly no fields of item need to be cleaned
-            pass
-
-        item_name = adapter.get('title')
-        if not item_name:
-            item_name = f"{adapter.get('last_name')} {adapter.get('first_name')}" if adapter.get('first_name') else None
-        if not item_name:
-            item_name = adapter.get('institute')
-            
-        logging.info(f"Cleaned item: {item_name}")
+
+        self.clean_fields(item)
+
+        self.log.info('clean.cleaned', "Cleaned item: %s", item_label(item), details=item)
         return item
 
-    def clean_fields(self, adapter):  
+    def clean_fields(self, item):
         """
-        Cleans the fields of a ScientistItem or PublicationItem by stripping whitespace and normalizing spaces.
-
-        This method iterates over all fields of the given item adapter. For each field with
-        a string value, it performs the following cleaning operations:
-        1. Strips leading and trailing whitespace.
-        2. Replaces multiple consecutive spaces with a single space.
+        Converts the fields of the item in place, following the plan for its class.
 
         Args:
-            adapter (ItemAdapter): The adapter of the item containing the fields to be cleaned.
+            item: The item containing the fields to be cleaned.
         """
+        plan = self.plans.get(type(item))
+        if plan is None:
+            plan = self.plans[type(item)] = compile_normalization_plan(type(item))
 
-        for field_name in adapter.field_names():
-            field_value = adapter.get(field_name)
-
-            if isinstance(field_value, str):
-                field_value = field_value.strip()
-                # Replace multiple spaces with a single space
-                field_value = re.sub(r'\s+', ' ', field_value)
-                adapter[field_name] = field_value
+        for field_name, normalize in plan:
+            setattr(item, field_name, normalize(getattr(item, field_name)))
 
 
 class SaveToJsonFilePipeline:
+    def __init__(self, log=None):
+        self.log = log or HotLog(logging.getLogger(__name__))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(log=HotLog.from_crawler(crawler, logging.getLogger(__name__)))
+
     def open_spider(self, spider):
         # Initialize JSON files
         self.organisation_file_path = 'organisation.json'
@@ -108,20 +220,22 @@ class SaveToJsonFilePipeline:
         Returns:
             The processed item.
         """
-        if "university" in item:  # Organization item
+        adapter = ItemAdapter(item)
+
+        if isinstance(item, OrganizationItem):
             file_path = self.organisation_file_path
-        elif "profile_url" in item and "first_name" not in item:  # Scientist link
+        elif isinstance(item, ScientistItem) and not adapter.get('first_name'):  # Scientist link
             file_path = self.links_file_path
-        elif "first_name" in item:  # Scientist personal data
+        elif isinstance(item, ScientistItem):  # Scientist personal data
             file_path = self.personal_data_file_path
         else:
-            logging.warning(f"Unknown item type: {item}")
+            self.log.warning('json.unknown_item', "Unknown item type: %s", type(item).__name__, details=item)
             return item
 
         # Append the item to the appropriate file
-        self.append_to_json_file(file_path, dict(item))
+        self.append_to_json_file(file_path, adapter.asdict())
 
-        logging.info(f"Saved item to {file_path}: {item}")
+        self.log.info('json.saved', "Saved item to %s: %s", file_path, item_label(item), details=item)
         return item
 
     def initialize_json_file(self, file_path):
@@ -145,15 +259,71 @@ class SaveToJsonFilePipeline:
 
 
 class DatabasePipeline:
+    def __init__(self, resolve_authors_on_close=True, log=None, pipeline_mode=False, change_feed=None):
+        self.resolve_authors_on_close = resolve_authors_on_close
+        self.log = log or HotLog(logging.getLogger(__name__))
+        self.pipeline_mode = pipeline_mode and psycopg.Pipeline.is_supported()
+        # Events of the rows changed by the current item, see pw_scraper/changefeed.py
+        self.changes = change_feed or ChangeFeed()
+        # Ids of organizations and research areas; shared by the crawls of one daemon run
+        self.lookups = warm.lookups if warm.active else LookupCache()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.get('STORAGE_BACKEND', 'postgres') != 'postgres':
+            raise NotConfigured('STORAGE_BACKEND is not postgres')
+        return cls(resolve_authors_on_close=crawler.settings.getbool('AUTHOR_LINKS_RESOLVE_ON_CLOSE', True),
+                   log=HotLog.from_crawler(crawler, logging.getLogger(__name__)),
+                   pipeline_mode=crawler.settings.getbool('DATABASE_PIPELINE_MODE'),
+                   change_feed=ChangeFeed.from_settings(crawler.settings))
+
     def open_spider(self, spider):
         """
         This method is called when the spider is opened. It connects to the PostgreSQL
-        database using the environment variables set in the .env file. The connection
-        and cursor objects are stored as instance variables.
+        database and checks that its schema is migrated (`scrapy migrate`).
 
         :param spider: The spider that is being opened.
         :type spider: scrapy.Spider
         """
+        self.connect()
+        try:
+            self.check_schema()
+        except MigrationError as e:
+            # The crawl is stopped without the error being logged, and there is nothing to resolve at close
+            logging.error(str(e))
+            self.resolve_authors_on_close = False
+            raise
+        self.changes.open(spider.name)
+
+        logging.info(f'Spider: {spider.name} connected to database')
+
+    def connect(self):
+        """
+        Connects to the PostgreSQL database using the environment variables set in
+        the .env file. The connection and cursor objects are stored as instance variables.
+
+        In the crawl daemon the connection of the previous crawl is reused if it still works.
+        """
+        if warm.active and warm.connection is not None and not warm.connection.closed:
+            try:
+                if warm.connection.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+                    warm.connection.rollback()
+                # The server may have been restarted since the previous crawl
+                warm.connection.execute("SELECT 1;")
+                warm.connection.rollback()
+            except psycopg.OperationalError as e:
+                logging.warning(f"Connection of the previous crawl is broken, reconnecting: {e}")
+                warm.connection.close()
+                warm.connection = None
+                # The server may also have been restored from a backup
+                warm.invalidate('the database connection was lost')
+            else:
+                self.connection = warm.connection
+                self.cur = self.connection.cursor()
+                warm.reuse('database connection')
+                return
+
+        started = perf_counter()
         dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
         load_dotenv(dotenv_path=dotenv_path)
 
@@ -169,8 +339,25 @@ class DatabasePipeline:
             self.cur = self.connection.cursor()
         except Exception as e:
             logging.error(f"Error connecting to the database: {e}")
+            return
 
-        logging.info(f'Spider: {spider.name} connected to database')
+        if warm.active:
+            warm.connection = self.connection
+            warm.cold('database connection', perf_counter() - started)
+
+    def check_schema(self):
+        """
+        Raises MigrationError if the database lacks a schema change of pw_scraper/migrations.py.
+
+        In the crawl daemon the cached lookups are dropped if the schema changed since the previous crawl.
+        """
+        migrations = applied(self.cur)
+        self.connection.rollback()
+        names = [name for name, _ in MIGRATIONS if name not in migrations]
+        if names:
+            raise MigrationError(f"The database needs the migrations {', '.join(names)}: run `scrapy migrate`")
+        if self.lookups is warm.lookups:
+            warm.check_schema(migrations)
 
     def process_item(self, item, spider):
         """
@@ -186,99 +373,177 @@ class DatabasePipeline:
        
         adapter = ItemAdapter(item)
 
-        if isinstance(item, ScientistItem):
-            scientist_fields = tuple(ItemAdapter(item).values())
+        try:
+            with self.statement_pipeline():
+                if isinstance(item, ScientistItem):
+                    self.process_scientist(adapter)
+
+                elif isinstance(item, PublicationItem):
+                    self.log.info('db.publication', "Database processing item: %s", adapter.get('title'))
+                    authors = adapter.get('authors')
+                    # Only the year of publication is known
+                    publication_date = date(adapter['publication_date'], 1, 1) if adapter['publication_date'] else None
+                    publication_id = self.update_publication(adapter['title'],
+                                                             adapter['publisher'],
+                                                             publication_date,
+                                                             adapter['journal'],
+                                                             adapter['ministerial_score'],
+                                                             adapter['publication_key'])
+
+                    # publication_author_keys table, linked to scientists_publications at close
+                    self.stage_author_keys(publication_id, authors or [])
+
+                elif isinstance(item, OrganizationItem):
+                    university_id = self.update_organization(adapter.get('university'),
+                                                             'university')
+                    self.update_organization_relationship(None, university_id)
+
+                    institute_id = self.update_organization(adapter.get('institute'),
+                                                            'institute')
+                    self.update_organization_relationship(university_id, institute_id)
+
+                    cathedras = adapter.get('cathedras')
+                    if cathedras:
+                        for cathedra in cathedras:
+                            cathedra_id = self.update_organization(
+                                cathedra, 'cathedra')
+                            self.update_organization_relationship(
+                                institute_id, cathedra_id)
+                            self.update_organization_relationship(cathedra_id, None)
+                    else:
+                        self.update_organization_relationship(institute_id, None)
+
+                self.changes.write(self.cur)
+                self.connection.commit()
+            self.lookups.commit()
+            self.changes.commit()
+        except Exception as e:
+            # Not only database errors: a half-saved item must never be committed with the next one
+            self.log.error('db.item_error', "Error saving %s: %s", item_label(item), e)
+            self.connection.rollback()
+            self.lookups.rollback()
+            self.changes.rollback()
 
-            # scientist table
-            scientist_id = self.update_scientist(adapter, scientist_fields)
+        return item
 
-            # bibliometrics table
-            self.update_scientist_bibliometrics(
-                adapter, scientist_id, scientist_fields[6:10])
+    def statement_pipeline(self):
+        """
+        Context in which the statements of an item are sent in psycopg pipeline mode.
 
-            # scientist_organization table
-            self.update_scientist_relationship(scientist_id, adapter)
+        In pipeline mode a statement is sent without waiting for the result of
+        the previous one; the client only waits when a result is fetched (or at
+        commit), so independent statements share one network round trip.
+        """
+        if self.pipeline_mode:
+            return self.connection.pipeline()
+        return nullcontext()
 
-            # scientist_research_areas table
-            self.update_research_area(adapter, scientist_id)
+    def process_scientist(self, adapter):
+        """
+        Saves a scientist with their bibliometrics, organizations and research areas.
 
-            return item
+        The statements are ordered by what they depend on, so that in pipeline
+        mode each group costs one round trip: the lookups that only need the
+        item, then the insert or update of the scientist, then everything that
+        needs the scientist's id, and finally the bibliometrics write.
 
-        elif isinstance(item, PublicationItem):
-            logging.info(f"Database processing item: {adapter.get('title')}")
-            authors = adapter.get('authors')
-            if adapter['publication_date']:
-                adapter['publication_date'] += '-01-01'
-            if authors:
-                for author_id in authors:
-                    publication_id = self.update_publication(adapter['title'],
-                                                                 adapter['publisher'],
-                                                                 adapter['publication_date'],
-                                                                 adapter['journal'],
-                                                                 adapter['ministerial_score'])
-                    
-                    select_query = "SELECT id FROM scientists WHERE profile_url like %s;"
-                    try:
-                        self.cur.execute(select_query, ('%' + author_id + '%',))
-                    except Exception as e:
-                        logging.error(f"Error executing query: {e}")
-                    result = self.cur.fetchone() if self.cur.rowcount > 0 else None
-
-                    if result is not None:
-                        scientist_id = result[0]
-                        self.update_author_publications(
-                            scientist_id, publication_id)
-
-        elif isinstance(item, OrganizationItem):
-            university_id = self.update_organization(adapter.get('university'),
-                                                     'university')
-            self.update_organization_relationship(None, university_id)
-
-            institute_id = self.update_organization(adapter.get('institute'),
-                                                    'institute')
-            self.update_organization_relationship(university_id, institute_id)
-
-            cathedras = adapter.get('cathedras')
-            if cathedras:
-                for cathedra in cathedras:
-                    cathedra_id = self.update_organization(
-                        cathedra, 'cathedra')
-                    self.update_organization_relationship(
-                        institute_id, cathedra_id)
-                    self.update_organization_relationship(cathedra_id, None)
-            else:
-                self.update_organization_relationship(institute_id, None)
+        Args:
+            adapter (ItemAdapter): The adapter of the scientist item.
+        """
+        # scientists, organizations and research_areas lookups (names already looked up are cached)
+        organizations = adapter.get('organization') or []
+        research_areas = adapter.get('research_area') or []
+        scientist_lookup = self.find_scientist(adapter)
+        organizations_lookup = self.find_organizations(self.lookups.missing('organizations', organizations))
+        research_areas_lookup = self.find_research_areas(self.lookups.missing('research_areas', research_areas))
+
+        # scientist table
+        scientist_id = self.update_scientist(adapter, scientist_lookup.fetchone())
+        if scientist_id is None:
+            return
 
-        self.connection.commit()
-        return item
+        # bibliometrics lookup, scientist_organization and scientists_research_areas tables
+        bibliometrics_lookup = self.find_bibliometrics(scientist_id)
+        organization_ids, unknown_organizations = self.lookup_ids('organizations', organizations,
+                                                                  organizations_lookup)
+        research_area_ids, _ = self.lookup_ids('research_areas', research_areas, research_areas_lookup)
+        syncs = [
+            self.update_scientist_relationship(scientist_id, organization_ids, unknown_organizations),
+            self.update_research_area(scientist_id, research_area_ids),
+        ]
+
+        # bibliometrics table
+        self.update_scientist_bibliometrics(adapter, scientist_id, bibliometrics_lookup.fetchone())
+
+        for cursor in syncs:
+            self.sync_result(cursor)
+
+    def lookup_ids(self, table, names, lookup):
+        """
+        Fetches the (id, name) rows of a lookup into the cache and returns the ids of `names`.
+
+        Args:
+            table (str): The cache table, 'organizations' or 'research_areas'.
+            names (list): The names of the item.
+            lookup (psycopg.Cursor): The lookup of the names missing from the cache, or None.
+
+        Returns:
+            tuple: The ids of the names found in the database, and the names
+            that are neither in the database nor in the cache.
+        """
+        # A name can match several rows (an institute and a cathedra of the same name)
+        found = {}
+        if lookup is not None:
+            for row_id, name in lookup.fetchall():
+                found.setdefault(name, []).append(row_id)
+            for name, row_ids in found.items():
+                self.lookups.add(table, name, row_ids)
+        not_found = [name for name in names if name not in found]
+        unknown = self.lookups.missing(table, not_found)
+        cached = self.lookups.values(table, not_found)
+        return [row_id for row_ids in cached + list(found.values()) for row_id in row_ids], unknown
 
     def close_spider(self, spider):
+        if self.resolve_authors_on_close:
+            self.resolve_author_links()
+        self.changes.close()
 
         self.cur.close()
+        if self.connection is warm.connection:
+            # Kept open for the next crawl of the daemon
+            return
         self.connection.close()
         logging.info(f'Spider: {spider.name}Database connection closed')
 
-    def update_scientist(self, adapter, scientist_fields):
+    def find_scientist(self, adapter):
+        """
+        Sends the lookup of a scientist by email.
+
+        Returns:
+            psycopg.Cursor: The cursor the row of the scientist will be fetched from.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT id, first_name, last_name, academic_title, email, profile_url, position FROM scientists WHERE email = %s;
+        """, (adapter.get('email'),))
+        return cursor
+
+    def update_scientist(self, adapter, scientist_db_check):
         """
         Updates a scientist in the database if it already exists, otherwise it adds the scientist to the database.
 
         Args:
             adapter (ItemAdapter): The adapter of the item that contains the scientist's information.
-            scientist_fields (list): A list of fields of the scientist to be updated or added.
+            scientist_db_check (tuple): The row found by find_scientist(), or None.
 
         Returns:
             int: The id of the scientist in the database.
         """
         email = adapter.get('email')
-        
-        search_query = """
-            SELECT id, first_name, last_name, academic_title, email, profile_url, position FROM scientists WHERE email = %s;
-        """
-        self.cur.execute(search_query, (email,))
-        scientist_db_check = self.cur.fetchone()
+        scientist_fields = tuple(adapter.get(field) for field in SCIENTIST_FIELDS)
 
         if scientist_db_check:
-            if scientist_db_check[1:] != scientist_fields[:6]:
+            if scientist_db_check[1:] != scientist_fields:
                 update_query = """
                                 UPDATE scientists
                                 SET
@@ -291,17 +556,15 @@ class DatabasePipeline:
                                     position=%s
                                 WHERE email = %s;
                                 """
-                try:
-                    self.cur.execute(update_query, (email,))
-                except Exception as e:
-                    logging.error(f"Error executing query inside update_scientist: {e}")
+                self.cur.execute(update_query, scientist_fields + (email,))
+                self.changes.record('scientist', scientist_db_check[0], 'update', self.changes.changed_fields(
+                    SCIENTIST_FIELDS, scientist_db_check[1:], scientist_fields))
 
-                logging.info(
-                    f"{adapter.get('first_name')} {adapter.get('last_name')} updated in the database")
+                self.log.info('db.scientist_updated', "%s %s updated in the database",
+                              adapter.get('first_name'), adapter.get('last_name'))
 
             return scientist_db_check[0]
         else:
-            logging.log(logging.INFO, f"Adding {adapter.get('first_name')} {adapter.get('last_name')} to the database")
             add_query = """ 
                 INSERT INTO
                 scientists (
@@ -320,115 +583,191 @@ class DatabasePipeline:
                     %s,
                     %s
                 ) RETURNING id;"""
-            logging.info(f"Executing query: {add_query} with values: {scientist_fields[:6]}")
+            self.log.debug('db.scientist_query', "Executing query: %s with values: %s", add_query, scientist_fields)
 
-            self.cur.execute(add_query, scientist_fields[:6])
+            self.cur.execute(add_query, scientist_fields)
             result = self.cur.fetchone()  
 
             if result and result[0] is not None: 
                 scientist_id = result[0]
-                logging.info(
-                    f"{adapter.get('first_name')} {adapter.get('last_name')} added to the database with ID {scientist_id}"
-                )
-                self.connection.commit()
+                self.changes.record('scientist', scientist_id, 'insert', dict(zip(SCIENTIST_FIELDS, scientist_fields)))
+                self.log.info('db.scientist_added', "%s %s added to the database with ID %s",
+                              adapter.get('first_name'), adapter.get('last_name'), scientist_id)
                 return scientist_id
             else:
-                logging.warning(f"Failed to insert {adapter.get('first_name')} {adapter.get('last_name')} into the database")
+                self.log.warning('db.scientist_failed', "Failed to insert %s %s into the database",
+                                 adapter.get('first_name'), adapter.get('last_name'))
                 return None
 
 
-    def update_publication(self, title, publisher, publication_date, journal, ministerial_score):
+    def update_publication(self, title, publisher, publication_date, journal, ministerial_score, publication_key=None):
         """
         Updates a publication in the database if it already exists, or inserts a new one if it doesn't.
 
+        Publications are matched on their repository key. Rows saved before
+        the key was stored are matched on title and date instead, and get the
+        key, so each legacy row is claimed by a single publication.
+
         Args:
             title: The title of the publication.
             publisher: The publisher of the publication.
-            publication_date: The publication date of the publication (in ISO 8601 format).
+            publication_date (datetime.date): The publication date of the publication.
             journal: The name of the journal the publication was published in.
             ministerial_score: The ministerial score of the publication.
+            publication_key (str): The identifier of the publication in the repository, if known.
 
         Returns:
             The id of the publication in the database.
         """
-        try:
-            select_query = "SELECT id, journal, ministerial_score FROM publications WHERE title = %s AND (publication_date = %s OR publication_date IS NULL);"
-            self.cur.execute(select_query, (title, publication_date))
-            result = self.cur.fetchone()
-        except Exception as e:
-            logging.error(f"Error select query inside update_publications query: {e}")
+        if publication_key:
+            select_query = """
+                SELECT id, journal, ministerial_score, publication_key FROM (
+                    SELECT 0 AS rank, id, journal, ministerial_score, publication_key
+                    FROM publications WHERE publication_key = %(key)s
+                    UNION ALL
+                    (SELECT 1, id, journal, ministerial_score, publication_key
+                     FROM publications
+                     WHERE publication_key IS NULL AND title = %(title)s
+                       AND (publication_date = %(date)s OR publication_date IS NULL)
+                     LIMIT 1)
+                ) matches ORDER BY rank LIMIT 1;"""
+        else:
+            select_query = """
+                SELECT id, journal, ministerial_score, publication_key FROM publications
+                WHERE title = %(title)s AND (publication_date = %(date)s OR publication_date IS NULL);"""
+        self.cur.execute(select_query, {'key': publication_key, 'title': title, 'date': publication_date})
+        result = self.cur.fetchone()
+
         if result:
-            if result[1:3] != (journal, ministerial_score,):
+            if result[1:3] != (journal, ministerial_score,) or (publication_key and result[3] is None):
                 update_query = """
                                 UPDATE publications
                                 SET
                                     journal = %s,
                                     ministerial_score = %s,
+                                    publication_key = COALESCE(publication_key, %s),
                                     updated_at = CURRENT_TIMESTAMP
                                 WHERE id = %s;
                                 """
-                try:
-                    self.cur.execute(
-                        update_query, (journal, ministerial_score, result[0]))
-                except Exception as e:
-                    logging.error(f"Error update inside update_publications query: {e}")
+                self.cur.execute(update_query, (journal, ministerial_score, publication_key, result[0]))
+                self.changes.record('publication', result[0], 'update', self.changes.changed_fields(
+                    ('journal', 'ministerial_score', 'publication_key'), result[1:4],
+                    (journal, ministerial_score, result[3] or publication_key)))
 
-            logging.info(f"Publication in the database updated")
+            self.log.info('db.publication_updated', "Publication in the database updated")
             return result[0]
 
         else:
+            # A publication with the same key saved in the meantime is updated instead
             insert_query = """
                             INSERT INTO 
                             publications 
-                            (title, publisher, publication_date, journal_impact_factor, journal, ministerial_score) 
-                            VALUES (%s, %s, %s, 0, %s, %s) RETURNING id;"""
-            try:
-                self.cur.execute(insert_query, (title, publisher,
-                                publication_date, journal, ministerial_score))
-            except Exception as e:
-                logging.error(f"Error insert query: {e}")
+                            (title, publisher, publication_date, journal_impact_factor, journal, ministerial_score, publication_key) 
+                            VALUES (%s, %s, %s, 0, %s, %s, %s)
+                            ON CONFLICT (publication_key) DO UPDATE SET
+                                journal = EXCLUDED.journal,
+                                ministerial_score = EXCLUDED.ministerial_score,
+                                updated_at = CURRENT_TIMESTAMP
+                            RETURNING id, xmax = 0;"""
+            self.cur.execute(insert_query, (title, publisher, publication_date, journal, ministerial_score,
+                                            publication_key))
+            publication_id, inserted = self.cur.fetchone()
+            if inserted:
+                self.changes.record('publication', publication_id, 'insert', {
+                    'title': title, 'publisher': publisher, 'publication_date': publication_date,
+                    'journal': journal, 'ministerial_score': ministerial_score, 'publication_key': publication_key})
+            else:
+                self.changes.record('publication', publication_id, 'update',
+                                    {'journal': journal, 'ministerial_score': ministerial_score})
 
-            logging.info(f"Publication added to the database")
-            return self.cur.fetchone()[0]
+            self.log.info('db.publication_added', "Publication added to the database")
+            return publication_id
 
-    def update_author_publications(self, scientist_id, publication_id):
+    def stage_author_keys(self, publication_id, authors):
         """
-        Updates the scientist-publication relation in the database if it already exists, or inserts a new one if it doesn't.
+        Stores the author profile keys of a publication in publication_author_keys.
+
+        Authors don't need to be in the scientists table yet: the keys are linked
+        to scientists by resolve_author_links(). Keys and scientist links of
+        authors no longer listed for the publication are removed.
 
         Args:
-            scientist_id (int): The id of the scientist.
             publication_id (int): The id of the publication.
-
-        Returns:
-            int: The id of the scientist-publication relation in the database.
+            authors (list): Profile URLs of the authors.
         """
-        select_query = """
-                    SELECT scientist_id 
-                    FROM scientists_publications
-                    WHERE scientist_id=%s AND publication_id=%s;"""
+        author_keys = list({key for key in map(author_key, authors) if key})
+
+        query = f"""
+                WITH stale_keys AS (
+                    DELETE FROM publication_author_keys
+                    WHERE publication_id = %(publication)s AND NOT (author_key = ANY(%(keys)s::text[]))
+                    RETURNING 1
+                ),
+                stale_links AS (
+                    DELETE FROM scientists_publications sp
+                    USING scientists s
+                    WHERE sp.publication_id = %(publication)s AND sp.scientist_id = s.id
+                      AND NOT ({author_key_sql('s.profile_url')} = ANY(%(keys)s::text[]))
+                    RETURNING sp.scientist_id
+                ),
+                new_keys AS (
+                    INSERT INTO publication_author_keys (publication_id, author_key)
+                    SELECT %(publication)s, unnest(%(keys)s::text[])
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                SELECT scientist_id FROM stale_links;
+                """
         try:
-            self.cur.execute(select_query, (scientist_id, publication_id))
-            result = self.cur.fetchone()
+            self.cur.execute(query, {'publication': publication_id, 'keys': author_keys})
+            # Only fetched for the feed: in pipeline mode a fetch waits for the reply
+            if self.changes.enabled:
+                for (scientist_id,) in self.cur.fetchall():
+                    self.changes.record('scientists_publications', relation_key(scientist_id, publication_id),
+                                        'delete', {'scientist_id': scientist_id, 'publication_id': publication_id})
         except Exception as e:
-            logging.error(f"Error select inside update_author_publications query: {e}")
+            self.log.error('db.author_keys_error', "Error inside stage_author_keys query: %s", e)
 
-        if not result:
-            insert_query = """
-                            INSERT INTO 
-                            scientists_publications 
-                            (scientist_id, publication_id) 
-                            VALUES (%s, %s) RETURNING id;"""
-            try:
-                self.cur.execute(insert_query, (scientist_id, publication_id))
-            except Exception as e:
-                logging.error(f"Error insert inside update_author_publications query: {e}")
+    def resolve_author_links(self):
+        """
+        Links every staged author key that matches a scientist to its publication.
 
-            logging.info(f"Scientist-publication relation added to the database")
-            return self.cur.fetchone()[0]
+        Runs once at the end of a crawl (or on demand, see the resolve_authors
+        command) as a single set-based join of publication_author_keys with
+        scientists, instead of one lookup per author and publication.
 
-        else:
-            logging.info(f"Scientist-publication relation already exists in the database")
-            return result[0]
+        Returns:
+            int: The number of scientists_publications links added.
+        """
+        query = f"""
+                INSERT INTO scientists_publications (scientist_id, publication_id)
+                SELECT DISTINCT s.id, pak.publication_id
+                FROM publication_author_keys pak
+                JOIN scientists s ON {author_key_sql('s.profile_url')} = pak.author_key
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM scientists_publications sp
+                    WHERE sp.scientist_id = s.id AND sp.publication_id = pak.publication_id
+                )
+                RETURNING scientist_id, publication_id;
+                """
+        try:
+            self.cur.execute(query)
+            linked = self.cur.rowcount
+            if self.changes.enabled:
+                for scientist_id, publication_id in self.cur.fetchall():
+                    self.changes.record('scientists_publications', relation_key(scientist_id, publication_id),
+                                        'insert', {'scientist_id': scientist_id, 'publication_id': publication_id})
+            self.changes.write(self.cur)
+            self.connection.commit()
+            self.changes.commit()
+        except Exception as e:
+            logging.error(f"Error inside resolve_author_links query: {e}")
+            self.connection.rollback()
+            self.changes.rollback()
+            return 0
+
+        logging.info(f"Resolved {linked} scientist-publication relations")
+        return linked
 
     def update_organization(self, name, organization_type):
         """
@@ -442,11 +781,16 @@ class DatabasePipeline:
             int: The id of the organization in the database.
         """
 
+        organization_id = self.lookups.get('organization_types', (name, organization_type))
+        if organization_id is not None:
+            return organization_id
+
         select_query = "SELECT id FROM organizations WHERE name like %s AND type=%s;"
         self.cur.execute(select_query, (name, organization_type))
         result = self.cur.fetchone()
 
         if result:
+            self.lookups.add('organization_types', (name, organization_type), result[0])
             return result[0]
 
         else:
@@ -456,7 +800,10 @@ class DatabasePipeline:
                             (name, type) 
                             VALUES (%s, %s) RETURNING id;"""
             self.cur.execute(insert_query, (name, organization_type))
-            return self.cur.fetchone()[0]
+            organization_id = self.cur.fetchone()[0]
+            self.changes.record('organization', organization_id, 'insert', {'name': name, 'type': organization_type})
+            self.lookups.add('organization_types', (name, organization_type), organization_id)
+            return organization_id
 
     def update_organization_relationship(self, parent_id, child_id):
         """
@@ -469,6 +816,9 @@ class DatabasePipeline:
         Returns:
             int: The id of the organization-organization relation in the database.
         """
+        if self.lookups.get('organizations_relationships', (parent_id, child_id)):
+            return
+
         if parent_id is None:
             self.cur.execute(
                 "SELECT id FROM organizations_relationships WHERE parent_id IS NULL AND child_id=%s;", (child_id,))
@@ -488,19 +838,19 @@ class DatabasePipeline:
                             (parent_id, child_id) 
                             VALUES (%s, %s) RETURNING id;"""
             self.cur.execute(insert_query, (parent_id, child_id))
+            self.changes.record('organizations_relationships', relation_key(parent_id, child_id), 'insert',
+                                {'parent_id': parent_id, 'child_id': child_id})
+        self.lookups.add('organizations_relationships', (parent_id, child_id), True)
 
-    def update_scientist_bibliometrics(self, adapter, scientist_id, scientist_fields):
+    def find_bibliometrics(self, scientist_id):
         """
-        Updates a scientist's bibliometrics in the database if it already exists, otherwise it adds the bibliometrics to the database.
-
-        Args:
-            scientist_id (int): The id of the scientist.
-            scientist_fields (list): A list of fields of the scientist's bibliometrics to be updated or added.
+        Sends the lookup of a scientist's bibliometrics.
 
         Returns:
-            int: The id of the bibliometrics in the database.
+            psycopg.Cursor: The cursor the bibliometrics row will be fetched from.
         """
-        select_query = """
+        cursor = self.connection.cursor()
+        cursor.execute("""
                     SELECT
                         h_index_wos,
                         h_index_scopus,
@@ -508,16 +858,25 @@ class DatabasePipeline:
                         ministerial_score
                     FROM bibliometrics
                     WHERE scientist_id = %s;
-                    """
-        try:
-            self.cur.execute(select_query, (scientist_id,))
-        except Exception as e:
-            logging.error(f"Error select inside update_scientist_bibliometrics query: {e}")
+                    """, (scientist_id,))
+        return cursor
 
-        bibliometrics_db_check = self.cur.fetchone()
+    def update_scientist_bibliometrics(self, adapter, scientist_id, bibliometrics_db_check):
+        """
+        Updates a scientist's bibliometrics in the database if it already exists, otherwise it adds the bibliometrics to the database.
+
+        Args:
+            adapter (ItemAdapter): The adapter of the item that contains the scientist's bibliometrics.
+            scientist_id (int): The id of the scientist.
+            bibliometrics_db_check (tuple): The row found by find_bibliometrics(), or None.
+        """
+        # The ministerial score is stored rounded, a missing or invalid score as 0
+        ministerial_score = adapter.get('ministerial_score')
+        bibliometrics_fields = tuple(adapter.get(field) for field in BIBLIOMETRICS_FIELDS[:3]) + (
+            round(ministerial_score) if ministerial_score is not None else 0,)
 
         if bibliometrics_db_check:
-            if bibliometrics_db_check != scientist_fields:
+            if bibliometrics_db_check != bibliometrics_fields:
                 update_query = """
                             UPDATE bibliometrics
                             SET
@@ -528,154 +887,508 @@ class DatabasePipeline:
                                 updated_at = CURRENT_TIMESTAMP
                             WHERE scientist_id = %s;
                             """
-                try:
-                    self.cur.execute(
-                    update_query, scientist_fields + (str(scientist_id),))
-                except Exception as e:
-                    logging.error(f"Error update inside update_scientist_bibliometrics query: {e}")
+                self.cur.execute(update_query, bibliometrics_fields + (scientist_id,))
+                self.changes.record('bibliometrics', scientist_id, 'update', self.changes.changed_fields(
+                    BIBLIOMETRICS_FIELDS, bibliometrics_db_check, bibliometrics_fields))
 
-            logging.info(f"Bibliometrics in the database updated")
+            self.log.info('db.bibliometrics_updated', "Bibliometrics in the database updated")
 
         else:
             insert_query = """
                 INSERT INTO 
                 bibliometrics 
                 (h_index_wos, h_index_scopus, publication_count, ministerial_score, scientist_id) 
-                VALUES (%s, %s, %s, %s, %s) RETURNING id;"""
-            try:
-                ministerial_score = scientist_fields[3].replace(',', '.').strip()
+                VALUES (%s, %s, %s, %s, %s);"""
+            self.cur.execute(insert_query, bibliometrics_fields + (scientist_id,))
+            self.changes.record('bibliometrics', scientist_id, 'insert',
+                                dict(zip(BIBLIOMETRICS_FIELDS, bibliometrics_fields)))
 
-                # Validate ministerial_score
-                if ministerial_score.isdigit() or (ministerial_score.replace('.', '', 1).isdigit() and ministerial_score.count('.') <= 1):
-                    rounded_score = round(float(ministerial_score))  # Convert to float and round
-                else:
-                    rounded_score = 0  # Default value for invalid ministerial scores
+            self.log.info('db.bibliometrics_added', "Bibliometrics added to the database")
 
-                self.cur.execute(insert_query, scientist_fields[:3] + (rounded_score,) + (str(scientist_id),))
-            except Exception as e:
-                logging.error(f"Error insert inside update_scientist_bibliometrics query: {e}")
+    def find_organizations(self, organizations):
+        """
+        Sends the lookup of the organizations a scientist is affiliated with, by name.
 
-        logging.info("Bibliometrics added to the database")
+        Affiliations are matched with the organizations already in the database
+        (they come from the organization tree).
 
+        Returns:
+            psycopg.Cursor: The cursor the (id, name) rows will be fetched from,
+            or None if there are no organizations to look up.
+        """
+        if not organizations:
+            return None
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT id, name FROM organizations WHERE name = ANY(%s);", (list(organizations),))
+        return cursor
 
+    def find_research_areas(self, research_areas):
+        """
+        Sends the statement that inserts the research areas missing from the database
+        and returns the ids of all of them.
 
-    def update_scientist_relationship(self, scientist_id, adapter):
+        Returns:
+            psycopg.Cursor: The cursor the (id, name) rows will be fetched from,
+            or None if there are no research areas to look up.
         """
-        Updates a scientist's organizations in the database if they already exist, otherwise it adds the organizations to the database.
+        if not research_areas:
+            return None
+        query = """
+                WITH names AS (
+                    SELECT DISTINCT unnest(%(names)s::text[]) AS name
+                ),
+                inserted AS (
+                    INSERT INTO research_areas (name)
+                    SELECT n.name FROM names n
+                    WHERE NOT EXISTS (SELECT 1 FROM research_areas ra WHERE ra.name = n.name)
+                    RETURNING id, name
+                )
+                SELECT id, name FROM inserted
+                UNION ALL
+                SELECT ra.id, ra.name FROM research_areas ra JOIN names n ON ra.name = n.name;
+                """
+        cursor = self.connection.cursor()
+        cursor.execute(query, {'names': list(research_areas)})
+        return cursor
+
+    def update_scientist_relationship(self, scientist_id, organization_ids, unknown_organizations=()):
+        """
+        Syncs a scientist's organizations with the affiliations of the item; links to
+        organizations the scientist is no longer affiliated with are removed.
+
+        Affiliations missing from the organizations table (the organization tree
+        was not crawled yet, or the name differs) leave the ids incomplete, so
+        in that case links are only added and none are removed.
 
         Args:
             scientist_id (int): The id of the scientist.
-            adapter (ItemAdapter): The adapter of the item that contains the scientist's information.
+            organization_ids (list): The ids found by find_organizations().
+            unknown_organizations (list): The affiliations find_organizations() did not find.
 
         Returns:
-            None
+            psycopg.Cursor: The cursor of the sync, see sync_result().
         """
-        organizations = adapter.get('organizations')
-        
-        if not organizations:
-            return
-        
-        for key in organizations:
-            select_organization_query = "SELECT id FROM organizations WHERE name like %s;"
-            self.cur.execute(select_organization_query, {organizations[key]})
-            organization_id = self.cur.fetchone()[0]
+        if unknown_organizations:
+            self.log.warning('db.unknown_organization', "Organizations of scientist %s not in the database: %s",
+                             scientist_id, ', '.join(unknown_organizations))
+        return self.sync_relation('scientist_organization', 'scientist_id', 'organization_id',
+                                  scientist_id, organization_ids, prune=not unknown_organizations)
 
-            select_query = """
-                                SELECT organization_id, so.id 
-                                FROM scientist_organization so 
-                                INNER JOIN organizations o ON so.organization_id = o.id
-                                WHERE scientist_id = %s AND type=%s;"""
-            try:
-                self.cur.execute(select_query, (scientist_id, key))
-                scientist_organization_check = self.cur.fetchone()
-            except Exception as e:
-                logging.error(f"Error select inside update_scientist_relationship query: {e}")
-
-            if scientist_organization_check:
-                if scientist_organization_check[0] != organization_id:
-                    update_query = """
-                                UPDATE scientist_organization
-                                SET
-                                    organization_id = %s,
-                                    updated_at = CURRENT_TIMESTAMP
-                                WHERE id = %s;
-                                """
-                    try:
-                        self.cur.execute(
-                            update_query, (organization_id, scientist_organization_check[1]))
-                    except Exception as e:
-                        logging.error(f"Error update inside update_scientist_relationship query: {e}")
-                    
-                    logging.info(f"Organization in the database updated")
-
-                else:
-                    logging.info(f"Organization in the database not updated")
+    def update_research_area(self, scientist_id, research_area_ids):
+        """
+        Syncs a scientist's research areas with the research areas of the item,
+        which also removes areas the scientist dropped.
 
-            else:
-                insert_query = """
-                                INSERT INTO 
-                                scientist_organization 
-                                (scientist_id, organization_id) 
-                                VALUES (%s, %s);
-                                """
-                try:
-                    self.cur.execute(insert_query, (scientist_id, organization_id))
-                except Exception as e:
-                    logging.error(f"Error insert inside update_scientist_relationship query: {e}")
+        Args:
+            scientist_id (int): The id of the scientist.
+            research_area_ids (list): The ids returned by find_research_areas().
 
-                logging.info(f"Organization added to the database")
+        Returns:
+            psycopg.Cursor: The cursor of the sync, see sync_result().
+        """
+        return self.sync_relation('scientists_research_areas', 'scientist_id', 'research_area_id',
+                                  scientist_id, research_area_ids)
 
-    def update_research_area(self, adapter, scientist_id):
+    def sync_relation(self, table, owner_column, target_column, owner_id, target_ids, prune=True):
         """
-        Updates a scientist's research areas in the database if they already exist, otherwise it adds the research areas to the database.
+        Makes the rows of a many-to-many table for one owner match the given set of targets.
 
-        This function first checks if each research area associated with the scientist exists in the database. If a research area 
-        doesn't exist, it inserts the new research area and retrieves its ID. It then establishes a relationship between the 
-        scientist and each research area by inserting entries into the scientists_research_areas table.
+        The diff is computed by the database in a single statement: links to
+        targets missing from `target_ids` are deleted and missing links are
+        inserted, each through a data-modifying CTE that returns the targets
+        it changed.
 
         Args:
-            adapter (ItemAdapter): The adapter of the item that contains the scientist's information, including research areas.
-            scientist_id (int): The id of the scientist.
+            table (str): The relation table, e.g. 'scientists_research_areas'.
+            owner_column (str): The column holding the owner id, e.g. 'scientist_id'.
+            target_column (str): The column holding the target id, e.g. 'research_area_id'.
+            owner_id (int): The id of the owner.
+            target_ids (list): The ids of all targets the owner should be linked to.
+            prune (bool): Whether links to targets missing from `target_ids` are
+                deleted; False when `target_ids` may be incomplete.
 
         Returns:
-            None
+            psycopg.Cursor: The cursor the inserted and deleted links will be
+            fetched from (see sync_result()).
         """
+        query = sql.SQL("""
+                WITH desired AS (
+                    SELECT DISTINCT unnest(%(targets)s::integer[]) AS target_id
+                ),
+                deleted AS (
+                    DELETE FROM {table}
+                    WHERE %(prune)s AND {owner} = %(owner)s AND NOT ({target} = ANY(%(targets)s::integer[]))
+                    RETURNING {target}
+                ),
+                inserted AS (
+                    INSERT INTO {table} ({owner}, {target})
+                    SELECT %(owner)s, d.target_id FROM desired d
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {table} t WHERE t.{owner} = %(owner)s AND t.{target} = d.target_id
+                    )
+                    RETURNING {target}
+                )
+                SELECT %(table)s, %(owner)s, %(owner_column)s, %(target_column)s,
+                       ARRAY(SELECT {target} FROM inserted), ARRAY(SELECT {target} FROM deleted);
+                """).format(table=sql.Identifier(table),
+                            owner=sql.Identifier(owner_column),
+                            target=sql.Identifier(target_column))
+        cursor = self.connection.cursor()
+        cursor.execute(query, {'table': table, 'owner': owner_id, 'targets': list(target_ids), 'prune': prune,
+                               'owner_column': owner_column, 'target_column': target_column})
+        return cursor
+
+    def sync_result(self, cursor):
+        """
+        Fetches the result of sync_relation() and records the changed links in the change feed.
 
-        research_area_ids = []
-        research_areas = adapter.get('research_area')
+        Returns:
+            tuple: The number of inserted and deleted links.
+        """
+        table, owner_id, owner_column, target_column, inserted, deleted = cursor.fetchone()
+        for change, target_ids in (('insert', inserted), ('delete', deleted)):
+            for target_id in target_ids:
+                self.changes.record(table, relation_key(owner_id, target_id), change,
+                                    {owner_column: owner_id, target_column: target_id})
+        if inserted or deleted:
+            self.log.info(f'db.sync.{table}', "%s: %s relations added, %s removed for %s",
+                          table, len(inserted), len(deleted), owner_id)
+        return len(inserted), len(deleted)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scientists (
+    id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, academic_title TEXT, email TEXT,
+    profile_url TEXT, position TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE INDEX IF NOT EXISTS scientists_email_idx ON scientists (email);
+CREATE TABLE IF NOT EXISTS bibliometrics (
+    id INTEGER PRIMARY KEY, h_index_wos INTEGER, h_index_scopus INTEGER, publication_count INTEGER,
+    ministerial_score INTEGER, scientist_id INTEGER REFERENCES scientists(id),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE INDEX IF NOT EXISTS bibliometrics_scientist_idx ON bibliometrics (scientist_id);
+CREATE TABLE IF NOT EXISTS publications (
+    id INTEGER PRIMARY KEY, title TEXT, publisher TEXT, publication_date DATE, journal_impact_factor NUMERIC,
+    journal TEXT, ministerial_score NUMERIC, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    publication_key TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS publications_publication_key_idx ON publications (publication_key);
+CREATE INDEX IF NOT EXISTS publications_title_idx ON publications (title);
+CREATE TABLE IF NOT EXISTS scientists_publications (
+    id INTEGER PRIMARY KEY, scientist_id INTEGER REFERENCES scientists(id),
+    publication_id INTEGER REFERENCES publications(id));
+CREATE INDEX IF NOT EXISTS scientists_publications_publication_idx ON scientists_publications (publication_id);
+CREATE TABLE IF NOT EXISTS publication_author_keys (
+    publication_id INTEGER NOT NULL REFERENCES publications(id) ON DELETE CASCADE,
+    author_key TEXT NOT NULL,
+    PRIMARY KEY (publication_id, author_key));
+CREATE TABLE IF NOT EXISTS organizations (id INTEGER PRIMARY KEY, name TEXT, type TEXT);
+CREATE INDEX IF NOT EXISTS organizations_name_idx ON organizations (name);
+CREATE TABLE IF NOT EXISTS organizations_relationships (id INTEGER PRIMARY KEY, parent_id INTEGER, child_id INTEGER);
+CREATE INDEX IF NOT EXISTS organizations_relationships_idx ON organizations_relationships (parent_id, child_id);
+CREATE TABLE IF NOT EXISTS scientist_organization (
+    id INTEGER PRIMARY KEY, scientist_id INTEGER, organization_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE INDEX IF NOT EXISTS scientist_organization_scientist_idx ON scientist_organization (scientist_id);
+CREATE TABLE IF NOT EXISTS research_areas (id INTEGER PRIMARY KEY, name TEXT);
+CREATE INDEX IF NOT EXISTS research_areas_name_idx ON research_areas (name);
+CREATE TABLE IF NOT EXISTS scientists_research_areas (scientist_id INTEGER, research_area_id INTEGER);
+CREATE INDEX IF NOT EXISTS scientists_research_areas_scientist_idx ON scientists_research_areas (scientist_id);
+"""
+
+
+class SqlitePipeline:
+    """
+    Saves items to an embedded SQLite database with the tables of DatabasePipeline.
+
+    Selected with STORAGE_BACKEND = "sqlite"; the database file is SQLITE_PATH.
+    The database runs in WAL mode and items are written in batched
+    transactions of SQLITE_BATCH_SIZE items, each item in its own savepoint so
+    a failed item does not roll the batch back. Every statement is a constant
+    SQL string, so sqlite3 prepares it once and reuses it from its statement
+    cache.
+    """
+
+    def __init__(self, path='pw_scraper.sqlite3', batch_size=1000, resolve_authors_on_close=True, log=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.resolve_authors_on_close = resolve_authors_on_close
+        self.log = log or HotLog(logging.getLogger(__name__))
+        self.pending = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if settings.get('STORAGE_BACKEND', 'postgres') != 'sqlite':
+            raise NotConfigured('STORAGE_BACKEND is not sqlite')
+        return cls(path=settings.get('SQLITE_PATH', 'pw_scraper.sqlite3'),
+                   batch_size=settings.getint('SQLITE_BATCH_SIZE', 1000),
+                   resolve_authors_on_close=settings.getbool('AUTHOR_LINKS_RESOLVE_ON_CLOSE', True),
+                   log=HotLog.from_crawler(crawler, logging.getLogger(__name__)))
 
-        for research_area in research_areas:
-            try:
-                self.cur.execute(
-                    f"SELECT id FROM research_areas WHERE name like '{research_area}';")
-                in_db = self.cur.fetchone()
-            except Exception as e:
-                logging.error(f"Error select inside update_research_area query: {e}")
+    def open_spider(self, spider):
+        self.connect()
+        self.create_tables()
+        logging.info(f'Spider: {spider.name} writing to SQLite database {self.path}')
+
+    def connect(self):
+        """
+        Opens the database file in WAL mode. Transactions are managed by the pipeline.
+        """
+        self.connection = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last batches, not corrupt the file
+        self.connection.execute("PRAGMA synchronous=NORMAL;")
+        self.cur = self.connection.cursor()
+
+    def create_tables(self):
+        self.connection.executescript(SQLITE_SCHEMA)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+
+        if not self.pending:
+            self.cur.execute("BEGIN;")
+        self.cur.execute("SAVEPOINT item;")
+        try:
+            if isinstance(item, ScientistItem):
+                self.process_scientist(adapter)
+
+            elif isinstance(item, PublicationItem):
+                publication_date = date(adapter['publication_date'], 1, 1).isoformat() \
+                    if adapter['publication_date'] else None
+                publication_id = self.update_publication(adapter['title'], adapter['publisher'], publication_date,
+                                                         adapter['journal'], adapter['ministerial_score'],
+                                                         adapter['publication_key'])
+                self.stage_author_keys(publication_id, adapter.get('authors') or [])
+
+            elif isinstance(item, OrganizationItem):
+                university_id = self.update_organization(adapter.get('university'), 'university')
+                self.update_organization_relationship(None, university_id)
+                institute_id = self.update_organization(adapter.get('institute'), 'institute')
+                self.update_organization_relationship(university_id, institute_id)
+
+                cathedras = adapter.get('cathedras')
+                if cathedras:
+                    for cathedra in cathedras:
+                        cathedra_id = self.update_organization(cathedra, 'cathedra')
+                        self.update_organization_relationship(institute_id, cathedra_id)
+                        self.update_organization_relationship(cathedra_id, None)
+                else:
+                    self.update_organization_relationship(institute_id, None)
+
+            self.cur.execute("RELEASE item;")
+        except Exception as e:
+            # Whatever failed, the part of the item already written must not be committed with the batch
+            self.log.error('sqlite.item_error', "Error saving %s: %s", item_label(item), e)
+            self.cur.execute("ROLLBACK TO item;")
+            self.cur.execute("RELEASE item;")
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+        return item
 
-            if in_db:
-                research_area_ids.append(in_db[0])
+    def flush(self):
+        """Commits the current batch of items."""
+        if self.pending:
+            self.cur.execute("COMMIT;")
+            self.pending = 0
+
+    def close_spider(self, spider):
+        self.flush()
+        if self.resolve_authors_on_close:
+            self.resolve_author_links()
+        self.cur.close()
+        self.connection.close()
+        logging.info(f'Spider: {spider.name} SQLite database closed')
+
+    def process_scientist(self, adapter):
+        scientist_fields = tuple(adapter.get(field) for field in SCIENTIST_FIELDS)
+        self.cur.execute("SELECT id, first_name, last_name, academic_title, email, profile_url, position "
+                         "FROM scientists WHERE email = ?;", (adapter.get('email'),))
+        row = self.cur.fetchone()
+
+        if row:
+            scientist_id = row[0]
+            if row[1:] != scientist_fields:
+                self.cur.execute("UPDATE scientists SET first_name = ?, last_name = ?, academic_title = ?, email = ?, "
+                                 "profile_url = ?, position = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?;",
+                                 scientist_fields + (scientist_id,))
+                self.log.info('sqlite.scientist_updated', "%s %s updated in the database",
+                              adapter.get('first_name'), adapter.get('last_name'))
+        else:
+            self.cur.execute("INSERT INTO scientists (first_name, last_name, academic_title, email, profile_url, "
+                             "position) VALUES (?, ?, ?, ?, ?, ?);", scientist_fields)
+            scientist_id = self.cur.lastrowid
+            self.log.info('sqlite.scientist_added', "%s %s added to the database with ID %s",
+                          adapter.get('first_name'), adapter.get('last_name'), scientist_id)
+
+        # bibliometrics table
+        ministerial_score = adapter.get('ministerial_score')
+        bibliometrics_fields = tuple(adapter.get(field) for field in BIBLIOMETRICS_FIELDS[:3]) + (
+            round(ministerial_score) if ministerial_score is not None else 0,)
+        self.cur.execute("SELECT h_index_wos, h_index_scopus, publication_count, ministerial_score "
+                         "FROM bibliometrics WHERE scientist_id = ?;", (scientist_id,))
+        row = self.cur.fetchone()
+        if row is None:
+            self.cur.execute("INSERT INTO bibliometrics (h_index_wos, h_index_scopus, publication_count, "
+                             "ministerial_score, scientist_id) VALUES (?, ?, ?, ?, ?);",
+                             bibliometrics_fields + (scientist_id,))
+        elif row != bibliometrics_fields:
+            self.cur.execute("UPDATE bibliometrics SET h_index_wos = ?, h_index_scopus = ?, publication_count = ?, "
+                             "ministerial_score = ?, updated_at = CURRENT_TIMESTAMP WHERE scientist_id = ?;",
+                             bibliometrics_fields + (scientist_id,))
+
+        # scientist_organization and scientists_research_areas tables
+        organization_ids = []
+        unknown_organizations = []
+        for name in adapter.get('organization') or []:
+            self.cur.execute("SELECT id FROM organizations WHERE name = ?;", (name,))
+            found = [row[0] for row in self.cur.fetchall()]
+            if not found:
+                unknown_organizations.append(name)
+            organization_ids.extend(found)
+        if unknown_organizations:
+            # The ids are incomplete, so only the links found are added (see DatabasePipeline)
+            self.log.warning('sqlite.unknown_organization', "Organizations of scientist %s not in the database: %s",
+                             scientist_id, ', '.join(unknown_organizations))
+        self.sync_relation("SELECT organization_id FROM scientist_organization WHERE scientist_id = ?;",
+                           "INSERT INTO scientist_organization (scientist_id, organization_id) VALUES (?, ?);",
+                           "DELETE FROM scientist_organization WHERE scientist_id = ? AND organization_id = ?;",
+                           scientist_id, organization_ids, prune=not unknown_organizations)
 
+        research_area_ids = []
+        for name in dict.fromkeys(adapter.get('research_area') or []):
+            self.cur.execute("SELECT id FROM research_areas WHERE name = ?;", (name,))
+            row = self.cur.fetchone()
+            if row is None:
+                self.cur.execute("INSERT INTO research_areas (name) VALUES (?);", (name,))
+                research_area_ids.append(self.cur.lastrowid)
             else:
-                insert_query = "INSERT INTO research_areas (name) VALUES (%s) RETURNING id;"
-                try:
-                    self.cur.execute(insert_query, (research_area,))
-                    research_area_ids.append(self.cur.fetchone()[0])
-                except Exception as e:
-                    logging.error(f"Error insert inside update_research_area query: {e}")
-
-                logging.info(f"Research area added to the database")
-        
-        select_query = "SELECT research_area_id FROM scientists_research_areas WHERE scientist_id = %s;"
-        self.cur.execute(select_query, (scientist_id,))
+                research_area_ids.append(row[0])
+        self.sync_relation("SELECT research_area_id FROM scientists_research_areas WHERE scientist_id = ?;",
+                           "INSERT INTO scientists_research_areas (scientist_id, research_area_id) VALUES (?, ?);",
+                           "DELETE FROM scientists_research_areas WHERE scientist_id = ? AND research_area_id = ?;",
+                           scientist_id, research_area_ids)
 
-        ra_result = [row[0] for row in self.cur.fetchall()]
+    def sync_relation(self, select_query, insert_query, delete_query, owner_id, target_ids, prune=True):
+        """
+        Makes the links of one owner in a many-to-many table match `target_ids`;
+        with `prune` False the links missing from `target_ids` are kept.
+        """
+        self.cur.execute(select_query, (owner_id,))
+        current = {row[0] for row in self.cur.fetchall()}
+        desired = set(target_ids)
+        if desired - current:
+            self.cur.executemany(insert_query, [(owner_id, target) for target in desired - current])
+        if prune and current - desired:
+            self.cur.executemany(delete_query, [(owner_id, target) for target in current - desired])
+
+    def update_publication(self, title, publisher, publication_date, journal, ministerial_score, publication_key=None):
+        """
+        Updates or inserts a publication, matched like in DatabasePipeline.update_publication().
 
-        for ra_id in research_area_ids:
-            if ra_id not in ra_result:
-                insert_query = "INSERT INTO scientists_research_areas (scientist_id, research_area_id) VALUES (%s, %s);"
-                try:
-                    self.cur.execute(insert_query, (scientist_id, ra_id))
-                except Exception as e:
-                    logging.error(f"Error insert inside update_research_area query: {e}")
+        Returns:
+            int: The id of the publication.
+        """
+        row = None
+        if publication_key:
+            self.cur.execute("SELECT id, journal, ministerial_score, publication_key FROM publications "
+                             "WHERE publication_key = ?;", (publication_key,))
+            row = self.cur.fetchone()
+        if row is None:
+            # Rows saved without a key are matched on title and date
+            self.cur.execute("SELECT id, journal, ministerial_score, publication_key FROM publications "
+                             "WHERE title = ? AND (publication_date = ? OR publication_date IS NULL) "
+                             "AND (? IS NULL OR publication_key IS NULL) LIMIT 1;",
+                             (title, publication_date, publication_key))
+            row = self.cur.fetchone()
+
+        if row is None:
+            self.cur.execute("INSERT INTO publications (title, publisher, publication_date, journal_impact_factor, "
+                             "journal, ministerial_score, publication_key) VALUES (?, ?, ?, 0, ?, ?, ?);",
+                             (title, publisher, publication_date, journal, ministerial_score, publication_key))
+            self.log.info('sqlite.publication_added', "Publication added to the database")
+            return self.cur.lastrowid
+
+        if row[1:3] != (journal, ministerial_score) or (publication_key and row[3] is None):
+            self.cur.execute("UPDATE publications SET journal = ?, ministerial_score = ?, "
+                             "publication_key = COALESCE(publication_key, ?), updated_at = CURRENT_TIMESTAMP "
+                             "WHERE id = ?;", (journal, ministerial_score, publication_key, row[0]))
+            self.log.info('sqlite.publication_updated', "Publication in the database updated")
+        return row[0]
+
+    def stage_author_keys(self, publication_id, authors):
+        """
+        Stores the author keys of a publication, like DatabasePipeline.stage_author_keys().
+        """
+        author_keys = {key for key in map(author_key, authors) if key}
+
+        self.cur.execute("SELECT author_key FROM publication_author_keys WHERE publication_id = ?;",
+                         (publication_id,))
+        current = {row[0] for row in self.cur.fetchall()}
+        if current - author_keys:
+            self.cur.executemany("DELETE FROM publication_author_keys WHERE publication_id = ? AND author_key = ?;",
+                                 [(publication_id, key) for key in current - author_keys])
+            self.cur.execute("SELECT sp.id, s.profile_url FROM scientists_publications sp "
+                             "JOIN scientists s ON s.id = sp.scientist_id WHERE sp.publication_id = ?;",
+                             (publication_id,))
+            stale = [(link_id,) for link_id, profile_url in self.cur.fetchall()
+                     if author_key(profile_url) not in author_keys]
+            self.cur.executemany("DELETE FROM scientists_publications WHERE id = ?;", stale)
+        if author_keys - current:
+            self.cur.executemany("INSERT INTO publication_author_keys (publication_id, author_key) VALUES (?, ?);",
+                                 [(publication_id, key) for key in author_keys - current])
+
+    def resolve_author_links(self):
+        """
+        Links every staged author key that matches a scientist to its publication.
+
+        SQLite has no split_part(), so the author keys of the scientists are
+        computed in Python and joined through a temporary table. The pending
+        batch of items is committed first.
 
-                logging.info(f"Scientist-research area relation added to the database")
+        Returns:
+            int: The number of scientists_publications links added.
+        """
+        self.flush()
+        try:
+            self.cur.execute("BEGIN;")
+            self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS scientist_keys "
+                             "(author_key TEXT PRIMARY KEY, scientist_id INTEGER);")
+            self.cur.execute("DELETE FROM scientist_keys;")
+            self.cur.execute("SELECT id, profile_url FROM scientists;")
+            self.cur.executemany("INSERT OR IGNORE INTO scientist_keys VALUES (?, ?);",
+                                 [(author_key(url), scientist_id) for scientist_id, url in self.cur.fetchall()
+                                  if author_key(url)])
+            self.cur.execute("""
+                INSERT INTO scientists_publications (scientist_id, publication_id)
+                SELECT DISTINCT sk.scientist_id, pak.publication_id
+                FROM publication_author_keys pak
+                JOIN scientist_keys sk ON sk.author_key = pak.author_key
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM scientists_publications sp
+                    WHERE sp.scientist_id = sk.scientist_id AND sp.publication_id = pak.publication_id
+                );""")
+            linked = self.cur.rowcount
+            self.cur.execute("COMMIT;")
+        except sqlite3.Error as e:
+            logging.error(f"Error inside resolve_author_links query: {e}")
+            self.cur.execute("ROLLBACK;")
+            return 0
+
+        logging.info(f"Resolved {linked} scientist-publication relations")
+        return linked
+
+    def update_organization(self, name, organization_type):
+        self.cur.execute("SELECT id FROM organizations WHERE name = ? AND type = ?;", (name, organization_type))
+        row = self.cur.fetchone()
+        if row:
+            return row[0]
+        self.cur.execute("INSERT INTO organizations (name, type) VALUES (?, ?);", (name, organization_type))
+        return self.cur.lastrowid
+
+    def update_organization_relationship(self, parent_id, child_id):
+        self.cur.execute("INSERT INTO organizations_relationships (parent_id, child_id) SELECT ?, ? "
+                         "WHERE NOT EXISTS (SELECT 1 FROM organizations_relationships "
+                         "WHERE parent_id IS ? AND child_id IS ?);", (parent_id, child_id, parent_id, child_id))
@@ -0,0 +1,188 @@
+"""
+Deferred retries of failed requests, with backoff and per-stage circuit breakers.
+
+A spider hands a failed request to RetryScheduler.retry() instead of
+yielding it again. The request is put in a tail queue and only sent once
+the main crawl is idle and its backoff delay has passed, so a page that is
+broken on the server neither spins nor holds a browser page while the rest
+of the crawl is running.
+
+- RETRY_SCHEDULER_MAX_ATTEMPTS is the total number of downloads of a URL:
+  the first one, the immediate retries of Scrapy's RetryMiddleware (the
+  `retry_times` meta key) and the tail queue retries. Each tail retry may
+  only use the attempts left for immediate retries (its `max_retry_times`),
+  and the URL is given up once the budget is spent.
+- The delay before retry n is
+  RETRY_SCHEDULER_BACKOFF_BASE * 2 ** (n - 1) seconds. It is capped at
+  RETRY_SCHEDULER_BACKOFF_MAX and multiplied by a random jitter of 0.5-1.5.
+- Requests are grouped into stages by their callback (or the `retry_stage`
+  meta key). After RETRY_SCHEDULER_BREAKER_THRESHOLD consecutive failures
+  in a stage, its breaker opens. Retries of that stage are then held for
+  RETRY_SCHEDULER_BREAKER_COOLDOWN seconds. The spider reports each page it
+  handles successfully with success(), which closes the breaker of the
+  stage. (A page can fail after a 200 response, so the status alone does not
+  tell.)
+- RetryBreakerMiddleware holds the new requests of a stage while its
+  breaker is open: they wait in the tail queue until the cooldown is over,
+  instead of failing against the same broken server in the meantime.
+
+Counts are kept in the retry_scheduler/* stats.
+"""
+
+import heapq
+import logging
+import random
+from itertools import count
+from time import time
+
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.spidermiddlewares.base import BaseSpiderMiddleware
+
+
+def stage_of(request):
+    """The stage of a request: its `retry_stage` meta key or the name of its callback."""
+    return request.meta.get('retry_stage') or getattr(request.callback, '__name__', None) or 'default'
+
+
+def attempts_used(request):
+    """The downloads of a request so far: the first one, RetryMiddleware's retries and the tail queue retries."""
+    return 1 + request.meta.get('retry_times', 0) + request.meta.get('retry_scheduler_attempts', 0)
+
+
+class RetryScheduler:
+    """
+    Tail queue of failed requests, drained when the spider is idle.
+    """
+
+    def __init__(self, crawler, max_attempts=8, backoff_base=5.0, backoff_max=600.0,
+                 breaker_threshold=10, breaker_cooldown=300.0):
+        self.crawler = crawler
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        # (due time, sequence, request, stage)
+        self.queue = []
+        self.sequence = count()
+        self.failures = {}
+        self.open_until = {}
+
+    @property
+    def stats(self):
+        # The scheduler is created with the spider, before the crawler has its stats collector
+        return self.crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        scheduler = cls(crawler,
+                        max_attempts=settings.getint('RETRY_SCHEDULER_MAX_ATTEMPTS', 8),
+                        backoff_base=settings.getfloat('RETRY_SCHEDULER_BACKOFF_BASE', 5.0),
+                        backoff_max=settings.getfloat('RETRY_SCHEDULER_BACKOFF_MAX', 600.0),
+                        breaker_threshold=settings.getint('RETRY_SCHEDULER_BREAKER_THRESHOLD', 10),
+                        breaker_cooldown=settings.getfloat('RETRY_SCHEDULER_BREAKER_COOLDOWN', 300.0))
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        return scheduler
+
+    def retry(self, request, reason=None, stage=None):
+        """
+        Queues a failed request for a later attempt, or gives it up if it has used its attempt budget.
+
+        Args:
+            request (scrapy.Request): The request that failed.
+            reason: The exception or failure, for the log.
+            stage (str): The stage of the request, if not the one of stage_of().
+
+        Returns:
+            bool: Whether the request was queued.
+        """
+        stage = stage or stage_of(request)
+        attempts = request.meta.get('retry_scheduler_attempts', 0) + 1
+        self.failure(stage)
+
+        used = attempts_used(request)
+        if used >= self.max_attempts:
+            self.stats.inc_value(f'retry_scheduler/gave_up/{stage}')
+            logging.warning(f"Gave up {request.url} after {used} attempts: {reason}")
+            return False
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        # The retry itself is one of the attempts left, the rest may be used by RetryMiddleware
+        retry_times = request.meta.get('retry_times', 0)
+        meta = dict(request.meta, retry_scheduler_attempts=attempts, retry_stage=stage,
+                    max_retry_times=retry_times + self.max_attempts - used - 1)
+        # The page of the failed attempt is closed, the retry opens a new one
+        meta.pop('playwright_page', None)
+        retry_request = request.replace(meta=meta, dont_filter=True, priority=request.priority - 100)
+
+        heapq.heappush(self.queue, (time() + delay, next(self.sequence), retry_request, stage))
+        self.stats.inc_value(f'retry_scheduler/queued/{stage}')
+        logging.debug(f"Retry {attempts} of {request.url} queued in {delay:.0f}s: {reason}")
+        return True
+
+    def is_open(self, stage):
+        """Whether the breaker of `stage` is open."""
+        return self.open_until.get(stage, 0) > time()
+
+    def hold(self, request, stage):
+        """Queues a new request of a stage whose breaker is open, to be sent after the cooldown."""
+        heapq.heappush(self.queue, (self.open_until[stage], next(self.sequence), request, stage))
+        self.stats.inc_value(f'retry_scheduler/held/{stage}')
+
+    def failure(self, stage):
+        failures = self.failures.get(stage, 0) + 1
+        if failures >= self.breaker_threshold:
+            self.open_until[stage] = time() + self.breaker_cooldown
+            self.stats.inc_value(f'retry_scheduler/breaker_opened/{stage}')
+            logging.warning(f"Circuit breaker of {stage} open for {self.breaker_cooldown:.0f}s "
+                            f"after {failures} consecutive failures")
+            # One more failure after the cooldown opens it again
+            failures = self.breaker_threshold - 1
+        self.failures[stage] = failures
+
+    def success(self, request):
+        """Records a request of a stage that was handled successfully."""
+        stage = stage_of(request)
+        if self.failures.get(stage):
+            self.failures[stage] = 0
+            self.open_until.pop(stage, None)
+
+    def spider_idle(self, spider):
+        """
+        Sends the queued retries that are due, and keeps the spider open while any are left.
+        """
+        if not self.queue:
+            return
+
+        now = time()
+        while self.queue and self.queue[0][0] <= now:
+            due, sequence, request, stage = heapq.heappop(self.queue)
+            if self.open_until.get(stage, 0) > now:
+                heapq.heappush(self.queue, (self.open_until[stage], sequence, request, stage))
+                continue
+
+            self.crawler.engine.crawl(request)
+            self.stats.inc_value(f'retry_scheduler/retried/{stage}')
+
+        raise DontCloseSpider
+
+
+class RetryBreakerMiddleware(BaseSpiderMiddleware):
+    """
+    Spider middleware holding the new requests of a stage while its circuit breaker is open.
+
+    It applies to the spiders with a RetryScheduler as their `retries` attribute.
+    """
+
+    def get_processed_request(self, request, response):
+        retries = getattr(self.crawler.spider, 'retries', None)
+        if not isinstance(retries, RetryScheduler):
+            return request
+        stage = stage_of(request)
+        if retries.is_open(stage):
+            retries.hold(request, stage)
+            return None
+        return request
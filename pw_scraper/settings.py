@@ -4,6 +4,7 @@ BOT_NAME = "pw_scraper"
 
 SPIDER_MODULES = ["pw_scraper.spiders"]
 NEWSPIDER_MODULE = "pw_scraper.spiders"
+COMMANDS_MODULE = "pw_scraper.commands"
 
 #Playwright settings
 
@@ -22,12 +23,46 @@ PLAYWRIGHT_LAUNCH_OPTIONS={
         "--disable-renderer-backgrounding",
     ],
     }
-PLAYWRIGHT_DEFAULT_NAVIGATION_TIMEOUT = 180000
 
+# Playwright handler with per-stage timeouts and hedged requests (see pw_scraper/hedging.py)
 DOWNLOAD_HANDLERS = {
-    "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-    "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+    "http": "pw_scraper.hedging.HedgingDownloadHandler",
+    "https": "pw_scraper.hedging.HedgingDownloadHandler",
 }
+# Hard timeout (seconds) of a Playwright download, and navigation timeout of its page,
+# per page type ('listing', 'profile', 'bibliometrics', 'publication', 'default'). All
+# are the former global 180s; shorter profile and publication timeouts only pay off
+# together with hedging.
+PLAYWRIGHT_STAGE_TIMEOUTS = {
+    "listing": 180,
+    "profile": 180,
+    "bibliometrics": 180,
+    "publication": 180,
+    "default": 180,
+}
+# Send a duplicate of a Playwright request once it runs longer than the HEDGING_PERCENTILE
+# latency of the last HEDGING_WINDOW responses of its page type (after HEDGING_MIN_SAMPLES
+# responses); the first response wins. At most HEDGING_MAX_IN_FLIGHT duplicates at a time.
+# Off by default: every hedge is one more browser page and request to the server.
+HEDGING_ENABLED = False
+HEDGING_PERCENTILE = 0.95
+HEDGING_WINDOW = 500
+HEDGING_MIN_SAMPLES = 20
+HEDGING_MAX_IN_FLIGHT = 4
+# Resources blocked in Playwright pages, per stage (see pw_scraper/blocking.py). The
+# profiles of DEFAULT_PROFILES can be overridden by stage, e.g.
+# {"detail": {"block": ["image", "font"], "allow": [r"^https://repo\.pw\.edu\.pl/"]}}.
+# With RESOURCE_BLOCKING_ENABLED = False requests are only counted, and the
+# blocking/<stage>/blocked_bytes stats show what blocking saves.
+RESOURCE_BLOCKING_ENABLED = True
+RESOURCE_BLOCKING_PROFILES = {}
+
+# Bootstrap pw_spider over plain HTTP/JSF requests and never start Playwright
+# (scrapy crawl pw_spider -s PW_SPIDER_BROWSER_FREE=True)
+PW_SPIDER_BROWSER_FREE = False
+# Also crawl the publication tab of every scientist in pw_spider and emit their
+# publications, so a separate `publications` crawl is not needed
+PW_SPIDER_WITH_PUBLICATIONS = False
 
 
 
@@ -38,8 +73,15 @@ DOWNLOAD_HANDLERS = {
 ROBOTSTXT_OBEY = False
 
 
+# Keep request fingerprints in a scalable Bloom filter instead of a set
+DUPEFILTER_CLASS = "pw_scraper.dupefilters.BloomDupeFilter"
+BLOOM_DUPEFILTER_INITIAL_CAPACITY = 1000000
+BLOOM_DUPEFILTER_ERROR_RATE = 1e-6
+
+
 RETRY_ENABLED = True
 RETRY_HTTP_CODES = [500]
+# In the publications spider the immediate retries count towards RETRY_SCHEDULER_MAX_ATTEMPTS
 RETRY_TIMES = 5
 
 
@@ -54,6 +96,23 @@ PLAYWRIGHT_CONTEXTS={
     "publication":{}
 }
 
+# Run HTML extraction in a pool of worker processes instead of the reactor thread
+# (number of workers defaults to the number of CPUs)
+PARSE_PROCESS_POOL_ENABLED = False
+PARSE_PROCESS_POOL_WORKERS = 0
+
+# Year-partitioned publication crawl (`scrapy crawl publications -a years=2015-2024`
+# or `-a last_years=2`). The filter is appended to the listing URL, {partition} is the year.
+# The crawl stops (finish reason partition_filter_ignored) if a partition turns out as
+# large as the unfiltered listing, i.e. the server does not apply the filter.
+PUBLICATIONS_PARTITION_FILTER = "&afq=year%3A{partition}"
+# Page sizes (`ps`) to probe for the result listings, largest first. A page size is
+# kept if the first page of the listing comes back within the latency budget (seconds).
+LISTING_PAGE_SIZES = [100, 50, 20]
+LISTING_PAGE_SIZE_LATENCY_BUDGET = 20.0
+# Progress of each partition, so an interrupted crawl resumes where it stopped
+PUBLICATIONS_CHECKPOINT_FILE = "publications_checkpoint.json"
+
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 CONCURRENT_REQUESTS = 32
 
@@ -79,20 +138,36 @@ CONCURRENT_REQUESTS = 32
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
+SPIDER_MIDDLEWARES = {
 #    "pw_scraper.middlewares.pw_scraperSpiderMiddleware": 543,
-#}
+    # Drop the scientists and publications already scraped in this crawl, and the
+    # organizations already yielded (see pw_scraper/dedupe.py)
+    "pw_scraper.dedupe.ItemDedupeMiddleware": 950,
+    # Hold the new requests of a stage while its retry circuit breaker is open
+    # (see pw_scraper/retry.py)
+    "pw_scraper.retry.RetryBreakerMiddleware": 940,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     "pw_scraper.middlewares.pw_scraperDownloaderMiddleware": 543,
+    # After HttpCompressionMiddleware, so decompressed bodies are archived; responses
+    # served by HttpCacheMiddleware (900) are flagged 'cached' and not archived again
+    "pw_scraper.archive.ResponseArchiveMiddleware": 580,
     #'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 555,
     #'rotating_proxies.middlewares.RotatingProxyMiddleware': 610,
     #'rotating_proxies.middlewares.BanDetectionMiddleware': 620
 }
 
 
+# Archive raw responses to compressed, append-only segment files
+RESPONSE_ARCHIVE_ENABLED = False
+RESPONSE_ARCHIVE_DIR = "archive"
+RESPONSE_ARCHIVE_SEGMENT_SIZE = 256 * 1024 * 1024
+# Serve every request from the archive instead of the network (no browser is started)
+RESPONSE_ARCHIVE_REPLAY = False
+
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -106,8 +181,49 @@ ITEM_PIPELINES = {
     "pw_scraper.pipelines.CleanItemsPipeline": 100,
     # "pw_scraper.pipelines.SaveToJsonFilePipeline": 300,
     'pw_scraper.pipelines.DatabasePipeline': 800,
+    'pw_scraper.pipelines.SqlitePipeline': 800,
 }
 
+# Where the items are saved: "postgres" (DatabasePipeline, connection from .env) or
+# "sqlite" (SqlitePipeline, an embedded database file with the same tables)
+STORAGE_BACKEND = "postgres"
+SQLITE_PATH = "pw_scraper.sqlite3"
+# Items written per SQLite transaction
+SQLITE_BATCH_SIZE = 1000
+
+# Rate limits of the per-item log messages of the pipelines and spiders: each message
+# key logs at most HOTLOG_MAX_PER_INTERVAL messages per HOTLOG_INTERVAL seconds, then
+# one in HOTLOG_SAMPLE_EVERY; message counts are logged every HOTLOG_REPORT_INTERVAL
+# seconds. With LOG_LEVEL = "DEBUG" everything is logged, with full item details.
+HOTLOG_MAX_PER_INTERVAL = 5
+HOTLOG_INTERVAL = 60
+HOTLOG_SAMPLE_EVERY = 1000
+HOTLOG_REPORT_INTERVAL = 60
+
+# Deferred retries of failed listing and publication pages (see pw_scraper/retry.py):
+# downloads per URL in total (the first one, the RETRY_TIMES immediate retries and
+# the deferred ones), exponential backoff with jitter (seconds), and a circuit
+# breaker that holds the requests of a stage after consecutive failures
+RETRY_SCHEDULER_MAX_ATTEMPTS = 8
+RETRY_SCHEDULER_BACKOFF_BASE = 5.0
+RETRY_SCHEDULER_BACKOFF_MAX = 600.0
+RETRY_SCHEDULER_BREAKER_THRESHOLD = 10
+RETRY_SCHEDULER_BREAKER_COOLDOWN = 300.0
+
+# Send the independent statements of an item in psycopg pipeline mode, without
+# waiting for each reply (needs libpq 14+, otherwise statements are sent one by one)
+DATABASE_PIPELINE_MODE = True
+
+# Link staged publication authors to scientists when a crawl ends
+# (run `scrapy resolve_authors` to do it on demand)
+AUTHOR_LINKS_RESOLVE_ON_CLOSE = True
+
+# Change feed of the rows DatabasePipeline inserts, updates and deletes (see
+# pw_scraper/changefeed.py): None (off), "table" (the change_events table) or
+# "jsonl" (appended to CHANGE_FEED_PATH)
+CHANGE_FEED = None
+CHANGE_FEED_PATH = "change_events.jsonl"
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 AUTOTHROTTLE_ENABLED = True
@@ -123,11 +239,28 @@ AUTOTHROTTLE_DEBUG = False
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Opt in per run (-s HTTPCACHE_ENABLED=True), e.g. to re-run parsers during development. Left
+# off for real crawls: a cached profile page can be paired with a live bibliometrics POST, which
+# the JSF server answers from the session state of a page it never served in this crawl.
+HTTPCACHE_ENABLED = False
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [500, 502, 503, 504]
+HTTPCACHE_POLICY = "pw_scraper.httpcache.RepoCachePolicy"
+HTTPCACHE_STORAGE = "pw_scraper.httpcache.SqliteCacheStorage"
+# JSF marks every page as no-cache; freshness comes from the TTLs below instead. Responses
+# marked no-store are never cached (RepoCachePolicy.should_cache_response skips them).
+HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS = ["no-cache"]
+# Freshness (seconds) per page type when the server sends no max-age/Expires
+HTTPCACHE_REPO_TTLS = {
+    "listing": 6 * 3600,
+    "profile": 7 * 24 * 3600,
+    "bibliometrics": 7 * 24 * 3600,
+    "publication": 30 * 24 * 3600,
+    "default": 24 * 3600,
+}
+# Least recently used responses are evicted above this size
+HTTPCACHE_MAX_BYTES = 2 * 1024 ** 3
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
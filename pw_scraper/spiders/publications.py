@@ -1,162 +1,337 @@
 import scrapy
 import logging
+from scrapy import signals
+from scrapy.exceptions import CloseSpider, IgnoreRequest
+from scrapy.spidermiddlewares.httperror import HttpError
 import asyncio
 from scrapy_playwright.page import PageMethod
+from pw_scraper.hotlog import HotLog
 from pw_scraper.items import PublicationItem
+from pw_scraper.parsers import ParsePool, extract_publication
+from pw_scraper.pagesize import PageSizeProbe
+from pw_scraper.partitions import PartitionCheckpoint, filter_ignored, year_partitions
+from pw_scraper.retry import RetryScheduler
 
 # logging.getLogger('asyncio').setLevel(logging.CRITICAL)
 
 
-def should_abort_request(request):
-    return (
-        request.resource_type in ["image", "stylesheet", "font", "media"]
-        or ".jpg" in request.url
-    )
-
-
 class PublicationsSpider(scrapy.Spider):
     name = "publications"
     allowed_domains = ["repo.pw.edu.pl"]
 
     custom_settings = {
-        'PLAYWRIGHT_ABORT_REQUEST': should_abort_request,
         'PLAYWRIGHT_MAX_PAGES_PER_CONTEXT': 10,
         'CONCURRENT_REQUESTS': 64,
     }
 
     pw_url = 'https://repo.pw.edu.pl'
+    listing_url = 'https://repo.pw.edu.pl/globalResultList.seam?r=publication&tab=PUBLICATION&lang=en&p=bst'
+    row_link_selector = 'div.entity-row-heading-wrapper h5 a'
+
+    def __init__(self, years=None, last_years=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Without partitions the whole listing is crawled as one list
+        self.partitions = year_partitions(years, last_years)
+        self.refresh = bool(last_years)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.parse_pool = ParsePool.from_crawler(crawler)
+        spider.page_sizes = PageSizeProbe.from_crawler(crawler)
+        spider.hot_log = HotLog.from_crawler(crawler, spider.logger)
+        spider.retries = RetryScheduler.from_crawler(crawler)
+        spider.partition_filter = crawler.settings.get('PUBLICATIONS_PARTITION_FILTER')
+        spider.checkpoint = None
+        # Page count and rows per page of the unfiltered listing, to check the partition filter against
+        spider.listing_counts_unfiltered = None
+        if spider.partitions:
+            spider.checkpoint = PartitionCheckpoint(crawler.settings.get('PUBLICATIONS_CHECKPOINT_FILE'))
+            crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+        return spider
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if settings.getbool('RESPONSE_ARCHIVE_REPLAY'):
+            # Responses come from the archive, so Playwright is never started
+            settings.set('DOWNLOAD_HANDLERS', {}, priority='spider')
 
     def start_requests(self):
+        if self.partitions:
+            # The partitions start once the size of the unfiltered listing is known
+            yield self.listing_request(1, callback=self.parse_listing_size,
+                                       page_size=self.page_sizes.first('publication'))
+            return
 
         yield scrapy.Request(url=self.pw_url,
             callback=self.parse_pages,
                 meta=dict(playwright=True, playwright_include_page=True, playwright_context="pages",))
 
     async def parse_pages(self, response):
-        page = response.meta['playwright_page']
+        # No page when the response is replayed from the archive
+        page = response.meta.get('playwright_page')
+        if not page:
+            for page_number in range(750, 1000):
+                yield self.listing_request(page_number)
+            return
+
         await page.goto('https://repo.pw.edu.pl/globalResultList.seam?r=publication&tab=PUBLICATION&lang=en')
         await page.wait_for_selector('span.entitiesDataListTotalPages', state='visible')
         # total_pages=int(response.css('span.entitiesDataListTotalPages::text').get().replace(',', ''))
         total_pages = await page.evaluate("parseInt(document.querySelector('span.entitiesDataListTotalPages').innerText.replace(',', ''))")
+        default_rows = await page.evaluate(f"document.querySelectorAll('{self.row_link_selector}').length")
+        await page.close()
 
-        # Generate requests for each page based on the total number of pages
-        # Pages 1 to 750
-        for page_number in range(750, 1000):
-            page_url = f'https://repo.pw.edu.pl/globalResultList.seam?r=publication&tab=PUBLICATION&lang=en&p=bst&pn={page_number}'
-            yield scrapy.Request(url=page_url,
-                callback=self.parse_publications_links,
-                meta=dict(
-                    playwright=True,
-                    playwright_include_page=True,
-                    playwright_context="pages",
-                    errback=self.errback
-                ))
+        # Pages 750 to 1000 of the default page size, kept as a range of rows,
+        # so the page numbers can be recomputed for the probed page size
+        page_size = self.page_sizes.first('publication')
+        yield self.listing_request(1, callback=self.parse_listing_probe, page_size=page_size,
+            cb_kwargs=dict(page_size=page_size, rows=(749 * default_rows, 999 * default_rows)))
 
-        await page.close()
+    async def listing_counts(self, response):
+        """
+        Reads the page count and the number of result rows of a listing page.
 
-    async def parse_publications_links(self, response):
-        try:
-            page = response.meta['playwright_page']
-            await page.wait_for_selector('//*[@id="entitiesT_content"]', state='visible')
-            # await asyncio.sleep()
-            elements = await page.evaluate('''() => {
-                return Array.from(document.querySelectorAll('div.entity-row-heading-wrapper h5 a')).map(el => el.href);
-            }''')
-            
-            for element in elements:
-                yield scrapy.Request(url=element,
-                    callback=self.parse_publication,
-                    meta=dict(
-                        playwright=True,
-                        playwright_include_page=True,
-                        playwright_context="pages",
-                        errback=self.errback
-                    ))
-                
+        Returns:
+            tuple: (total_pages, rows)
+        """
+        page = response.meta.get('playwright_page')
+        if page:
+            await page.wait_for_selector('span.entitiesDataListTotalPages', state='visible')
+            total_pages = await page.evaluate("parseInt(document.querySelector('span.entitiesDataListTotalPages').innerText.replace(',', ''))")
+            rows = await page.evaluate(f"document.querySelectorAll('{self.row_link_selector}').length")
+        else:
+            total_pages = int(response.css('span.entitiesDataListTotalPages::text').get('0').replace(',', ''))
+            rows = len(response.css(self.row_link_selector))
+        return total_pages, rows
+
+    async def parse_listing_probe(self, response, partition, page_number, page_size, rows):
+        """
+        Picks the page size of the unpartitioned listing and requests the pages covering `rows`.
+        """
+        page = response.meta.get('playwright_page')
+        total_pages, page_rows = await self.listing_counts(response)
+
+        decision = self.page_sizes.accept('publication', page_size, response, page_rows)
+        if decision is not True:
+            if page:
+                await page.close()
+            yield self.listing_request(1, callback=self.parse_listing_probe, page_size=decision,
+                cb_kwargs=dict(page_size=decision, rows=rows))
+            return
+
+        # The server may serve fewer rows than asked for
+        first_row, last_row = rows
+        served = max(page_rows, 1)
+        first_page = first_row // served + 1
+        last_page = min((last_row - 1) // served + 1, total_pages)
+        self.logger.info(f"Listing pages {first_page} to {last_page} of {total_pages}, {served} rows per page")
+
+        for listing_page in range(max(first_page, 2), last_page + 1):
+            yield self.listing_request(listing_page, page_size=page_size)
+
+        if first_page == 1:
+            async for request in self.parse_publications_links(response):
+                yield request
+        elif page:
             await page.close()
 
+    def listing_request(self, page_number, partition=None, callback=None, page_size=None, cb_kwargs=None, **kwargs):
+        """
+        Creates the request of a listing page, filtered to a partition if one is given.
+        """
+        url = self.listing_url
+        if partition is not None:
+            url += self.partition_filter.format(partition=partition)
+        if page_size:
+            url += f'&ps={page_size}'
+
+        return scrapy.Request(url=f'{url}&pn={page_number}',
+            callback=callback or self.parse_publications_links,
+            cb_kwargs=dict(partition=partition, page_number=page_number, **(cb_kwargs or {})),
+            meta=dict(
+                playwright=True,
+                playwright_include_page=True,
+                playwright_context="pages",
+            ),
+            errback=self.errback,
+            **kwargs)
+
+    async def parse_listing_size(self, response, partition, page_number):
+        """
+        Reads the page count of the unfiltered listing and starts the partitions.
+        """
+        page = response.meta.get('playwright_page')
+        try:
+            self.listing_counts_unfiltered = await self.listing_counts(response)
         except Exception as e:
-            self.logger.error(f'Error in parse_publications_links, {e} {response.url}')
-            yield scrapy.Request(response.url, callback=self.parse_publications_links, 
-                    dont_filter=True,
-                    meta=dict(
-                        playwright=True, 
-                        playwright_include_page=True,
-                        playwright_context="pages",
-                        errback=self.errback
-                    ))
-    
-    async def parse_publication(self, response):
-        page = response.meta['playwright_page']
-        
+            self.logger.error(f'Error reading the page count of the listing, {e} {response.url}')
+            self.retries.retry(response.request, e)
+            return
+        finally:
+            if page:
+                await page.close()
+
+        for request in self.partition_requests():
+            yield request
+
+    def partition_requests(self):
+        """
+        Starts every partition at once. Partitions with a known page count resume
+        from their pending pages, the others start from their first page.
+        """
+        for partition in self.partitions:
+            if self.checkpoint.is_complete(partition):
+                if not self.refresh:
+                    self.logger.info(f"Partition {partition} already crawled, skipping")
+                    continue
+                # Recent years keep changing, so a refresh crawls them again
+                self.checkpoint.reset(partition)
+
+            if self.checkpoint.total_pages(partition) is None:
+                yield self.first_partition_request(partition, self.page_sizes.first('publication'))
+                continue
+
+            # Page numbers only hold for the page size the partition was started with
+            page_size = self.checkpoint.page_size(partition)
+            pending = self.checkpoint.pending_pages(partition)
+            self.logger.info(f"Resuming partition {partition}: {len(pending)} pages left")
+            for page_number in pending:
+                yield self.listing_request(page_number, partition, page_size=page_size)
+
+    def first_partition_request(self, partition, page_size):
+        return self.listing_request(1, partition, callback=self.parse_partition, page_size=page_size,
+            cb_kwargs=dict(page_size=page_size))
+
+    async def parse_partition(self, response, partition, page_number, page_size=None):
+        """
+        Reads the page count from the first page of a partition and requests its other pages.
+        """
+        page = response.meta.get('playwright_page')
         try:
-            authors_selector = response.css('div.authorListElement>a::attr(href)').getall() or None
-            if authors_selector:
-                authors_selector=[self.pw_url+link for link in authors_selector]
-            
-            publication=PublicationItem()
+            total_pages, rows = await self.listing_counts(response)
+        except Exception as e:
+            self.logger.error(f'Error reading the page count of partition {partition}, {e} {response.url}')
+            if page:
+                await page.close()
+            self.retries.retry(response.request, e)
+            return
 
-            publication['title']=response.css('div.publicationShortInfo>h2::text').get() or None
+        decision = self.page_sizes.accept('publication', page_size, response, rows)
+        if decision is not True:
+            # Too slow at this page size, probe the next smaller one
+            if page:
+                await page.close()
+            yield self.first_partition_request(partition, decision)
+            return
 
+        if self.listing_counts_unfiltered and filter_ignored(total_pages, rows, *self.listing_counts_unfiltered):
+            self.logger.error(f"Partition {partition} has {total_pages} pages of {rows} rows, as many as the "
+                              f"whole listing ({self.listing_counts_unfiltered[0]} pages): the server ignores "
+                              f"PUBLICATIONS_PARTITION_FILTER {self.partition_filter!r}")
+            if page:
+                await page.close()
+            raise CloseSpider('partition_filter_ignored')
 
-            journal=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Journal series")]]/following-sibling::dd[1]//a/text()').get()
-            #journal2=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Journal")]]/following-sibling::dd[1]//div/text()').get()
-            #journal3=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Journal")]]/following-sibling::dd[1]/text()').get()
+        self.logger.info(f"Partition {partition}: {total_pages} pages")
+        self.checkpoint.set_total_pages(partition, total_pages, page_size)
 
-            #jour=[journal, journal2, journal3]
-            #journals=[j for j in jour if j and j.strip()!=''] 
-            publication['journal']=journal or None
+        for pending_page in self.checkpoint.pending_pages(partition):
+            if pending_page != page_number:
+                yield self.listing_request(pending_page, partition, page_size=page_size)
 
-            publisher=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Publisher")]]/following-sibling::dd[1]//a/span/span/text()').get()
-            publisher2=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Publisher")]]/following-sibling::dd[1]//div/text()').get()
-            publisher3=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Publisher")]]/following-sibling::dd[1]/text()').get()
+        async for request in self.parse_publications_links(response, partition, page_number):
+            yield request
 
-            publishers=[publisher, publisher2, publisher3]
-            publishers=[j for j in publishers if j and j.strip()!='']   
-            publication['publisher']=publishers[0] if publishers else None
-            
-            publication_date= response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Year of creation")]]/following-sibling::dd[1]/text()').get()
-            publication_date_div= response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Year of creation")]]/following-sibling::dd[1]/div/text()').get()
-            publication_date2= response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Issue year")]]/following-sibling::dd[1]/text()').get()
-            publication_date_div2= response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Issue year")]]/following-sibling::dd[1]/div/text()').get()
-            
-            pub_dates=[publication_date, publication_date2, publication_date_div, publication_date_div2]
-            pub_dates=[date for date in pub_dates if date and date.strip()!='0' and date.strip()!='']
-            publication['publication_date'] = pub_dates[0] if pub_dates else None
+    async def parse_publications_links(self, response, partition=None, page_number=None):
+        page = response.meta.get('playwright_page')
+        try:
+            if page:
+                await page.wait_for_selector('//*[@id="entitiesT_content"]', state='visible')
+                # await asyncio.sleep()
+                elements = await page.evaluate('''() => {
+                    return Array.from(document.querySelectorAll('div.entity-row-heading-wrapper h5 a')).map(el => el.href);
+                }''')
+            else:
+                # Archived response: read the links from the rendered HTML
+                elements = [response.urljoin(href) for href in response.css(f'{self.row_link_selector}::attr(href)').getall()]
             
-            publication['authors']=authors_selector
+            if page:
+                await page.close()
 
-            #need to add the rest of the fields
-            vol=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Vol")]]/following-sibling::dd[1]/text()').get()
-            vol_div=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Vol")]]/following-sibling::dd[1]/div/text()').get()
+        except Exception as e:
+            self.hot_log.error('parse_publications_links.error', 'Error in parse_publications_links, %s %s', e, response.url)
+            if page and not page.is_closed():
+                await page.close()
+            # Retried from the tail queue once the rest of the crawl is done
+            self.retries.retry(response.request, e)
+            return
 
-            parts=[vol, vol_div]
-            
-            parts=[p for p in parts if p and p.strip()!='']
-            publication['vol']= parts[0] if parts else None
+        self.retries.success(response.request)
+        # The listing page is checkpointed once all its publications are done
+        listing_page = None
+        if self.checkpoint and partition is not None:
+            listing_page = (partition, page_number)
+            self.checkpoint.page_scheduled(partition, page_number, len(elements))
+        for element in elements:
+            yield scrapy.Request(url=element,
+                callback=self.parse_publication,
+                meta=dict(
+                    playwright=True,
+                    playwright_include_page=True,
+                    playwright_context="pages",
+                    listing_page=listing_page,
+                ),
+                errback=self.errback)
 
+    def detail_done(self, request):
+        """Counts a publication request of a partition's listing page as finished."""
+        listing_page = request.meta.get('listing_page')
+        if self.checkpoint and listing_page:
+            self.checkpoint.detail_done(*listing_page)
 
-            ministerial_score=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Score (nominal)")]]/following-sibling::dd[1]/text()').get()
-            ministerial_score_div=response.xpath('//dl[contains(@class, "table2ColsContainer")]//dt[span[contains(text(), "Score (nominal)")]]/following-sibling::dd[1]/div/text()').get()
+    def request_dropped(self, request, spider):
+        # Publications filtered as duplicates never reach a callback
+        if request.callback == self.parse_publication:
+            self.detail_done(request)
 
-            m_scores=[ministerial_score, ministerial_score_div]
-            m_scores=[s for s in m_scores if s and s.strip()!='']
-            publication['ministerial_score']=m_scores[0] if m_scores else None
+    async def parse_publication(self, response):
+        page = response.meta.get('playwright_page')
+        publication = None
+
+        try:
+            fields = await self.parse_pool.run(extract_publication, response.text, response.url, self.pw_url)
+            publication = PublicationItem(**fields)
 
-            await page.close()
-            
         except Exception as e:
-            self.logger.error(f"Error in parsing publication {response.url}: {str(e)}")
+            self.hot_log.error('parse_publication.error', "Error in parsing publication %s: %s", response.url, e)
         finally:
-            if publication['authors'] and publication['title']:
-                return publication
-        
-        await page.close()
-        
-            
+            if page:
+                await page.close()
+            self.detail_done(response.request)
+
+        if publication:
+            self.retries.success(response.request)
+        if publication and publication.authors and publication.title:
+            return publication
+
     async def errback(self, failure):
         
-        self.logger.error(f"Request failed: {repr(failure)}")
+        self.hot_log.error('request_failed', "Request failed: %r", failure, details=failure.getTraceback)
         page = failure.request.meta.get('playwright_page')
         if page:
-            await page.close()
\ No newline at end of file
+            await page.close()
+
+        # Dropped requests and client errors would fail the same way again
+        if failure.check(IgnoreRequest) or (
+                failure.check(HttpError) and failure.value.response.status < 500
+                and failure.value.response.status != 429):
+            self.detail_done(failure.request)
+            return
+        # A publication that is given up leaves its listing page pending, so a resumed crawl tries it again
+        self.retries.retry(failure.request, failure.value)
+
+    def closed(self, reason):
+        if self.checkpoint:
+            self.checkpoint.save()
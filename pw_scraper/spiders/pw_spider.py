@@ -1,34 +1,23 @@
 import scrapy
-import re
-import ast
 from bs4 import BeautifulSoup as bs
 from lxml import etree
 import logging
-from scrapy_playwright.page import PageMethod
-from pw_scraper.items import ScientistItem, OrganizationItem
+from pw_scraper.hotlog import HotLog
+from pw_scraper.items import ScientistItem, OrganizationItem, PublicationItem
+from pw_scraper.jsf import ajax_formdata, partial_update, tree_expand_request
+from pw_scraper.keys import author_key
+from pw_scraper.pagesize import PageSizeProbe
+from pw_scraper.parsers import ParsePool, VALID_ACADEMIC_TITLES, extract_bibliometrics, extract_publication, extract_scientist
 
 logging.getLogger('asyncio').setLevel(logging.CRITICAL)
 
 
-def should_abort_request(request):
-    return (
-        request.resource_type in ["image", "stylesheet", "font", "media"]
-        or ".jpg" in request.url
-    )
-
-
 class PwSpider(scrapy.Spider):
     name = "pw_spider"
 
     allowed_domains = ["repo.pw.edu.pl"]
     start_urls = ["https://repo.pw.edu.pl/index.seam"]
 
-    custom_settings = {
-        'PLAYWRIGHT_ABORT_REQUEST': should_abort_request,
-        
-        
-    }
-
     headers = {
             "Accept": "application/xml, text/xml, */*; q=0.01",
             "Accept-Encoding": "gzip, deflate, br, zstd",
@@ -44,84 +33,158 @@ class PwSpider(scrapy.Spider):
 
     pw_url = 'https://repo.pw.edu.pl'
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.parse_pool = ParsePool.from_crawler(crawler)
+        spider.page_sizes = PageSizeProbe.from_crawler(crawler)
+        spider.hot_log = HotLog.from_crawler(crawler, spider.logger)
+        return spider
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        if settings.getbool('PW_SPIDER_BROWSER_FREE') or settings.getbool('RESPONSE_ARCHIVE_REPLAY'):
+            # Fall back to Scrapy's own http/https handlers, so Playwright is never started
+            settings.set('DOWNLOAD_HANDLERS', {}, priority='spider')
+
     def parse(self, response):
         # Parse the main categories
         categories_links = response.css('a.global-stats-link::attr(href)').getall()
         categories_names = response.css('span.global-stats-description::text').getall()
         categories = {name: self.pw_url + link for name, link in zip(categories_names, categories_links)}
 
-        # Go to the "People" category for scraping
-        yield scrapy.Request(categories['People'], callback=self.parse_people_page,
-            meta=dict(
-                playwright=True,
-                playwright_include_page=True,
-                playwright_page_methods=[
-                    PageMethod('wait_for_selector', 'a.authorNameLink'),
-                    PageMethod('wait_for_selector', 'div#searchResultsFiltersInnerPanel'),
-                    PageMethod('wait_for_selector', 'div#afftreemain div#groupingPanel ul.ui-tree-container'),
-                    PageMethod("evaluate", """
-                                async () => {
-                                    const expandAllNodes = async () => {
-                                        const buttons = Array.from(document.querySelectorAll('.ui-tree-toggler'));
-                                        for (const button of buttons) {
-                                            if (button.getAttribute('aria-expanded') === 'false') {
-                                                await button.click();
-                                                await new Promise(r => setTimeout(r, 300));
-                                            }
-                                        }
-                                    };
-                                    await expandAllNodes();
-                                }
-                            """)
-                ],
-                errback=self.errback
-            ))
-
-    async def parse_people_page(self, response):
-        # Process the first page of scientist links
-        page = response.meta['playwright_page']
-
-        
-        organizations=response.css('div#afftreemain>div#groupingPanel>ul.ui-tree-container>li>ul.ui-treenode-children>li')
-        university=response.css('div#afftreemain>div#groupingPanel>ul.ui-tree-container>li>div.ui-treenode-content div.ui-treenode-label>span>span::text').get()
-        for org in organizations:
-            organization=OrganizationItem()
-            organization['university']=university
-
-            institute=org.css('div.ui-treenode-content div.ui-treenode-label span>span::text').get()
-            organization['institute']=institute
-
-            cathedras = org.css('ul.ui-treenode-children li.ui-treenode-leaf div.ui-treenode-content div.ui-treenode-label span>span::text').getall()
-            if cathedras:
-                organization['cathedras']=cathedras
-            else:
-                organization['cathedras']=[]
-                
-            yield organization
-            
-            
-        total_pages=int(response.css('span.entitiesDataListTotalPages::text').get())
-
-        formdata_pages = {
-                "javax.faces.partial.ajax": "true",
-                "javax.faces.source": "resultTabsOutputPanel",
-                "primefaces.ignoreautoupdate": "true",
-                "javax.faces.partial.execute": "resultTabsOutputPanel",
-                "javax.faces.partial.render": "resultTabsOutputPanel",
-                "resultTabsOutputPanel": "resultTabsOutputPanel",
-                "resultTabsOutputPanel_load": "true",
-            }
-
-        #Generate requests for each page based on the total number of pages
-        for page_number in range(1, total_pages+1):
-            page_url = f'https://repo.pw.edu.pl/globalResultList.seam?r=author&tab=PEOPLE&lang=en&p=bst&pn={page_number}'.format(page_number=page_number)
-            yield scrapy.FormRequest(url=page_url,
-                callback=self.parse_scientist_links, 
+        if self.settings.getbool('PW_SPIDER_BROWSER_FREE'):
+            # One plain HTTP session serves both the affiliation tree and the people listing
+            yield scrapy.Request(categories['People'], callback=self.parse_people_session,
+                meta=dict(dont_cache=True))
+            return
+
+        # The result list is a lazily loaded panel that only needs the session opened by
+        # this page, so its pages are requested right away; the page count depends on
+        # the page size, so it is read from the probed first page
+        yield self.first_people_page_request(self.page_sizes.first('people'))
+
+        # The affiliation tree is expanded over plain HTTP, in its own session
+        yield scrapy.Request(categories['People'], callback=self.parse_organization_tree,
+            dont_filter=True, meta=dict(cookiejar='organizations', dont_cache=True))
+
+    def parse_people_session(self, response):
+        """
+        Browser-free bootstrap: the people page fetched over plain HTTP.
+
+        The server-rendered page already holds the affiliation tree and opens
+        the JSF session. The result list itself is a lazily loaded panel, so
+        the first page of results is requested the same way as all the others.
+        """
+        yield from self.parse_organization_tree(response)
+        yield self.first_people_page_request(self.page_sizes.first('people'))
+
+    def first_people_page_request(self, page_size):
+        """Request for the first page of the people result list, probing `page_size`."""
+        return self.people_page_request(1, callback=self.parse_first_people_page, page_size=page_size,
+            cb_kwargs=dict(page_size=page_size))
+
+    def parse_first_people_page(self, response, page_size=None):
+        # The total page count comes with the first lazily loaded page of results
+        markup = partial_update(response.body)
+        if markup is None:
+            # e.g. a <redirect> or <error> partial response after the session expired
+            self.hot_log.error('parse_first_people_page.no_update', 'No update in the partial response %s', response.url)
+            return
+        results = scrapy.Selector(text=markup)
+
+        decision = self.page_sizes.accept('people', page_size, response, len(results.css('a.authorNameLink')))
+        if decision is not True:
+            # Too slow at this page size, probe the next smaller one
+            yield self.first_people_page_request(decision)
+            return
+
+        total_pages = int(results.css('span.entitiesDataListTotalPages::text').get().replace(',', ''))
+
+        yield from self.parse_scientist_links(response)
+
+        for page_number in range(2, total_pages+1):
+            yield self.people_page_request(page_number, callback=self.parse_scientist_links, page_size=page_size)
+
+    def people_page_request(self, page_number, callback, page_size=None, **kwargs):
+        """Request for one page of the people result list (the lazily loaded resultTabsOutputPanel)."""
+        page_url = f'https://repo.pw.edu.pl/globalResultList.seam?r=author&tab=PEOPLE&lang=en&p=bst&pn={page_number}'
+        if page_size:
+            page_url += f'&ps={page_size}'
+        return scrapy.FormRequest(url=page_url,
+            callback=callback,
+            headers=self.headers,
+            formdata=ajax_formdata('resultTabsOutputPanel', resultTabsOutputPanel_load='true'),
+            **kwargs)
+
+    def parse_organization_tree(self, response):
+        """
+        Reads the affiliation tree from the people page and expands its collapsed nodes.
+
+        Every collapsed node is expanded with the tree's own PrimeFaces AJAX call,
+        all of them in parallel, instead of clicking the togglers in a browser.
+        """
+        tree = response.css('div#afftreemain ul.ui-tree-container')
+        tree_id = tree.xpath('../@id').get()
+        root = tree.xpath('./li')
+        if not root:
+            self.logger.error(f'Affiliation tree not found on {response.url}')
+            return
+
+        university = self.tree_node_label(root)
+        institutes = root.xpath('./ul[contains(@class, "ui-treenode-children")]/li')
+
+        if institutes:
+            yield from self.parse_institute_nodes(institutes, response, tree_id, university)
+        else:
+            yield tree_expand_request(response, tree_id, root.attrib.get('data-rowkey', '0'),
                 headers=self.headers,
-                formdata=formdata_pages)
-            
-            
-        await page.close()
+                callback=self.parse_tree_node,
+                cb_kwargs=dict(form_response=response, tree_id=tree_id, university=university),
+                meta=dict(cookiejar=response.meta.get('cookiejar'), dont_cache=True),
+                errback=self.errback)
+
+    def parse_tree_node(self, response, form_response, tree_id, university, institute=None):
+        """
+        Parses the children of an expanded tree node.
+
+        The children of the university are institutes, the children of an institute are cathedras.
+        """
+        markup = partial_update(response.body, tree_id)
+        if markup is None:
+            # e.g. a <redirect> or <error> partial response after the session expired
+            self.hot_log.error('parse_tree_node.no_update', 'No update of %s in the partial response %s',
+                               tree_id, response.url)
+            return
+        children = scrapy.Selector(text=markup).xpath('//body/li')
+
+        if institute is None:
+            yield from self.parse_institute_nodes(children, form_response, tree_id, university)
+        else:
+            cathedras = [self.tree_node_label(cathedra) for cathedra in children]
+            yield OrganizationItem(university=university, institute=institute, cathedras=cathedras)
+
+    def parse_institute_nodes(self, institutes, form_response, tree_id, university):
+        for node in institutes:
+            institute = self.tree_node_label(node)
+            cathedras = node.xpath('./ul[contains(@class, "ui-treenode-children")]/li')
+
+            if cathedras or 'ui-treenode-leaf' in node.attrib.get('class', ''):
+                cathedras = [self.tree_node_label(cathedra) for cathedra in cathedras]
+                yield OrganizationItem(university=university, institute=institute, cathedras=cathedras)
+            else:
+                yield tree_expand_request(form_response, tree_id, node.attrib['data-rowkey'],
+                    headers=self.headers,
+                    callback=self.parse_tree_node,
+                    cb_kwargs=dict(form_response=form_response, tree_id=tree_id,
+                                   university=university, institute=institute),
+                    meta=dict(cookiejar=form_response.meta.get('cookiejar'), dont_cache=True),
+                    errback=self.errback)
+
+    @staticmethod
+    def tree_node_label(node):
+        return node.css('div.ui-treenode-content div.ui-treenode-label span>span::text').get()
 
     def parse_scientist_links(self, response):
         response_bytes = response.body
@@ -136,158 +199,108 @@ class PwSpider(scrapy.Spider):
             yield scrapy.Request(self.pw_url+link, callback=self.parse_scientist)
 
 
-    def parse_scientist(self, response):
+    async def parse_scientist(self, response):
         '''
             Scrapes scientist profile page
         '''
-        
-
-        def email_creator(datax):
-            first=datax[0]
-            second=datax[1]
-            res=[None for i in range(0, len(second))]
-
-            for i in range(0, len(second)):
-                let=first[i]
-                if let=='#':
-                    let='@'
-                res[second[i]]=let
-
-            return ''.join(res)
-            
-        
-
         try:
-            match = re.search(r"datax=(.*?\]\])", response.text)
-            email=None
-            if match:
-                datax = ast.literal_eval(match.group(1))
-                email=email_creator(datax)
-
-            personal_data=response.css('div.authorProfileBasicInfoPanel')
-
-            names=personal_data.css('p.author-profile__name-panel::text').get().strip()
-            first_name=None
-            last_name=None
-            if names:
-                # Split by comma to separate name from the academic title
-                names = names.split(',')
-                name_part = names[0].strip()  # The part before the comma (the actual name)
-                
-                name_parts = name_part.split()  # Split the name by spaces
-                first_name = name_parts[0]  # First name is the first part
-                last_name = name_parts[-1]  # Last name is the last part (even if there's a middle name)
-
-
-            academic_title=response.css('div.careerAchievementListPanel ul.careerAchievementList li span.achievementName span::text').getall() or None
-            
-            if academic_title:
-                
-                if isinstance(academic_title, list):
-                    academic_title = academic_title[0]
-            
-                # Map of raw input to valid enum values
-                academic_title_map = {
-                    'Doctor': 'DSc',
-                    'Ph.D.': 'PhD',
-                    'Professor': 'Prof.',
-                    'Master Of Science': 'MSc',
-                    'Bachelor Of Science': 'BSc',
-                    'Professor Assistant' : 'BSc'
-                }
-                
-                # Normalize academic title  
-                academic_title = academic_title_map.get(academic_title, academic_title)
-
-                # Log a warning if the academic title is invalid
-                valid_titles = {'PhD', 'DSc', 'Prof.', 'DVM', 'MSc', 'BSc'}
-                if academic_title not in valid_titles:
-                    self.logger.warning(f"Invalid academic title: {academic_title}")
-
-
-            profile_url= response.url
-            position=personal_data.css('p.possitionInfo span::text').get() or ''
-
-            organization_scientist=personal_data.css('ul.authorAffilList li span a>span::text').getall()
-            organization=organization_scientist if organization_scientist else ''
-
-            research_area=response.css('div.researchFieldsPanel ul.ul-element-wcag li span::text').getall()
-            research_area=research_area if research_area else ''
-            
+            scientist = await self.parse_pool.run(extract_scientist, response.text, response.url)
         except Exception as e:
-            self.logger.error(f'Error in parse_scientist, {e} {response.url}')
-
-        finally:    
-            if academic_title and research_area:    
-                yield scrapy.FormRequest(url=response.url,
-                    formdata={
-                    'javax.faces.partial.ajax': 'true',
-                    'javax.faces.source': 'j_id_22_1_1_8_7_3_4d',
-                    'primefaces.ignoreautoupdate': 'true',
-                    'javax.faces.partial.execute': 'j_id_22_1_1_8_7_3_4d',
-                    'javax.faces.partial.render': 'j_id_22_1_1_8_7_3_4d',
-                    'j_id_22_1_1_8_7_3_4d': 'j_id_22_1_1_8_7_3_4d',
-                    'j_id_22_1_1_8_7_3_4d_load': 'true',
-                },
-                    headers=self.headers,
-                    callback=self.bibliometric,
-                    meta=dict(first_name=first_name, 
-                                last_name=last_name, 
-                                email=email, 
-                                academic_title=academic_title, 
-                                position=position, 
-                                organization=organization, 
-                                research_area=research_area, 
-                                profile_url=profile_url))
-
-            
-
-    def bibliometric(self, response):
-        
-        try:
-            response_bytes = response.body
-            root = etree.fromstring(response_bytes)
-            cdata_content = root.xpath('//update/text()')[0]
-            soup = bs(cdata_content, 'html.parser')
-
-            scientist=ScientistItem()
+            self.hot_log.error('parse_scientist.error', 'Error in parse_scientist, %s %s', e, response.url)
+            return
 
-            scientist['first_name'] = response.meta['first_name']
-            scientist['last_name'] = response.meta['last_name']
-            scientist['academic_title'] = response.meta['academic_title']
-            scientist['email'] = response.meta['email']
-            scientist['profile_url'] = response.meta['profile_url']
-            scientist['position'] = response.meta['position']
+        # Log a warning if the academic title is invalid
+        if scientist['academic_title'] and scientist['academic_title'] not in VALID_ACADEMIC_TITLES:
+            self.hot_log.warning('parse_scientist.invalid_title', "Invalid academic title: %s", scientist['academic_title'])
 
-            h_index_scopus = soup.find(id="j_id_22_1_1_8_7_3_5b_2_1:1:j_id_22_1_1_8_7_3_5b_2_6")
-            scientist['h_index_scopus']= h_index_scopus.find_all(string=True, recursive=False)[0].strip() if h_index_scopus else 0
+        if scientist['academic_title'] and scientist['research_area']:
+            yield scrapy.FormRequest(url=response.url,
+                formdata=ajax_formdata('j_id_22_1_1_8_7_3_4d', j_id_22_1_1_8_7_3_4d_load='true'),
+                headers=self.headers,
+                callback=self.bibliometric,
+                meta=dict(scientist=scientist))
 
-            h_index_wos = soup.find(id="j_id_22_1_1_8_7_3_5b_2_1:2:j_id_22_1_1_8_7_3_5b_2_6")
-            scientist['h_index_wos']= h_index_wos.find_all(string=True, recursive=False)[0].strip() if h_index_wos else 0
+            if self.settings.getbool('PW_SPIDER_WITH_PUBLICATIONS'):
+                yield self.author_publications_request(response.url, 1,
+                                                       self.page_sizes.first('author_publication'))
 
-            publication_count = soup.find(id="j_id_22_1_1_8_7_3_56_9:0:j_id_22_1_1_8_7_3_56_o_1")
-            scientist['publication_count']= publication_count.find_all(string=True, recursive=False)[0].strip() if publication_count else 0
+    async def bibliometric(self, response):
+        scientist = dict(response.meta['scientist'])
 
-            ministerial_score = soup.find(id="j_id_22_1_1_8_7_3_5b_a_2")
-            if ministerial_score:
-                scientist['ministerial_score']= ministerial_score.text.replace('\xa0','').strip() if ministerial_score and ('—' not in ministerial_score) else 0
+        try:
+            scientist.update(await self.parse_pool.run(extract_bibliometrics, response.body))
+        except Exception as e:
+            self.hot_log.error('bibliometric.error', 'Error in bibliometric, %s %s', e, response.url)
+        finally:
+            yield ScientistItem(**scientist)
+
+    def author_publications_request(self, profile_url, page_number, page_size=None):
+        """Request for one page of the publication tab of a scientist profile (its lazily loaded resultTabsOutputPanel)."""
+        page_url = f'{self.pw_url}/info/author/{author_key(profile_url)}?r=publication&lang=en&pn={page_number}'
+        if page_size:
+            page_url += f'&ps={page_size}'
+        return scrapy.FormRequest(url=page_url,
+            callback=self.parse_author_publications,
+            headers=self.headers,
+            formdata=ajax_formdata('resultTabsOutputPanel', resultTabsOutputPanel_load='true'),
+            cb_kwargs=dict(profile_url=profile_url, page_number=page_number, page_size=page_size),
+            errback=self.errback)
+
+    def parse_author_publications(self, response, profile_url, page_number, page_size=None):
+        """
+        Follows the publications listed on the publication tab of a scientist profile.
+
+        A publication shared by several scientists is fetched once, the
+        duplicate requests are dropped by the dupefilter. The page size is
+        probed on the first pages fetched, until one is served within the
+        latency budget.
+        """
+        # The rows and the page count come in the partial response of the lazily loaded panel
+        markup = partial_update(response.body)
+        if markup is None:
+            self.hot_log.error('parse_author_publications.no_update', 'No update in the partial response %s', response.url)
+            return
+        results = scrapy.Selector(text=markup)
+
+        links = results.css('div.entity-row-heading-wrapper h5 a::attr(href)').getall()
+        if page_number == 1 and not self.page_sizes.probed('author_publication'):
+            decision = self.page_sizes.accept('author_publication', page_size, response, len(links))
+            if decision is not True:
+                # Too slow at this page size, probe the next smaller one
+                yield self.author_publications_request(profile_url, 1, decision)
+                return
 
+        for link in links:
+            yield scrapy.Request(response.urljoin(link), callback=self.parse_author_publication,
+                cb_kwargs=dict(profile_url=profile_url),
+                errback=self.errback)
 
-            scientist['organization'] = response.meta['organization']
-            scientist['research_area'] = response.meta['research_area']
+        if page_number == 1:
+            # The page count is for the page size of this request, so the other pages keep it
+            total_pages = results.css('span.entitiesDataListTotalPages::text').get('1').replace(',', '')
+            for next_page in range(2, int(total_pages)+1):
+                yield self.author_publications_request(profile_url, next_page, page_size)
 
+    async def parse_author_publication(self, response, profile_url):
+        try:
+            publication = await self.parse_pool.run(extract_publication, response.text, response.url, self.pw_url)
         except Exception as e:
-            self.logger.error(f'Error in bibliometric, {e} {response.url}')
-        finally:
-            yield scientist
+            self.hot_log.error('parse_author_publication.error', 'Error in parse_author_publication, %s %s', e, response.url)
+            return
 
+        # The publication was reached through this scientist, so it is linked to them
+        # even if the author list of the page is incomplete
+        authors = publication['authors'] or []
+        if author_key(profile_url) not in {author_key(author) for author in authors}:
+            authors.append(profile_url)
+        publication['authors'] = authors
+
+        if publication['title']:
+            yield PublicationItem(**publication)
 
-        
-    
-            
     async def errback(self, failure):
         
-        self.logger.error(f"Request failed: {repr(failure)}")
+        self.hot_log.error('request_failed', "Request failed: %r", failure, details=failure.getTraceback)
         page = failure.request.meta.get('playwright_page')
         if page:
             await page.close()
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Resources kept warm between the crawls of one process.
+
+A crawl normally starts Playwright, launches Chromium, reads the .env file,
+connects to the database and looks every organization and research area up
+again. When the crawl daemon (`scrapy daemon`) runs several crawls in one
+process it activates `warm`, and then:
+
+- WarmBrowserProvider starts Playwright and launches the browser once; each
+  crawl opens its own browser contexts in it.
+- DatabasePipeline reuses the database connection of the previous crawl,
+  after checking it still works.
+- DatabasePipeline shares its LookupCache of organization and research area
+  ids between crawls (within one crawl it is always used). Entries only
+  enter it when their transaction commits. The whole cache is dropped when
+  a crawl does not finish cleanly, when the reused connection turns out to
+  be broken, and when the applied migrations differ from the ones of the
+  previous crawl, so ids are never served across a failed run or a schema
+  change.
+
+The time each resource took to set up when it was cold is recorded, so the
+daemon can report the time every warm run saved.
+"""
+
+import logging
+from time import perf_counter
+
+from scrapy_playwright.provider import PlaywrightBrowserProvider
+
+
+class LookupCache:
+    """
+    Ids of looked up rows by their key, per table.
+
+    Entries added in a transaction only become visible after commit(), so
+    rows of a rolled back transaction are never served from the cache.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.pending = []
+        self.hits = 0
+
+    def get(self, table, key):
+        value = self.tables.get(table, {}).get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def add(self, table, key, value):
+        self.pending.append((table, key, value))
+
+    def missing(self, table, keys):
+        """Returns the keys of `table` that are not in the cache."""
+        known = self.tables.get(table, {})
+        return [key for key in keys if key not in known]
+
+    def values(self, table, keys):
+        """Returns the cached values of the `keys` of `table` that are in the cache."""
+        known = self.tables.get(table, {})
+        values = [known[key] for key in keys if key in known]
+        self.hits += len(values)
+        return values
+
+    def commit(self):
+        for table, key, value in self.pending:
+            self.tables.setdefault(table, {})[key] = value
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def clear(self):
+        self.tables = {}
+        self.pending = []
+
+
+class WarmResources:
+    """
+    Registry of the resources shared by the crawls of the daemon.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.playwright = None
+        self.browser = None
+        self.connection = None
+        self.lookups = LookupCache()
+        # The migrations applied to the database the lookups were cached from
+        self.schema = None
+        # Seconds each resource took to set up cold, and the resources reused in the current run
+        self.setup_costs = {}
+        self.reused = []
+
+    def cold(self, resource, seconds):
+        self.setup_costs[resource] = seconds
+
+    def reuse(self, resource):
+        self.reused.append(resource)
+
+    def invalidate(self, reason):
+        """Drops the cached lookups, e.g. after a failed crawl."""
+        self.lookups.clear()
+        logging.info(f"Lookup cache cleared: {reason}")
+
+    def check_schema(self, migrations):
+        """
+        Drops the cached lookups if the applied migrations changed since the previous crawl.
+
+        Args:
+            migrations (set): The names of the migrations applied to the database.
+        """
+        if self.schema is not None and migrations != self.schema:
+            self.invalidate('the database schema changed')
+        self.schema = migrations
+
+    def run_report(self):
+        """
+        Returns the time saved by the reused resources since the last report, and resets it.
+
+        Returns:
+            tuple: Seconds saved, a description of the reused resources, and the cache hits.
+        """
+        reused = {resource: self.setup_costs.get(resource, 0.0) for resource in self.reused}
+        hits = self.lookups.hits
+        self.reused = []
+        self.lookups.hits = 0
+        summary = ', '.join(f'{resource} {seconds:.2f}s' for resource, seconds in reused.items())
+        return sum(reused.values()), summary, hits
+
+    async def close(self):
+        """Closes the shared browser and database connection."""
+        self.active = False
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.lookups.clear()
+
+
+warm = WarmResources()
+
+
+class SharedBrowser:
+    """
+    Browser proxy handed to one crawl: closing it only removes the crawl's event listeners.
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.listeners = []
+
+    def on(self, event, callback):
+        self.listeners.append((event, callback))
+        return self.browser.on(event, callback)
+
+    async def close(self):
+        for event, callback in self.listeners:
+            self.browser.remove_listener(event, callback)
+        self.listeners = []
+
+    def __getattr__(self, name):
+        return getattr(self.browser, name)
+
+
+class WarmBrowserProvider(PlaywrightBrowserProvider):
+    """
+    PLAYWRIGHT_BROWSER_PROVIDER that keeps Playwright and the browser running between crawls.
+
+    Outside of the daemon (`warm` not active) it behaves like the default provider.
+    """
+
+    async def start(self):
+        if not warm.active:
+            return await super().start()
+
+        if warm.playwright is None:
+            started = perf_counter()
+            await super().start()
+            warm.playwright = self.playwright
+            warm.cold('Playwright start', perf_counter() - started)
+        else:
+            self.playwright = warm.playwright
+            self.browser_type = getattr(self.playwright, self.config.browser_type_name)
+            warm.reuse('Playwright start')
+        # The shared instance is stopped by the daemon, not by the handler
+        self.playwright_context_manager = None
+
+    async def launch_browser(self):
+        if not warm.active:
+            return await super().launch_browser()
+
+        if warm.browser is None or not warm.browser.is_connected():
+            started = perf_counter()
+            warm.browser = await super().launch_browser()
+            warm.cold('browser launch', perf_counter() - started)
+        else:
+            warm.reuse('browser launch')
+            logging.info("Reusing the browser of the previous crawl")
+        return SharedBrowser(warm.browser)
+
+    async def close(self):
+        if not warm.active:
+            await super().close()
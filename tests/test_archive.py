@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import StatsCollector
+from scrapy.utils.request import RequestFingerprinter
+
+from pw_scraper.archive import ResponseArchive, ResponseArchiveMiddleware
+
+
+def middleware(directory, replay=False):
+    return ResponseArchiveMiddleware(ResponseArchive(str(directory)), RequestFingerprinter(),
+                                     StatsCollector(MagicMock()), replay)
+
+
+def response(request, flags=None):
+    return HtmlResponse(request.url, status=200, headers={'Content-Type': 'text/html; charset=utf-8'},
+                        body='<p>Łódź</p>'.encode('utf-8'), request=request, flags=flags)
+
+
+def test_archive_segments_and_index(tmp_path):
+    archive = ResponseArchive(str(tmp_path), segment_size=64)
+    archive.append('a' * 40, 'https://repo.pw.edu.pl/1', 200, {}, b'x' * 100)
+    archive.append('b' * 40, 'https://repo.pw.edu.pl/2', 404, {}, b'y')
+    archive.close()
+
+    reopened = ResponseArchive(str(tmp_path), segment_size=64)
+    assert len(reopened) == 2
+    assert reopened.index['b' * 40][0] == 1
+    url, status, _, body = reopened.get('b' * 40)
+    assert (url, status, body) == ('https://repo.pw.edu.pl/2', 404, b'y')
+    assert reopened.get('c' * 40) is None
+
+
+def test_archive_then_replay(tmp_path):
+    request = Request('https://repo.pw.edu.pl/info/author/WUT1/')
+    archiving = middleware(tmp_path)
+    assert archiving.process_request(request, None) is None
+    archiving.process_response(request, response(request), None)
+    archiving.spider_closed(None)
+    assert archiving.stats.get_value('archive/responses') == 1
+
+    replaying = middleware(tmp_path, replay=True)
+    replayed = replaying.process_request(request, None)
+    assert isinstance(replayed, HtmlResponse)
+    assert replayed.flags == ['archived']
+    assert replayed.css('p::text').get() == 'Łódź'
+    # The replayed response is not archived again
+    assert replaying.process_response(request, replayed, None) is replayed
+    with pytest.raises(IgnoreRequest):
+        replaying.process_request(Request('https://repo.pw.edu.pl/info/author/WUT2/'), None)
+    assert replaying.stats.get_value('archive/replay/missing') == 1
+
+
+def test_cached_responses_are_not_archived(tmp_path):
+    request = Request('https://repo.pw.edu.pl/info/author/WUT1/')
+    archiving = middleware(tmp_path)
+    archiving.process_response(request, response(request, flags=['cached']), None)
+    assert len(archiving.archive) == 0
+    assert archiving.stats.get_value('archive/skipped_cached') == 1
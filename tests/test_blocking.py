@@ -0,0 +1,63 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy import Request
+
+from pw_scraper.blocking import ResourceBlocker, page_stage
+
+
+def playwright_request(url, resource_type, navigation=False):
+    request = MagicMock()
+    request.url = url
+    request.resource_type = resource_type
+    request.is_navigation_request.return_value = navigation
+    request.frame.parent_frame = None
+    return request
+
+
+def test_page_stage():
+    assert page_stage(Request('https://repo.pw.edu.pl/info/author/WUT1/')) == 'detail'
+    assert page_stage(Request('https://repo.pw.edu.pl/globalResultList.seam?r=publication')) == 'listing'
+    assert page_stage(Request('https://repo.pw.edu.pl/globalResultList.seam', meta={'blocking_stage': 'tree'})) == 'tree'
+
+
+@pytest.mark.parametrize('stage, url, resource_type, aborted', [
+    ('listing', 'https://repo.pw.edu.pl/globalResultList.seam?r=publication', 'document', False),
+    ('listing', 'https://repo.pw.edu.pl/logo.png', 'image', True),
+    ('listing', 'https://repo.pw.edu.pl/javax.faces.resource/core.js.xhtml?ln=primefaces&v=8.0', 'script', False),
+    ('listing', 'https://repo.pw.edu.pl/javax.faces.resource/jsf.js.xhtml?ln=javax.faces', 'script', False),
+    ('listing', 'https://repo.pw.edu.pl/globalResultList.seam', 'xhr', False),
+    ('listing', 'https://repo.pw.edu.pl/javax.faces.resource/tree/tree.js.xhtml?ln=primefaces', 'script', True),
+    ('tree', 'https://repo.pw.edu.pl/javax.faces.resource/tree/tree.js.xhtml?ln=primefaces', 'script', False),
+    ('listing', 'https://repo.pw.edu.pl/javax.faces.resource/gmap/gmap.js.xhtml?ln=primefaces', 'script', True),
+    ('detail', 'https://repo.pw.edu.pl/javax.faces.resource/gmap/gmap.js.xhtml?ln=primefaces', 'script', False),
+    ('detail', 'https://www.googletagmanager.com/gtag/js', 'script', True),
+])
+def test_profiles(stage, url, resource_type, aborted):
+    blocker = ResourceBlocker()
+    navigation = resource_type == 'document'
+    assert blocker.should_abort(playwright_request(url, resource_type, navigation), stage) is aborted
+
+
+def test_disabled_blocker_only_counts():
+    stats = MagicMock()
+    blocker = ResourceBlocker(enabled=False, stats=stats)
+    request = playwright_request('https://repo.pw.edu.pl/logo.png', 'image')
+    request.frame.page = None
+    assert blocker(request) is False
+    stats.inc_value.assert_called_with('blocking/listing/blocked/image')
+
+
+def test_bytes_of_loaded_requests():
+    stats = MagicMock()
+    blocker = ResourceBlocker(enabled=False, stats=stats)
+    request = playwright_request('https://repo.pw.edu.pl/logo.png', 'image')
+    request.frame.page = None
+
+    async def sizes():
+        return {'responseHeadersSize': 100, 'responseBodySize': 900}
+    request.sizes = sizes
+
+    asyncio.run(blocker.request_finished(request))
+    stats.inc_value.assert_called_with('blocking/listing/blocked_bytes', 1000)
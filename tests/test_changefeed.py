@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from pw_scraper.changefeed import ChangeFeed, read_events, relation_key
+
+
+def test_relation_key():
+    assert relation_key(1, 2) == '1:2'
+    assert relation_key(None, 5) == ':5'
+    assert relation_key(3, None) == '3:'
+
+
+def test_changed_fields():
+    feed = ChangeFeed()
+    assert feed.changed_fields(('a', 'b', 'c'), (1, 2, 3), (1, 5, 3)) == {'b': 5}
+
+
+def test_unknown_sink():
+    with pytest.raises(ValueError):
+        ChangeFeed('kafka')
+
+
+def test_disabled_feed_records_nothing():
+    feed = ChangeFeed()
+    feed.record('scientist', 1, 'insert', {'email': 'a@b'})
+    assert not feed.enabled
+    assert feed.pending == []
+
+
+def test_jsonl_sink_writes_committed_events(tmp_path):
+    path = tmp_path / 'changes.jsonl'
+    feed = ChangeFeed('jsonl', str(path))
+    feed.open('resolve_authors')
+
+    feed.record('publication', 7, 'update', {'ministerial_score': 40})
+    feed.commit()
+    feed.record('publication', 8, 'insert', {'title': 'T'})
+    feed.rollback()
+    feed.commit()
+    feed.close()
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(events) == 1
+    assert events[0]['crawl_id'].startswith('resolve_authors-')
+    assert events[0]['entity_key'] == '7'
+    assert events[0]['fields'] == {'ministerial_score': 40}
+    assert feed.events == 1
+
+
+class Cursor:
+    """Answers the snapshot query and the read of change_events with the given rows."""
+
+    def __init__(self, xmin, rows):
+        self.results = [(xmin,), rows]
+        self.params = []
+
+    def execute(self, query, params=None):
+        self.params.append(params)
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def test_read_events_between_watermarks():
+    cursor = Cursor('9781', [(2, 'crawl', 'scientist', '1', 'insert', {}, None)])
+    rows, watermark = read_events(cursor, 9779)
+    assert [row[0] for row in rows] == [2]
+    assert watermark == 9781
+    assert cursor.params[1] == {'after': '9779', 'upto': '9781'}
+
+    cursor = Cursor('9781', [])
+    read_events(cursor)
+    assert cursor.params[1]['after'] is None
@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+
+from scrapy.statscollectors import StatsCollector
+
+from pw_scraper.dedupe import ItemDedupeMiddleware
+from pw_scraper.items import OrganizationItem, PublicationItem, ScientistItem
+
+
+def middleware():
+    crawler = MagicMock()
+    crawler.stats = StatsCollector(crawler)
+    return ItemDedupeMiddleware(crawler)
+
+
+def test_scientists_by_author_key():
+    dedupe = middleware()
+    first = ScientistItem(profile_url='https://repo.pw.edu.pl/info/author/WUT1?r=author')
+    again = ScientistItem(profile_url='https://repo.pw.edu.pl/info/author/WUT1?r=publication&ps=20')
+    assert dedupe.get_processed_item(first, None) is first
+    assert dedupe.get_processed_item(again, None) is None
+    assert dedupe.crawler.stats.get_value('dedupe/ScientistItem/dropped') == 1
+
+
+def test_publications_by_key_or_title():
+    dedupe = middleware()
+    assert dedupe.get_processed_item(PublicationItem(title='T', publication_key='WUT1'), None)
+    assert dedupe.get_processed_item(PublicationItem(title='Other', publication_key='WUT1'), None) is None
+    assert dedupe.get_processed_item(PublicationItem(title=' T2 ', publication_date=2020), None)
+    assert dedupe.get_processed_item(PublicationItem(title='t2', publication_date=2020), None) is None
+    # Items without a key are passed on
+    untitled = PublicationItem()
+    assert dedupe.get_processed_item(untitled, None) is untitled
+    assert dedupe.get_processed_item(untitled, None) is untitled
+
+
+def test_organizations_are_merged():
+    dedupe = middleware()
+    assert dedupe.get_processed_item(OrganizationItem('WUT', 'Faculty A', ['C1', 'C2']), None)
+    merged = dedupe.get_processed_item(OrganizationItem('WUT', 'Faculty A', ['C2', 'C3']), None)
+    assert merged.cathedras == ['C3']
+    assert dedupe.get_processed_item(OrganizationItem('WUT', 'Faculty A', ['C1', 'C3']), None) is None
+    assert dedupe.crawler.stats.get_value('dedupe/OrganizationItem/merged') == 1
+
+
+def test_organization_without_cathedras():
+    dedupe = middleware()
+    assert dedupe.get_processed_item(OrganizationItem('WUT', 'Faculty B'), None)
+    assert dedupe.get_processed_item(OrganizationItem('WUT', 'Faculty B', []), None) is None
@@ -0,0 +1,52 @@
+import hashlib
+from unittest.mock import MagicMock
+
+from scrapy import Request
+from scrapy.statscollectors import StatsCollector
+
+from pw_scraper.dupefilters import BloomDupeFilter, BloomFilter, ScalableBloomFilter
+
+
+def fingerprint(value):
+    return hashlib.sha1(str(value).encode()).digest()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 1e-6)
+    for value in range(1000):
+        bloom.add(fingerprint(value))
+    assert all(fingerprint(value) in bloom for value in range(1000))
+    assert sum(fingerprint(value) in bloom for value in range(1000, 11000)) == 0
+    assert bloom.count == 1000
+
+
+def test_scalable_bloom_filter_grows():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=1e-6)
+    assert bloom.add(fingerprint(0)) is False
+    assert bloom.add(fingerprint(0)) is True
+    for value in range(1, 350):
+        bloom.add(fingerprint(value))
+    # 100 + 200 fingerprints fit in the first two slices
+    assert len(bloom.filters) == 3
+    assert len(bloom) == 350
+    assert bloom.filters[1].capacity == 200
+    assert bloom.filters[1].error_rate < bloom.filters[0].error_rate
+
+
+def test_dupefilter_stats_are_current():
+    stats = StatsCollector(MagicMock())
+    dupefilter = BloomDupeFilter(stats=stats, initial_capacity=100)
+    for page in range(5):
+        dupefilter.request_seen(Request(f'https://repo.pw.edu.pl/?pn={page}'))
+    assert dupefilter.request_seen(Request('https://repo.pw.edu.pl/?pn=0'))
+    assert stats.get_value('dupefilter/bloom/fingerprints') == 5
+    assert stats.get_value('dupefilter/bloom/slices') == 1
+
+
+def test_dupefilter_resumes_from_jobdir(tmp_path):
+    dupefilter = BloomDupeFilter(str(tmp_path), initial_capacity=100)
+    dupefilter.request_seen(Request('https://repo.pw.edu.pl/'))
+    dupefilter.close('finished')
+
+    resumed = BloomDupeFilter(str(tmp_path), initial_capacity=100)
+    assert resumed.request_seen(Request('https://repo.pw.edu.pl/'))
@@ -0,0 +1,18 @@
+from pw_scraper.hedging import StageLatencies
+
+
+def test_percentile_needs_min_samples():
+    latencies = StageLatencies(window=10, min_samples=3)
+    latencies.add('profile', 1.0)
+    latencies.add('profile', 2.0)
+    assert latencies.percentile('profile', 0.95) is None
+    assert latencies.percentile('listing', 0.95) is None
+
+
+def test_percentile_over_window():
+    latencies = StageLatencies(window=4, min_samples=2)
+    for latency in (100.0, 1.0, 2.0, 3.0, 4.0):
+        latencies.add('publication', latency)
+    # The oldest sample fell out of the window
+    assert latencies.percentile('publication', 0.95) == 4.0
+    assert latencies.percentile('publication', 0.0) == 1.0
@@ -0,0 +1,30 @@
+import logging
+
+import pytest
+
+from pw_scraper.hotlog import HotLog, log_level
+
+
+def test_log_level():
+    assert log_level(logging.INFO) == logging.INFO
+    assert log_level('info') == logging.INFO
+    assert log_level('DEBUG') == logging.DEBUG
+    assert log_level('20') == logging.INFO
+    with pytest.raises(ValueError):
+        log_level('verbose')
+
+
+def test_rate_limit(caplog):
+    log = HotLog(logging.getLogger('test.hotlog'), level=logging.INFO, max_per_interval=2, sample_every=0)
+    with caplog.at_level(logging.INFO, logger='test.hotlog'):
+        for number in range(5):
+            log.info('key', 'message %d', number)
+    assert [record.getMessage() for record in caplog.records] == ['message 0', 'message 1']
+    assert log.counts['key'] == [5, 3]
+
+
+def test_below_level_not_logged(caplog):
+    log = HotLog(logging.getLogger('test.hotlog'), level=logging.WARNING)
+    with caplog.at_level(logging.DEBUG, logger='test.hotlog'):
+        log.info('key', 'message')
+    assert not caplog.records
@@ -0,0 +1,32 @@
+from scrapy import FormRequest, Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+
+from pw_scraper.httpcache import RepoCachePolicy, page_type
+
+
+def test_page_type():
+    assert page_type(Request('https://repo.pw.edu.pl/globalResultList.seam?r=author')) == 'listing'
+    assert page_type(Request('https://repo.pw.edu.pl/info/author/WUT1/')) == 'profile'
+    assert page_type(Request('https://repo.pw.edu.pl/info/author/WUT1/', method='POST')) == 'bibliometrics'
+    tab = FormRequest('https://repo.pw.edu.pl/info/author/WUT1?r=publication&pn=2',
+                      formdata={'resultTabsOutputPanel_load': 'true'})
+    assert page_type(tab) == 'listing'
+    assert page_type(Request('https://repo.pw.edu.pl/info/author/WUT1?r=publication&ps=20')) == 'profile'
+    assert page_type(Request('https://repo.pw.edu.pl/info/article/WUT2/')) == 'publication'
+    assert page_type(Request('https://repo.pw.edu.pl/')) == 'default'
+
+
+def response(request, cache_control):
+    return HtmlResponse(request.url, request=request, body=b'<html></html>',
+                        headers={'Cache-Control': cache_control})
+
+
+def test_policy_ttls_and_no_store():
+    policy = RepoCachePolicy(Settings({'HTTPCACHE_REPO_TTLS': {'profile': 60}}))
+    request = Request('https://repo.pw.edu.pl/info/author/WUT1/')
+
+    assert policy.should_cache_response(response(request, 'no-cache'), request)
+    assert not policy.should_cache_response(response(request, 'no-store'), request)
+    assert policy._compute_freshness_lifetime(response(request, 'no-cache'), request, 0) == 60
+    assert policy._compute_freshness_lifetime(response(request, 'max-age=5'), request, 0) == 5
@@ -0,0 +1,30 @@
+from pw_scraper.jsf import ajax_formdata, partial_update
+
+
+PARTIAL_RESPONSE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<partial-response><changes>
+<update id="tree"><![CDATA[<li data-rowkey="0_1">Institute</li>]]></update>
+<update id="javax.faces.ViewState"><![CDATA[-123:456]]></update>
+</changes></partial-response>"""
+
+
+def test_partial_update_by_id():
+    assert partial_update(PARTIAL_RESPONSE, 'tree') == '<li data-rowkey="0_1">Institute</li>'
+    assert partial_update(PARTIAL_RESPONSE, 'javax.faces.ViewState') == '-123:456'
+
+
+def test_partial_update_first():
+    assert partial_update(PARTIAL_RESPONSE).startswith('<li')
+
+
+def test_partial_update_missing():
+    assert partial_update(PARTIAL_RESPONSE, 'other') is None
+    redirect = b'<partial-response><redirect url="/login.seam"/></partial-response>'
+    assert partial_update(redirect) is None
+
+
+def test_ajax_formdata():
+    formdata = ajax_formdata('form:tree', **{'form:tree_expandNode': '0_1'})
+    assert formdata['javax.faces.source'] == 'form:tree'
+    assert formdata['form:tree'] == 'form:tree'
+    assert formdata['form:tree_expandNode'] == '0_1'
@@ -0,0 +1,20 @@
+from pw_scraper.keys import author_key, path_key, publication_key
+
+
+def test_author_key_ignores_query_string():
+    assert author_key('https://repo.pw.edu.pl/info/author/WUT380d?r=publication&ps=20') == 'WUT380d'
+    assert author_key(' /info/author/WUT380d/ ') == 'WUT380d'
+    assert author_key('https://repo.pw.edu.pl/info/article/WUT1/') is None
+    assert author_key(None) is None
+
+
+def test_publication_key():
+    assert publication_key('https://repo.pw.edu.pl/info/article/WUT3f6d/?r=publication') == 'WUT3f6d'
+    assert publication_key('/info/book/WUT7') == 'WUT7'
+    assert publication_key('https://repo.pw.edu.pl/info/author/WUT1/') is None
+    assert publication_key('https://repo.pw.edu.pl/globalResultList.seam') is None
+    assert publication_key('') is None
+
+
+def test_path_key_without_segment():
+    assert path_key('https://repo.pw.edu.pl/info/author/', '/info/author/') is None
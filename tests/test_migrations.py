@@ -0,0 +1,36 @@
+import pytest
+
+from pw_scraper.migrations import MIGRATIONS, MigrationError, pending, publication_key
+
+
+class Cursor:
+    """Answers the queries of the migrations with the given rows, in order."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def test_pending_without_migrations_table():
+    assert pending(Cursor((False,))) == [name for name, _ in MIGRATIONS]
+
+
+def test_pending_skips_applied():
+    cursor = Cursor((True,), [('0001_publication_author_keys',)])
+    assert pending(cursor) == [name for name, _ in MIGRATIONS[1:]]
+
+
+def test_publication_key_refuses_duplicates():
+    cursor = Cursor([('WUT1', 2)])
+    with pytest.raises(MigrationError, match='WUT1'):
+        publication_key(cursor)
+    assert not any('UNIQUE INDEX' in query for query in cursor.queries)
@@ -0,0 +1,76 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from scrapy.http import HtmlResponse, Request, XmlResponse
+from scrapy.settings import Settings
+
+from pw_scraper.pagesize import PageSizeProbe
+from pw_scraper.spiders.pw_spider import PwSpider
+
+
+def probed_response(latency):
+    request = Request('https://repo.pw.edu.pl/globalResultList.seam', meta={'download_latency': latency})
+    return HtmlResponse(request.url, body=b'', request=request)
+
+
+def test_page_sizes_from_command_line():
+    crawler = MagicMock()
+    crawler.settings = Settings({'LISTING_PAGE_SIZES': '100,50,20', 'LISTING_PAGE_SIZE_LATENCY_BUDGET': 30})
+    probe = PageSizeProbe.from_crawler(crawler)
+    assert probe.candidates == [100, 50, 20]
+    assert probe.first('people') == 100
+
+
+def test_accept_within_budget():
+    probe = PageSizeProbe([20, 100, 50], latency_budget=30)
+    assert probe.accept('people', 100, probed_response(5), 100) is True
+    assert probe.first('people') == 100
+
+
+def test_accept_over_budget_tries_smaller():
+    probe = PageSizeProbe([100, 50, 20], latency_budget=30)
+    assert probe.accept('people', 100, probed_response(60), 100) == 50
+    assert probe.accept('people', 20, probed_response(60), 20) is None
+
+
+# author_publications_partial.xml has the structure of the resultTabsOutputPanel partial response
+# of the people listing; it was written by hand, replace it with one recorded by RESPONSE_ARCHIVE_DIR
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def author_publications_page(request, latency, body=None):
+    request.meta['download_latency'] = latency
+    body = body or (FIXTURES / 'author_publications_partial.xml').read_bytes()
+    return XmlResponse(request.url, body=body, request=request)
+
+
+def test_author_publication_page_size_probe():
+    spider = PwSpider()
+    spider.page_sizes = PageSizeProbe([100, 50], latency_budget=30)
+    profile_url = 'https://repo.pw.edu.pl/info/author/WUT1/'
+
+    first = spider.author_publications_request(profile_url, 1, spider.page_sizes.first('author_publication'))
+    assert first.method == 'POST' and b'resultTabsOutputPanel_load=true' in first.body
+    assert '&ps=100' in first.url
+    # Over the budget: the first page is requested again at the next smaller size
+    [retry] = list(spider.parse_author_publications(author_publications_page(first, 60), **first.cb_kwargs))
+    assert '&ps=50' in retry.url and retry.cb_kwargs['page_number'] == 1
+
+    requests = list(spider.parse_author_publications(author_publications_page(retry, 5), **retry.cb_kwargs))
+    assert spider.page_sizes.probed('author_publication')
+    assert [request.url for request in requests[:2]] == [
+        'https://repo.pw.edu.pl/info/article/WUT3f6d0d1c6a1c4c0f8b5e2a3c8e9d1f2a/',
+        'https://repo.pw.edu.pl/info/book/WUT5a7b9c2e4d6f48a1b3c5d7e9f0a2b4c6/']
+    assert [request.cb_kwargs['page_number'] for request in requests[2:]] == [2, 3]
+    assert all('&ps=50' in request.url for request in requests[2:])
+
+
+def test_author_publications_without_update():
+    spider = PwSpider()
+    spider.page_sizes = PageSizeProbe([100], latency_budget=30)
+    spider.hot_log = MagicMock()
+    request = spider.author_publications_request('https://repo.pw.edu.pl/info/author/WUT1/', 1, 100)
+    redirect = b'<partial-response><redirect url="/login.seam"/></partial-response>'
+    assert list(spider.parse_author_publications(author_publications_page(request, 5, redirect),
+                                                 **request.cb_kwargs)) == []
+    spider.hot_log.error.assert_called_once()
@@ -0,0 +1,50 @@
+from datetime import date
+
+from pw_scraper.partitions import PartitionCheckpoint, filter_ignored, year_partitions
+
+
+def test_year_partitions_ranges_and_lists():
+    assert year_partitions('2019,2021-2022') == [2022, 2021, 2019]
+    assert year_partitions() == []
+
+
+def test_year_partitions_last_years():
+    current_year = date.today().year
+    assert year_partitions(last_years='2') == [current_year, current_year - 1]
+
+
+def test_filter_ignored():
+    # A year of a 50-page listing
+    assert not filter_ignored(3, 100, 50, 100)
+    # The whole listing, at the same or at another page size
+    assert filter_ignored(50, 100, 50, 100)
+    assert filter_ignored(250, 20, 50, 100)
+    assert not filter_ignored(1, 20, 1, 20)
+
+
+def test_listing_page_done_after_its_details(tmp_path):
+    checkpoint = PartitionCheckpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.set_total_pages(2021, 2)
+
+    checkpoint.page_scheduled(2021, 1, 2)
+    assert checkpoint.pending_pages(2021) == [1, 2]
+    checkpoint.detail_done(2021, 1)
+    assert checkpoint.pending_pages(2021) == [1, 2]
+    checkpoint.detail_done(2021, 1)
+    assert checkpoint.pending_pages(2021) == [2]
+
+    # A listing page without publications is done at once
+    checkpoint.page_scheduled(2021, 2, 0)
+    assert checkpoint.is_complete(2021)
+
+
+def test_checkpoint_resumes_from_file(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = PartitionCheckpoint(path)
+    checkpoint.set_total_pages(2020, 3, page_size=100)
+    checkpoint.page_done(2020, 2)
+    checkpoint.save()
+
+    resumed = PartitionCheckpoint(path)
+    assert resumed.pending_pages(2020) == [1, 3]
+    assert resumed.page_size(2020) == 100
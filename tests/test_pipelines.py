@@ -0,0 +1,53 @@
+import pytest
+from scrapy.exceptions import DropItem
+
+from pw_scraper.items import OrganizationItem, PublicationItem, ScientistItem
+from pw_scraper.pipelines import (CleanItemsPipeline, normalize_float, normalize_int, normalize_text,
+                                  normalize_url, normalize_year)
+
+
+def test_normalize_text():
+    assert normalize_text('  Jan \n\t Kowalski ') == 'Jan Kowalski'
+    assert normalize_text(None) is None
+
+
+def test_normalize_numbers():
+    assert normalize_float('140,5') == 140.5
+    assert normalize_float('20\n\n ') == 20.0
+    assert normalize_float('1 234') == 1234.0
+    assert normalize_float('n/a') is None
+    assert normalize_int('140,5') == 140
+    assert normalize_int(None) is None
+
+
+def test_normalize_year_and_url():
+    assert normalize_year('1918\n\t  ') == 1918
+    assert normalize_year('2020-05-01') == 2020
+    assert normalize_year('unknown') is None
+    assert normalize_url(' /info/author/WUT1 ') == 'https://repo.pw.edu.pl/info/author/WUT1'
+    assert normalize_url('   ') is None
+
+
+def test_clean_items_follows_field_types():
+    pipeline = CleanItemsPipeline()
+    scientist = pipeline.process_item(ScientistItem(first_name=' Jan\n', academic_title='PhD', h_index_wos='3', ministerial_score='140,5',
+                                                    profile_url='/info/author/WUT1',
+                                                    research_area=[' AI ', 'ML\n']), None)
+    assert scientist.first_name == 'Jan'
+    assert scientist.h_index_wos == 3
+    assert scientist.ministerial_score == 140.5
+    assert scientist.profile_url == 'https://repo.pw.edu.pl/info/author/WUT1'
+    assert scientist.research_area == ['AI', 'ML']
+
+    publication = pipeline.process_item(PublicationItem(title='T', publication_date='1918\n',
+                                                        authors=['/info/author/WUT1']), None)
+    assert publication.publication_date == 1918
+    assert publication.authors == ['https://repo.pw.edu.pl/info/author/WUT1']
+
+    organization = pipeline.process_item(OrganizationItem(university=' WUT ', cathedras=[' C1 ']), None)
+    assert (organization.university, organization.cathedras) == ('WUT', ['C1'])
+
+
+def test_clean_items_drops_scientist_without_title():
+    with pytest.raises(DropItem):
+        CleanItemsPipeline().process_item(ScientistItem(first_name='Jan'), None)
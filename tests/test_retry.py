@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import DontCloseSpider
+from scrapy.statscollectors import StatsCollector
+
+from pw_scraper.retry import RetryBreakerMiddleware, RetryScheduler, attempts_used
+
+
+def scheduler(**kwargs):
+    crawler = MagicMock()
+    crawler.stats = StatsCollector(crawler)
+    crawler.spider.retries = RetryScheduler(crawler, backoff_base=0, **kwargs)
+    return crawler.spider.retries
+
+
+def request(**meta):
+    return Request('https://repo.pw.edu.pl/info/article/WUT1/', meta=dict(retry_stage='detail', **meta))
+
+
+def test_budget_counts_every_download():
+    retries = scheduler(max_attempts=8)
+    # The first download and 5 immediate retries of RetryMiddleware
+    failed = request(retry_times=5)
+    assert retries.retry(failed)
+    retry = retries.queue[0][2]
+    assert attempts_used(retry) == 7
+    # The tail retry leaves one attempt for RetryMiddleware
+    assert retry.meta['max_retry_times'] == 6
+
+    assert not retries.retry(retry.replace(meta=dict(retry.meta, retry_times=6)))
+    assert retries.stats.get_value('retry_scheduler/gave_up/detail') == 1
+
+
+def test_breaker_holds_tail_retries():
+    retries = scheduler(breaker_threshold=2, breaker_cooldown=300)
+    retries.retry(request())
+    assert not retries.is_open('detail')
+    retries.retry(request())
+    assert retries.is_open('detail')
+
+    # Both retries are due, but held until the cooldown is over
+    with pytest.raises(DontCloseSpider):
+        retries.spider_idle(None)
+    retries.crawler.engine.crawl.assert_not_called()
+    assert len(retries.queue) == 2
+
+    retries.success(request())
+    assert not retries.is_open('detail')
+    retries.queue = [(0, sequence, retry, stage) for _, sequence, retry, stage in retries.queue]
+    with pytest.raises(DontCloseSpider):
+        retries.spider_idle(None)
+    assert retries.crawler.engine.crawl.call_count == 2
+
+
+def test_breaker_holds_new_requests():
+    retries = scheduler(breaker_threshold=1)
+    middleware = RetryBreakerMiddleware(retries.crawler)
+    listing = Request('https://repo.pw.edu.pl/globalResultList.seam', meta=dict(retry_stage='listing'))
+    assert middleware.get_processed_request(request(), None) is not None
+
+    retries.retry(request())
+    assert middleware.get_processed_request(request(), None) is None
+    assert middleware.get_processed_request(listing, None) is listing
+    assert retries.stats.get_value('retry_scheduler/held/detail') == 1
+    assert len(retries.queue) == 2
+
+
+def test_middleware_without_scheduler():
+    crawler = MagicMock()
+    crawler.spider.retries = None
+    assert RetryBreakerMiddleware(crawler).get_processed_request(request(), None) is not None
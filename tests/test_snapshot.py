@@ -0,0 +1,34 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from pw_scraper.commands.snapshot import NULL_PARTITION, SnapshotWriter, partition_value, to_float, to_int
+
+
+def test_partition_value():
+    assert partition_value('year', '2021-05-01') == '2021'
+    assert partition_value('year', datetime.date(2020, 1, 1)) == '2020'
+    assert partition_value('institute_id', 7) == '7'
+    assert partition_value('year', None) == NULL_PARTITION
+
+
+def test_converters():
+    assert to_float(Decimal('1.5')) == 1.5
+    assert to_int(Decimal('3')) == 3
+    assert to_int(None) is None
+
+
+def test_writer_partitions(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    writer = SnapshotWriter(pa, pq, str(tmp_path / 'publications'), 'year',
+                            [('id', 'int64'), ('publication_date', 'date')], 'zstd')
+    writer.write([('2020-01-01', 1, '2020-01-01'), ('2020-06-01', 2, '2020-06-01'), (None, 3, None)])
+    writer.write([(None, 4, None)])
+    writer.close()
+
+    assert (writer.rows, writer.files) == (4, 2)
+    assert pq.read_table(tmp_path / 'publications' / 'year=2020' / 'part-0.parquet').column('id').to_pylist() == [1, 2]
+    table = pq.read_table(tmp_path / 'publications' / f'year={NULL_PARTITION}' / 'part-0.parquet')
+    assert table.column('id').to_pylist() == [3, 4]
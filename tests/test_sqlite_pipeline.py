@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from pw_scraper.items import OrganizationItem, PublicationItem, ScientistItem
+from pw_scraper.pipelines import SqlitePipeline
+
+
+class Spider:
+    name = 'test'
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = SqlitePipeline(str(tmp_path / 'test.sqlite3'), batch_size=2)
+    pipeline.open_spider(Spider())
+    yield pipeline
+    pipeline.close_spider(Spider())
+
+
+def scientist(**fields):
+    values = dict(first_name='Jan', last_name='K', academic_title='PhD', email='j@pw.edu.pl',
+                  profile_url='https://repo.pw.edu.pl/info/author/WUT1/', position='Adj', h_index_scopus=2,
+                  h_index_wos=1, publication_count=3, ministerial_score=10.4, organization=['C1'],
+                  research_area=['AI'])
+    values.update(fields)
+    return ScientistItem(**values)
+
+
+def rows(pipeline, query):
+    pipeline.flush()
+    return pipeline.connection.execute(query).fetchall()
+
+
+def test_saves_items_in_the_tables(pipeline):
+    pipeline.process_item(OrganizationItem(university='PW', institute='I', cathedras=['C1']), Spider())
+    pipeline.process_item(scientist(), Spider())
+    pipeline.process_item(scientist(position='Prof', research_area=['ML']), Spider())
+    pipeline.process_item(PublicationItem(title='T', publisher='P', publication_date=2020, journal='J',
+                                          ministerial_score=70, publication_key='WUTp1',
+                                          authors=['https://repo.pw.edu.pl/info/author/WUT1/']), Spider())
+
+    assert rows(pipeline, 'SELECT email, position FROM scientists') == [('j@pw.edu.pl', 'Prof')]
+    assert rows(pipeline, 'SELECT organization_id FROM scientist_organization') == [(3,)]
+    assert rows(pipeline, 'SELECT name FROM research_areas ra JOIN scientists_research_areas sra '
+                          'ON sra.research_area_id = ra.id') == [('ML',)]
+    assert rows(pipeline, 'SELECT publication_date, publication_key FROM publications') == [('2020-01-01', 'WUTp1')]
+    assert pipeline.resolve_author_links() == 1
+
+
+
+def test_unknown_organization_keeps_links(pipeline):
+    pipeline.process_item(OrganizationItem(university='PW', institute='I', cathedras=['C1']), Spider())
+    pipeline.process_item(scientist(organization=['C1']), Spider())
+    # C2 is not in the organization tree yet, so the link to C1 must not be treated as stale
+    pipeline.process_item(scientist(organization=['C2']), Spider())
+    assert rows(pipeline, 'SELECT organization_id FROM scientist_organization') == [(3,)]
+
+    pipeline.process_item(scientist(organization=['I']), Spider())
+    assert rows(pipeline, 'SELECT organization_id FROM scientist_organization') == [(2,)]
+
+def test_failed_item_is_rolled_back(pipeline, monkeypatch):
+    def fail(*args):
+        raise TypeError('unexpected value')
+    monkeypatch.setattr(pipeline, 'stage_author_keys', fail)
+
+    pipeline.process_item(PublicationItem(title='T', publisher='P', publication_date=2020, journal='J',
+                                          ministerial_score=70, publication_key='WUTp1', authors=[]), Spider())
+    pipeline.process_item(OrganizationItem(university='PW', institute='I', cathedras=[]), Spider())
+
+    assert rows(pipeline, 'SELECT count(*) FROM publications') == [(0,)]
+    assert rows(pipeline, 'SELECT count(*) FROM organizations') == [(2,)]
+
+
+def test_wal_mode(pipeline):
+    assert pipeline.connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
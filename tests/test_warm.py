@@ -0,0 +1,65 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from pw_scraper.warm import LookupCache, WarmResources
+
+
+def test_lookups_visible_after_commit():
+    lookups = LookupCache()
+    lookups.add('organizations', 'C1', [3])
+    assert lookups.get('organizations', 'C1') is None
+    lookups.commit()
+    assert lookups.get('organizations', 'C1') == [3]
+    assert lookups.hits == 1
+
+
+def test_lookups_rollback():
+    lookups = LookupCache()
+    lookups.add('research_areas', 'AI', [1])
+    lookups.rollback()
+    lookups.commit()
+    assert lookups.missing('research_areas', ['AI', 'ML']) == ['AI', 'ML']
+
+
+def test_lookups_values_and_clear():
+    lookups = LookupCache()
+    lookups.add('research_areas', 'AI', [1])
+    lookups.add('research_areas', 'ML', [2, 5])
+    lookups.commit()
+    assert lookups.values('research_areas', ['ML', 'DB', 'AI']) == [[2, 5], [1]]
+    lookups.clear()
+    assert lookups.missing('research_areas', ['AI']) == ['AI']
+
+
+def test_run_report():
+    warm = WarmResources()
+    warm.cold('database connection', 0.5)
+    warm.reuse('database connection')
+    warm.lookups.hits = 3
+    saved, reused, hits = warm.run_report()
+    assert saved == 0.5
+    assert reused == 'database connection 0.50s'
+    assert hits == 3
+    assert warm.run_report() == (0, '', 0)
+
+
+def test_lookups_dropped_when_the_schema_changes():
+    warm = WarmResources()
+    warm.check_schema({'0001_publication_author_keys'})
+    warm.lookups.add('organizations', 'C1', [3])
+    warm.lookups.commit()
+    warm.check_schema({'0001_publication_author_keys'})
+    assert warm.lookups.missing('organizations', ['C1']) == []
+    warm.check_schema({'0001_publication_author_keys', '0002_publication_key'})
+    assert warm.lookups.missing('organizations', ['C1']) == ['C1']
+
+
+def test_close_stops_playwright_once():
+    warm = WarmResources()
+    playwright = warm.playwright = AsyncMock()
+    warm.lookups.add('organizations', 'C1', [3])
+    warm.lookups.commit()
+    asyncio.run(warm.close())
+    playwright.stop.assert_awaited_once()
+    assert warm.playwright is None
+    assert warm.lookups.missing('organizations', ['C1']) == ['C1']